@@ -1,11 +1,19 @@
 import pandas as pd
-import glob
 import os
 import numpy as np
 from datetime import datetime
 import pytz
 import logging
 import math
+import hashlib
+import json
+import sys
+import time
+
+import fund_loader
+import indicator_state
+import nav_store
+import signal_store
 
 # --- V5.0 策略所需配置参数 ---
 FUND_DATA_DIR = 'fund_data'
@@ -13,6 +21,7 @@ MIN_MONTH_DRAWDOWN = 0.06 # V5.0 震荡市核心触发 (回撤 >= 6%)
 HIGH_ELASTICITY_MIN_DRAWDOWN = 0.15 # 高弹性策略的基础回撤要求 (15%)
 MIN_DAILY_DROP_PERCENT = 0.03 # 当日大跌的定义 (3%)
 REPORT_BASE_NAME = 'fund_warning_report_v5_merged_table'
+SIGNAL_STRATEGY = 'v5' # 每日信号快照在 signal_store/ 中的策略名
 
 # --- 核心阈值调整 ---
 EXTREME_RSI_THRESHOLD_P1 = 29.0 # 网格级：RSI(14) 极值超卖
@@ -21,6 +30,13 @@ SHORT_TERM_RSI_EXTREME = 20.0 # RSI(6)的极值超卖阈值
 TREND_HEALTH_THRESHOLD = 0.9 # MA50/MA250 健康度阈值 (0.9)
 MIN_BUY_SIGNAL_SCORE = 3.7 # 最低信号分数
 TREND_SLOPE_THRESHOLD = 0.005 # 趋势拟合斜率阈值
+BOLL_FLAT_STD = 1e-6 # 布林带标准差不超过该值视为波动极小
+# 行动提示关键词 → 信号分数 (取命中关键词的最高分；报告排名与组合回测共用)
+SIGNAL_SCORES = {'💥【网格级】RSI极值共振': 5.0, '💥【网格级】RSI极值': 4.5, '🌟【网格级】RSI极值': 4.5, '🎯【震荡-高吸】': 4.0, '✨【震荡-连跌】': 3.5, '🛡️【防御-反弹】': 3.0, '🔥【震荡-预警】': 2.0, '【震荡-关注】': 1.0}
+
+# --- 结果缓存 ---
+ANALYSIS_CACHE_PATH = os.path.join(nav_store.STORE_DIR, 'analyzer_v5_cache.json')
+ANALYSIS_VERSION = 2 # 分析逻辑变化时递增，使缓存全部失效
 
 # --- 设置日志 (1/15) ---
 def setup_logging():
@@ -41,46 +57,47 @@ def load_and_preprocess_data(filepath, fund_code):
     支持表头：date, net_value, cumulative_net_value, daily_growth_rate...
     """
     try:
-        try:
-            df = pd.read_csv(filepath)
-        except UnicodeDecodeError:
-            df = pd.read_csv(filepath, encoding='gbk')
-        
-        # 统一列名映射逻辑 (针对用户提供的新表头)
-        column_map = {
-            'date': 'date',
-            'net_value': 'value',
-            'Date': 'date',
-            'NetValue': 'value'
-        }
-        
-        # 如果列名中存在 net_value，则将其重命名为分析用的 value
-        current_cols = df.columns.tolist()
-        rename_dict = {}
-        for old_col, new_col in column_map.items():
-            if old_col in current_cols:
-                rename_dict[old_col] = new_col
-        
-        df = df.rename(columns=rename_dict)
-        
-        # 检查关键列
-        if 'date' not in df.columns or 'value' not in df.columns:
-            logging.warning(f"基金 {fund_code} 缺少 'date' 或 'net_value' 列。现有的列为: {df.columns.tolist()}")
-            return None, "缺少关键列"
-            
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
-        
-        if df.empty: return None, "数据为空"
-        if len(df) < 60: return None, f"数据不足60条，当前只有{len(df)}条"
-        if (df['value'] <= 0).any(): return None, "存在无效净值(<=0)"
-        
-        return df, "数据有效"
+        # 编码探测、列名统一与增量日志合并由共享读取模块完成
+        df = fund_loader.load_fund_frame(filepath, ['date', 'net_value'])
+        return preprocess_fund_frame(df, fund_code)
         
     except Exception as e:
         logging.error(f"加载基金 {fund_code} 数据时发生错误: {e}")
         return None, f"加载错误: {e}"
 
+def preprocess_fund_frame(df, fund_code):
+    """统一列名、升序排列并验证数据 (CSV 与列式存储共用)"""
+    # 统一列名映射逻辑 (针对用户提供的新表头)
+    column_map = {
+        'date': 'date',
+        'net_value': 'value',
+        'Date': 'date',
+        'NetValue': 'value'
+    }
+    
+    # 如果列名中存在 net_value，则将其重命名为分析用的 value
+    current_cols = df.columns.tolist()
+    rename_dict = {}
+    for old_col, new_col in column_map.items():
+        if old_col in current_cols:
+            rename_dict[old_col] = new_col
+    
+    df = df.rename(columns=rename_dict)
+    
+    # 检查关键列
+    if 'date' not in df.columns or 'value' not in df.columns:
+        logging.warning(f"基金 {fund_code} 缺少 'date' 或 'net_value' 列。现有的列为: {df.columns.tolist()}")
+        return None, "缺少关键列"
+        
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
+    
+    if df.empty: return None, "数据为空"
+    if len(df) < 60: return None, f"数据不足60条，当前只有{len(df)}条"
+    if (df['value'] <= 0).any(): return None, "存在无效净值(<=0)"
+    
+    return df, "数据有效"
+
 # --- 布林带计算 (3/15) ---
 def calculate_bollinger_bands(series, window=20):
     """计算布林带位置"""
@@ -91,15 +108,16 @@ def calculate_bollinger_bands(series, window=20):
     df_temp['MA20'] = df_temp['value'].rolling(window=window).mean()
     df_temp['STD20'] = df_temp['value'].rolling(window=window).std()
     
-    if df_temp['STD20'].iloc[-1] == 0:
+    return classify_bollinger(df_temp['value'].iloc[-1], df_temp['MA20'].iloc[-1], df_temp['STD20'].iloc[-1])
+
+def classify_bollinger(latest_value, ma20, std20):
+    """根据最新净值与布林带中轨/标准差判断位置 (逐只计算与批量引擎共用)"""
+    # pandas 滚动标准差对恒定序列可能返回 1e-8 量级的残差，按 0 处理
+    if std20 <= BOLL_FLAT_STD:
         return "波动极小"
         
-    df_temp['Upper Band'] = df_temp['MA20'] + (df_temp['STD20'] * 2)
-    df_temp['Lower Band'] = df_temp['MA20'] - (df_temp['STD20'] * 2)
-    
-    latest_value = df_temp['value'].iloc[-1]
-    latest_lower = df_temp['Lower Band'].iloc[-1]
-    latest_upper = df_temp['Upper Band'].iloc[-1]
+    latest_upper = ma20 + (std20 * 2)
+    latest_lower = ma20 - (std20 * 2)
     
     if pd.isna(latest_lower) or pd.isna(latest_upper):
         return "数据不足"
@@ -156,12 +174,7 @@ def calculate_technical_indicators(df):
         macd_prev = df_asc['MACD'].iloc[-2] if len(df_asc) >= 2 else np.nan
         signal_prev = df_asc['Signal'].iloc[-2] if len(df_asc) >= 2 else np.nan
         
-        macd_signal = '观察'
-        if not np.isnan(macd_prev) and not np.isnan(signal_prev):
-            if macd_latest > signal_latest and macd_prev <= signal_prev:
-                macd_signal = '强势金叉' if macd_latest > 0 else '弱势金叉'
-            elif macd_latest < signal_latest and macd_prev >= signal_prev:
-                macd_signal = '死叉' 
+        macd_signal = classify_macd(macd_latest, signal_latest, macd_prev, signal_prev)
         
         df_asc['MA50'] = df_asc['value'].rolling(window=50, min_periods=1).mean()
         df_asc['MA250'] = df_asc['value'].rolling(window=250, min_periods=1).mean() 
@@ -177,7 +190,7 @@ def calculate_technical_indicators(df):
             recent_ratio = (df_asc['MA50'] / df_asc['MA250']).tail(50).dropna() 
             if len(recent_ratio) >= 5:
                 slope = np.polyfit(np.arange(len(recent_ratio)), recent_ratio.values, 1)[0]
-                trend_direction = '向上' if slope > TREND_SLOPE_THRESHOLD else ('向下' if slope < -TREND_SLOPE_THRESHOLD else '平稳')
+                trend_direction = classify_trend(slope)
             else: trend_direction = '数据不足'
         
         daily_drop = 0.0
@@ -185,22 +198,42 @@ def calculate_technical_indicators(df):
             v_prev = df_asc['value'].iloc[-2]
             if v_prev > 0: daily_drop = (value_latest - v_prev) / v_prev
             
-        return {
-            'RSI(14)': round(rsi_14_latest, 2) if not math.isnan(rsi_14_latest) else np.nan, 
-            'RSI(6)': round(rsi_6_latest, 2) if not math.isnan(rsi_6_latest) else np.nan,     
-            'MACD信号': macd_signal,
-            '净值/MA50': round(net_to_ma50, 2) if not math.isnan(net_to_ma50) else np.nan,
-            '净值/MA250': round(net_to_ma250, 2) if not math.isnan(net_to_ma250) else np.nan, 
-            'MA50/MA250': round(ma50_to_ma250, 2) if not math.isnan(ma50_to_ma250) else np.nan, 
-            'MA50/MA250趋势': trend_direction,
-            '布林带位置': calculate_bollinger_bands(df_asc['value']), 
-            '最新净值': round(value_latest, 4) if not math.isnan(value_latest) else np.nan,
-            '当日跌幅': round(daily_drop, 4) 
-        }
+        return build_tech_row(rsi_14_latest, rsi_6_latest, macd_signal, net_to_ma50, net_to_ma250, ma50_to_ma250,
+                              trend_direction, calculate_bollinger_bands(df_asc['value']), value_latest, daily_drop)
     except Exception as e:
         logging.error(f"技术指标错误: {e}")
         return {'RSI(14)': np.nan, 'MACD信号': '错误', '最新净值': np.nan, '当日跌幅': np.nan, 'MA50/MA250趋势': '错误', '布林带位置': '错误'}
 
+def classify_macd(macd_latest, signal_latest, macd_prev, signal_prev):
+    """根据 MACD/Signal 最新值与前一值判断金叉/死叉"""
+    macd_signal = '观察'
+    if not np.isnan(macd_prev) and not np.isnan(signal_prev):
+        if macd_latest > signal_latest and macd_prev <= signal_prev:
+            macd_signal = '强势金叉' if macd_latest > 0 else '弱势金叉'
+        elif macd_latest < signal_latest and macd_prev >= signal_prev:
+            macd_signal = '死叉' 
+    return macd_signal
+
+def classify_trend(slope):
+    """MA50/MA250 比值拟合斜率 → 趋势方向"""
+    return '向上' if slope > TREND_SLOPE_THRESHOLD else ('向下' if slope < -TREND_SLOPE_THRESHOLD else '平稳')
+
+def build_tech_row(rsi_14_latest, rsi_6_latest, macd_signal, net_to_ma50, net_to_ma250, ma50_to_ma250,
+                   trend_direction, boll_position, value_latest, daily_drop):
+    """按报告精度四舍五入，组装技术指标字典"""
+    return {
+        'RSI(14)': round(rsi_14_latest, 2) if not math.isnan(rsi_14_latest) else np.nan, 
+        'RSI(6)': round(rsi_6_latest, 2) if not math.isnan(rsi_6_latest) else np.nan,     
+        'MACD信号': macd_signal,
+        '净值/MA50': round(net_to_ma50, 2) if not math.isnan(net_to_ma50) else np.nan,
+        '净值/MA250': round(net_to_ma250, 2) if not math.isnan(net_to_ma250) else np.nan, 
+        'MA50/MA250': round(ma50_to_ma250, 2) if not math.isnan(ma50_to_ma250) else np.nan, 
+        'MA50/MA250趋势': trend_direction,
+        '布林带位置': boll_position, 
+        '最新净值': round(value_latest, 4) if not math.isnan(value_latest) else np.nan,
+        '当日跌幅': round(daily_drop, 4) 
+    }
+
 # --- 连续下跌计算 (5/15) ---
 def calculate_consecutive_drops(series):
     try:
@@ -247,31 +280,173 @@ def generate_v5_action_signal(row):
     if not pd.isna(rsi14) and rsi14 > 70.0: sigs.append("🚫【牛市过滤器】RSI(14)>70")
     return ' | '.join(sigs) if sigs else '等待信号 (未达基础回撤)'
 
+# --- 结果缓存 (8.5/15) ---
+def strategy_params_hash():
+    """策略参数与分析版本的哈希，任一阈值变化都会使全部缓存失效"""
+    params = {
+        'version': ANALYSIS_VERSION,
+        'MIN_MONTH_DRAWDOWN': MIN_MONTH_DRAWDOWN,
+        'HIGH_ELASTICITY_MIN_DRAWDOWN': HIGH_ELASTICITY_MIN_DRAWDOWN,
+        'MIN_DAILY_DROP_PERCENT': MIN_DAILY_DROP_PERCENT,
+        'EXTREME_RSI_THRESHOLD_P1': EXTREME_RSI_THRESHOLD_P1,
+        'STRONG_RSI_THRESHOLD_P2': STRONG_RSI_THRESHOLD_P2,
+        'SHORT_TERM_RSI_EXTREME': SHORT_TERM_RSI_EXTREME,
+        'TREND_HEALTH_THRESHOLD': TREND_HEALTH_THRESHOLD,
+        'MIN_BUY_SIGNAL_SCORE': MIN_BUY_SIGNAL_SCORE,
+        'TREND_SLOPE_THRESHOLD': TREND_SLOPE_THRESHOLD,
+        'BOLL_FLAT_STD': BOLL_FLAT_STD,
+    }
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+def fund_data_hash(arrays):
+    """基金 date/net_value 数组内容的哈希"""
+    digest = hashlib.sha1()
+    for col in ('date', 'net_value'):
+        digest.update(np.ascontiguousarray(arrays[col]).tobytes())
+    return digest.hexdigest()
+
+def load_result_cache(params_hash):
+    """读取结果缓存；文件缺失、损坏或参数不一致时返回空缓存"""
+    if not os.path.exists(ANALYSIS_CACHE_PATH): return {}
+    try:
+        with open(ANALYSIS_CACHE_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"结果缓存读取失败，将全部重新计算: {e}")
+        return {}
+    return data.get('funds', {}) if data.get('params') == params_hash else {}
+
+def save_result_cache(params_hash, funds):
+    os.makedirs(os.path.dirname(ANALYSIS_CACHE_PATH) or '.', exist_ok=True)
+    tmp_path = f"{ANALYSIS_CACHE_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # numpy 标量 (如连跌天数) 转为 Python 原生类型
+        json.dump({'params': params_hash, 'funds': funds}, f, ensure_ascii=False,
+                  default=lambda o: o.item() if isinstance(o, np.generic) else str(o))
+    os.replace(tmp_path, ANALYSIS_CACHE_PATH)
+
 # --- 分析逻辑 (9-10/15) ---
 def analyze_all_funds():
-    files = glob.glob(os.path.join(FUND_DATA_DIR, '*.csv'))
+    """
+    从列式存储一次性加载全部基金，数据有变化的基金由增量指标状态一次向量化计算。
+    每只基金的结果按 (数据哈希, 参数哈希) 缓存，数据未变化的基金直接复用上次结果。
+    """
+    panel = nav_store.load_panel(csv_dir=FUND_DATA_DIR)
+    params_hash = strategy_params_hash()
+    cache = load_result_cache(params_hash)
+    new_cache, pending = {}, {}
+    for code in panel.codes:
+        data_hash = fund_data_hash(panel.arrays(code, ['date', 'net_value']))
+        cached = cache.get(code)
+        if cached and cached['key'] == data_hash:
+            new_cache[code] = cached
+        else:
+            pending[code] = data_hash
+    computed = analyze_funds_batch(panel, list(pending))
     results = []
-    for f in files:
-        res = analyze_single_fund(f)
-        if res: results.append(res)
+    for code in panel.codes:
+        if code in pending:
+            # 无结果的基金同样缓存 (row 为 None)，避免下次重复计算
+            new_cache[code] = {'key': pending[code], 'row': computed[code]}
+        if new_cache[code]['row']: results.append(new_cache[code]['row'])
+    save_result_cache(params_hash, new_cache)
+    logging.info(f"共 {len(panel.codes)} 只基金: 重新计算 {len(pending)} 只，复用缓存 {len(panel.codes) - len(pending)} 只")
+    return results
+
+def analyze_funds_batch(panel, codes):
+    """
+    用增量指标状态 (按批量引擎的内核向量化推进) 一次计算多只基金，返回 {基金代码: 结果或 None}。
+    数据校验与 preprocess_fund_frame 一致；含缺失净值的少数基金仍走逐只计算。
+    """
+    results, batch = {}, []
+    for code in codes:
+        arrays = panel.arrays(code, ['date', 'net_value'])
+        values = arrays['net_value']
+        if len(values) < 60 or (values <= 0).any():
+            results[code] = None
+        elif np.isnan(values).any():
+            df, msg = preprocess_fund_frame(pd.DataFrame(arrays), code)
+            results[code] = analyze_fund_frame(df, code) if df is not None else None
+        else:
+            batch.append(code)
+    if batch:
+        # 持久化的增量指标状态：数据只追加了新行的基金只推进新行，历史被改写的基金从头重建
+        states = indicator_state.IndicatorStateStore()
+        states.sync(panel, batch)
+        states.save()
+        indicators = states.indicators(batch)
+        for j, code in enumerate(batch):
+            results[code] = result_from_indicators(code, {name: arr[j] for name, arr in indicators.items()})
     return results
 
+def result_from_indicators(code, ind):
+    """把批量引擎的单只基金指标转换为与 analyze_fund_frame 相同的结果行"""
+    value_latest, ma50 = ind['latest'], ind['ma50']
+    net_to_ma50 = value_latest / ma50 if ma50 != 0 else np.nan
+    if ind['length'] < 250:
+        net_to_ma250, ma50_to_ma250, trend_direction = np.nan, np.nan, '数据不足'
+    else:
+        ma250 = ind['ma250']
+        net_to_ma250 = value_latest / ma250 if ma250 != 0 else np.nan
+        ma50_to_ma250 = ma50 / ma250 if ma250 != 0 else np.nan
+        trend_direction = classify_trend(ind['ma_ratio_slope'])
+    v_prev = ind['prev']
+    daily_drop = (value_latest - v_prev) / v_prev if v_prev > 0 else 0.0
+    tech = build_tech_row(ind['rsi_14'], ind['rsi_6'],
+                          classify_macd(ind['macd'], ind['signal'], ind['macd_prev'], ind['signal_prev']),
+                          net_to_ma50, net_to_ma250, ma50_to_ma250, trend_direction,
+                          classify_bollinger(value_latest, ind['boll_mid'], ind['boll_std']), value_latest, daily_drop)
+    return build_result(code, ind['month_mdd'], int(ind['consecutive_drops']), int(ind['recent_drops']), tech)
+
 def analyze_single_fund(filepath):
     code = os.path.splitext(os.path.basename(filepath))[0]
     df, msg = load_and_preprocess_data(filepath, code)
     if df is None: return None
+    return analyze_fund_frame(df, code)
+
+def analyze_fund_frame(df, code):
     try:
         latest_date = df['date'].iloc[-1]
         df_recent = df[df['date'] >= (latest_date - pd.DateOffset(months=1))]['value']
         mdd = calculate_max_drawdown(df_recent) if len(df_recent) >= 2 else 0.0
         tech = calculate_technical_indicators(df)
         con_drop = calculate_consecutive_drops(df['value'].tail(10))
-        row = {**tech, '最大回撤': mdd, '近10日连跌': con_drop}
-        if not pd.isna(tech['最新净值']):
-            return {'基金代码': code, '最大回撤': mdd, '最大连续下跌': calculate_consecutive_drops(df['value']), '近10日连跌': con_drop, **tech, '行动提示': generate_v5_action_signal(row), '退出提示': generate_exit_signal(row)}
-        return None
+        return build_result(code, mdd, calculate_consecutive_drops(df['value']), con_drop, tech)
     except: return None
 
+def build_result(code, mdd, max_drop, con_drop, tech):
+    """组装单只基金的结果行并生成行动/退出提示；最新净值缺失时返回 None"""
+    row = {**tech, '最大回撤': mdd, '近10日连跌': con_drop}
+    if not pd.isna(tech['最新净值']):
+        return {'基金代码': code, '最大回撤': mdd, '最大连续下跌': max_drop, '近10日连跌': con_drop, **tech, '行动提示': generate_v5_action_signal(row), '退出提示': generate_exit_signal(row)}
+    return None
+
+def verify_batch_engine():
+    """对全部基金比较批量计算 (增量指标状态) 与逐只计算的结果，返回不一致的 (基金代码, 字段, 逐只值, 批量值) 列表"""
+    panel = nav_store.load_panel(csv_dir=FUND_DATA_DIR)
+    start = time.time()
+    batch = analyze_funds_batch(panel, panel.codes)
+    batch_seconds = time.time() - start
+    start = time.time()
+    mismatches = []
+    for code in panel.codes:
+        df, msg = preprocess_fund_frame(panel.frame(code, ['date', 'net_value']), code)
+        expected = analyze_fund_frame(df, code) if df is not None else None
+        actual = batch[code]
+        if (expected is None) != (actual is None):
+            mismatches.append((code, '结果', expected, actual))
+            continue
+        for key in (expected or {}):
+            a, b = expected[key], actual.get(key)
+            same = (pd.isna(a) and pd.isna(b)) if not isinstance(a, str) and pd.isna(a) else a == b
+            if not same:
+                mismatches.append((code, key, a, b))
+    logging.info(f"批量计算 {batch_seconds:.2f} 秒，逐只计算 {time.time() - start:.2f} 秒，"
+                 f"{len(panel.codes)} 只基金中不一致字段 {len(mismatches)} 个")
+    for m in mismatches[:20]:
+        logging.warning(f"不一致: {m}")
+    return mismatches
+
 # --- 格式化与报告 (11-14/15) ---
 def format_technical_value(val, fmt='percent'):
     if pd.isna(val): return '---'
@@ -302,6 +477,10 @@ def generate_merged_table(df_group):
     parts.append("\n---\n")
     return "".join(parts)
 
+def signal_score(action):
+    """行动提示的信号分数 (未命中任何关键词为 0)"""
+    return max([v for k, v in SIGNAL_SCORES.items() if k in action] + [0])
+
 def generate_report(results, ts_str):
     if not results: return f"# 基金预警报告 ({ts_str})\n\n**无数据**"
     df = pd.DataFrame(results)
@@ -309,8 +488,7 @@ def generate_report(results, ts_str):
     if df_f.empty: return f"# 基金报告 ({ts_str})\n\n**无触发回撤条件的基金**"
 
     # 评分逻辑
-    score_map = {'💥【网格级】RSI极值共振': 5.0, '💥【网格级】RSI极值': 4.5, '🌟【网格级】RSI极值': 4.5, '🎯【震荡-高吸】': 4.0, '✨【震荡-连跌】': 3.5, '🛡️【防御-反弹】': 3.0, '🔥【震荡-预警】': 2.0, '【震荡-关注】': 1.0}
-    df_f['signal_score'] = df_f['行动提示'].apply(lambda x: max([v for k, v in score_map.items() if k in x] + [0]))
+    df_f['signal_score'] = df_f['行动提示'].apply(signal_score)
     df_f['trend_score'] = df_f.apply(lambda r: 0 if r['MA50/MA250趋势'] == '向下' or r.get('MA50/MA250', 1) < TREND_HEALTH_THRESHOLD else 100, axis=1)
     df_f['is_stop_loss'] = np.where(df_f['最大回撤'] > 0.10, 1, 0)
     
@@ -333,6 +511,12 @@ def generate_report(results, ts_str):
     report.append("\n---\n## **✅ 核心决策纪律**\n1. 优先 I.1 组。\n2. 趋势向下必须放弃。\n")
     return "".join(report)
 
+def render_report(date, ts_str=None, run_path=None):
+    """从信号快照库渲染指定日期 (当天最后一次运行) 的报告；给出 run_path 时只渲染该次运行"""
+    df = signal_store.read_run(run_path) if run_path else signal_store.read_partition(SIGNAL_STRATEGY, date)
+    results = df.drop(columns=[signal_store.DATE_COLUMN, signal_store.RUN_COLUMN]).to_dict('records') if not df.empty else []
+    return generate_report(results, ts_str or (df[signal_store.RUN_COLUMN].iloc[0] if not df.empty else str(date)))
+
 # --- 主函数 (15/15) ---
 def main():
     setup_logging()
@@ -347,11 +531,17 @@ def main():
         return False
 
     results = analyze_all_funds()
-    content = generate_report(results, ts_rep)
+    # 结果先写入当日信号分区，报告由本次运行写入的文件渲染 (没有结果时为空运行标记，不会误用当天较早的结果)
+    run_path = signal_store.append(SIGNAL_STRATEGY, now.date(), results, run_at=now)
+    content = render_report(now.date(), ts_rep, run_path)
     with open(report_path, 'w', encoding='utf-8') as f: f.write(content)
     logging.info(f"报告已生成: {report_path}")
     return True
 
 if __name__ == '__main__':
+    if '--verify' in sys.argv[1:]:
+        # 校验批量指标引擎与逐只计算结果一致
+        setup_logging()
+        sys.exit(1 if verify_batch_engine() else 0)
     if main(): print("脚本执行完毕。已兼容新表头并更新报告。")
     else: print("执行失败，请检查日志。")
\ No newline at end of file
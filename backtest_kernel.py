@@ -0,0 +1,393 @@
+"""
+回测状态机内核 (Backtest Kernel)
+
+py/ 下几个回测脚本原先用 iterrows / df.loc 逐行推进持仓状态 (建仓、网格加仓、止损止盈、信号清仓)。
+本模块把同一个状态机写成只操作标量与数组的循环，信号由调用方预先向量化算好：
+
+    entry[i]   空仓时是否建仓
+    add[i]     持仓时是否加仓 (另受 grid_step 的成本下跌幅度约束)
+    exit[i]    持仓时是否按策略信号清仓 (止损/止盈优先)
+
+各策略的差异全部放在参数集里 (见 DEFAULT_PARAMS)，交易记录写入预分配的数组并以结构化数组
+(TRADE_DTYPE) 返回。内核只在交易日写入记录，每日资产与持仓由交易记录向量化还原；
+持仓期间按止损/止盈/网格的净值阈值跳过不可能交易的日子，空仓时直接跳到下一个建仓信号。
+安装了 numba 时内核经 JIT 编译；否则以纯 Python 列表循环运行，4.7k 行基金约 1 ms，
+为 iterrows 参考实现的 200~400 倍 (110 行的基金约 120~250 倍)。
+
+命令行：
+    python backtest_kernel.py fund_data/000001.csv    # 与 iterrows 参考实现比对结果并测速
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+try:  # 可选依赖：工作流环境只安装 pandas/numpy，缺少 numba 时使用纯 Python 内核
+    from numba import njit
+except ImportError:
+    njit = None
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+# 交易动作代码
+ACTION_ENTRY = 1
+ACTION_ADD = 2
+ACTION_STOP_LOSS = -1
+ACTION_TAKE_PROFIT = -2
+ACTION_SIGNAL_EXIT = -3
+ACTION_NAMES = {
+    ACTION_ENTRY: 'BUY (Initial)', ACTION_ADD: 'BUY (Grid)',
+    ACTION_STOP_LOSS: 'SELL (Stop Loss)', ACTION_TAKE_PROFIT: 'SELL (Take Profit)',
+    ACTION_SIGNAL_EXIT: 'SELL (Signal)',
+}
+
+COST_AVERAGE = 0     # 止损止盈相对平均持仓成本
+COST_ENTRY = 1       # 相对本轮首次建仓净值
+SIZING_CASH = 0      # 每次买入固定金额，受现金约束
+SIZING_WEIGHT = 1    # 每次增加固定仓位比例，仓位上限 max_position
+
+DEFAULT_PARAMS = {
+    'initial_capital': 100000.0,
+    'buy_amount': 10000.0,         # SIZING_CASH 为金额；SIZING_WEIGHT 为仓位比例
+    'stop_loss': 0.08,             # 收益率 <= -stop_loss 时止损
+    'take_profit': 0.15,           # 收益率 >= take_profit 时止盈
+    'grid_step': 0.0,              # 加仓要求净值低于平均成本的比例 (0 为不限制)
+    'cost_basis': COST_AVERAGE,
+    'sizing': SIZING_CASH,
+    'max_position': 1.0,           # 仅 SIZING_WEIGHT 使用
+    'rebuy_on_exit_day': False,    # 清仓当日是否继续判断买入
+}
+
+TRADE_DTYPE = np.dtype([
+    ('day', np.int64),             # 交易发生的行号
+    ('action', np.int8),           # ACTION_* 代码
+    ('units', np.float64),         # 买入/卖出的份额 (或仓位比例)
+    ('price', np.float64),         # 成交净值
+    ('gain', np.float64),          # 卖出时的收益率 (买入为 0)
+    ('equity', np.float64),        # 交易前的总资产
+    ('entry_day', np.int64),       # 本轮首次建仓的行号
+    ('entry_price', np.float64),   # 本轮首次建仓净值
+    ('cash', np.float64),          # 交易后的现金
+    ('position', np.float64),      # 交易后的持仓
+])
+PREFILTER_MARGIN = 1e-9          # 持仓预筛阈值的相对余量 (远大于浮点舍入误差，只会多检查、不会漏判)
+# ==========================================
+
+_TRADE_FIELDS = TRADE_DTYPE.names
+
+
+def _price_bounds(units, avg_cost, holding_cost, entry_price, stop_loss, take_profit, grid_step, cost_basis):
+    """
+    持仓状态下的净值预筛阈值 (sell_lo, sell_hi, add_hi)：收益率与网格跌幅都是净值的单调函数，
+    净值落在 (sell_lo, sell_hi) 内时不可能止损止盈，高于 add_hi 时不满足网格步长。
+    阈值各放宽 PREFILTER_MARGIN 的相对余量，只用于跳过无事件的日子，是否交易仍按原公式逐项判断。
+    成本非正或非有限时返回不做预筛的阈值 (每天都走完整判断)。
+    """
+    basis = holding_cost / units if cost_basis == 0 else entry_price
+    if not (basis > 0.0 and basis < np.inf and avg_cost > 0.0 and avg_cost < np.inf):
+        return np.inf, -np.inf, np.inf
+    sell_lo = basis * (1.0 - stop_loss)
+    sell_hi = basis * (1.0 + take_profit)
+    add_hi = avg_cost * (1.0 - grid_step) if grid_step > 0 else np.inf
+    return (sell_lo + abs(sell_lo) * PREFILTER_MARGIN, sell_hi - abs(sell_hi) * PREFILTER_MARGIN,
+            add_hi + abs(add_hi) * PREFILTER_MARGIN)
+
+
+def _kernel(values, entry, add, exit_, initial_capital, buy_amount, stop_loss, take_profit, grid_step,
+            cost_basis, sizing, max_position, rebuy_on_exit_day,
+            t_day, t_action, t_units, t_price, t_gain, t_equity, t_entry_day, t_entry_price, t_cash, t_position):
+    """
+    状态机主循环，只在发生交易的日子写入 t_* 预分配数组 (容量 2 × 天数，每天最多一卖一买)，返回交易笔数。
+    空仓时直接跳到下一个建仓信号；持仓时用 _price_bounds 的阈值跳过不可能交易的日子，
+    只有候选日才按原公式计算收益率并判断止损、止盈、信号清仓与网格加仓，结果与逐日判断完全相同。
+    每日资产与持仓在两笔交易之间保持不变，由 run() 按交易记录向量化还原。
+    """
+    n = len(values)
+    cash = initial_capital
+    units = 0.0
+    avg_cost = 0.0
+    holding_cost = 0.0
+    entry_price = 0.0
+    entry_day = -1
+    sell_lo, sell_hi, add_hi = np.inf, -np.inf, np.inf
+    can_buy = cash >= buy_amount if sizing == 0 else units < max_position
+    n_trades = 0
+    i = 0
+    while i < n:
+        if units > 0:
+            # --- 持仓：跳过净值在阈值内、无清仓信号、也不满足加仓条件的日子 ---
+            while i < n:
+                value = values[i]
+                if value <= sell_lo or value >= sell_hi or exit_[i]:
+                    break
+                if can_buy and add[i] and not value > add_hi:
+                    break
+                i += 1
+            if i == n:
+                break
+            value = values[i]
+            if cost_basis == 0:
+                gain = (units * value - holding_cost) / holding_cost
+            else:
+                gain = value / entry_price - 1
+            if gain <= -stop_loss:
+                action = -1
+            elif gain >= take_profit:
+                action = -2
+            elif exit_[i]:
+                action = -3
+            else:
+                action = 0
+            if action != 0:
+                market_value = units * value
+                total = cash + market_value
+                if sizing == 0:
+                    cash += market_value
+                t_day[n_trades] = i
+                t_action[n_trades] = action
+                t_units[n_trades] = units
+                t_price[n_trades] = value
+                t_gain[n_trades] = gain
+                t_equity[n_trades] = total
+                t_entry_day[n_trades] = entry_day
+                t_entry_price[n_trades] = entry_price
+                t_cash[n_trades] = cash
+                t_position[n_trades] = 0.0
+                n_trades += 1
+                units = 0.0
+                avg_cost = 0.0
+                holding_cost = 0.0
+                entry_price = 0.0
+                entry_day = -1
+                can_buy = cash >= buy_amount if sizing == 0 else units < max_position
+                if not rebuy_on_exit_day or not can_buy or not entry[i]:
+                    i += 1
+                    continue
+                action = 1
+            else:
+                # 候选日未触发卖出：按原条件判断网格加仓
+                if not (can_buy and add[i]) or (grid_step > 0 and not (avg_cost - value) / avg_cost >= grid_step):
+                    i += 1
+                    continue
+                action = 2
+        elif units == 0:
+            # --- 空仓：现金不再变化，无法买入时之后不会再有交易；否则跳到下一个建仓信号 ---
+            if not can_buy:
+                break
+            while i < n and not entry[i]:
+                i += 1
+            if i == n:
+                break
+            value = values[i]
+            action = 1
+        else:
+            # 以 NaN 净值买入后持仓为 NaN，既非空仓也非持仓，与参考实现一致不再交易
+            break
+
+        total = cash + units * value
+        if sizing == 0:
+            bought = buy_amount / value
+            cost = buy_amount
+            cash -= buy_amount
+        else:
+            bought = min(buy_amount, max_position - units)
+            cost = bought * value
+        if action == 1:
+            avg_cost = value
+            entry_price = value
+            entry_day = i
+            units = bought
+        else:
+            avg_cost = (units * avg_cost + cost) / (units + bought)
+            units += bought
+        holding_cost = units * avg_cost
+        can_buy = cash >= buy_amount if sizing == 0 else units < max_position
+        sell_lo, sell_hi, add_hi = _price_bounds(units, avg_cost, holding_cost, entry_price,
+                                                 stop_loss, take_profit, grid_step, cost_basis)
+        t_day[n_trades] = i
+        t_action[n_trades] = action
+        t_units[n_trades] = bought
+        t_price[n_trades] = value
+        t_gain[n_trades] = 0.0
+        t_equity[n_trades] = total
+        t_entry_day[n_trades] = entry_day
+        t_entry_price[n_trades] = entry_price
+        t_cash[n_trades] = cash
+        t_position[n_trades] = units
+        n_trades += 1
+        i += 1
+    return n_trades
+
+
+if njit is not None:
+    _price_bounds = njit(cache=True)(_price_bounds)  # 须先于内核编译，内核按全局名解析
+    _jit_kernel = njit(cache=True)(_kernel)
+else:
+    _jit_kernel = None
+
+
+def _flags(signal, n):
+    if signal is None:
+        return np.zeros(n, dtype=np.bool_)
+    flags = np.asarray(signal, dtype=np.bool_)
+    return np.broadcast_to(flags, (n,)) if flags.ndim == 0 else flags
+
+
+def _flag_list(signal, n):
+    """纯 Python 内核用的信号列表；标量信号直接复制，不经 numpy 转换"""
+    if signal is None:
+        return [False] * n
+    flags = np.asarray(signal, dtype=np.bool_)
+    return [bool(flags)] * n if flags.ndim == 0 else flags.tolist()
+
+
+def run(values, entry, add=None, exit=None, params=None):
+    """
+    运行一次回测。values 为升序净值；entry/add/exit 为布尔数组 (或标量，表示每天相同)，缺省为全 False。
+    返回 dict：equity (交易前每日总资产)、position (交易后每日持仓)、cash、units (期末)、trades (TRADE_DTYPE)。
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    n = len(values)
+    initial_capital = float(p['initial_capital'])
+    scalars = (initial_capital, float(p['buy_amount']), float(p['stop_loss']), float(p['take_profit']),
+               float(p['grid_step']), int(p['cost_basis']), int(p['sizing']), float(p['max_position']),
+               bool(p['rebuy_on_exit_day']))
+
+    if _jit_kernel is not None:
+        entry, add, exit = (np.ascontiguousarray(_flags(s, n)) for s in (entry, add, exit))
+        columns = [np.empty(2 * n, dtype=TRADE_DTYPE[f]) for f in _TRADE_FIELDS]
+        n_trades = _jit_kernel(values, entry, add, exit, *scalars, *columns)
+        columns = [column[:n_trades] for column in columns]
+    else:
+        # 纯 Python 路径：列表的标量读写远快于逐元素访问 numpy 数组；交易记录写入 dict
+        # (按 0..n_trades-1 顺序插入)，免去按 2 × 天数预分配列表的开销
+        columns = [{} for _ in _TRADE_FIELDS]
+        n_trades = _kernel(values.tolist(), *(_flag_list(s, n) for s in (entry, add, exit)), *scalars, *columns)
+        columns = [list(column.values()) for column in columns]
+    trades = np.empty(n_trades, dtype=TRADE_DTYPE)
+    for field, column in zip(_TRADE_FIELDS, columns):
+        trades[field] = column
+
+    # 每日交易后的状态 = 当日及之前最后一笔交易后的状态；交易前的状态即前一日交易后的状态
+    done = np.searchsorted(trades['day'], np.arange(n), side='right')
+    position = np.concatenate([[0.0], trades['position']])[done]
+    cash_after = np.concatenate([[initial_capital], trades['cash']])[done]
+    units_before = np.concatenate([[0.0], position[:-1]])
+    cash_before = np.concatenate([[initial_capital], cash_after[:-1]])
+    return {
+        'equity': cash_before + units_before * values,
+        'position': position,
+        'cash': float(cash_after[-1]) if n else initial_capital,
+        'units': float(position[-1]) if n else 0.0,
+        'trades': trades,
+    }
+
+
+def count_actions(trades, *actions):
+    """统计交易记录中属于 actions 的笔数"""
+    return int(np.isin(trades['action'], actions).sum())
+
+
+def reference_run(df, params=None):
+    """
+    逐行 iterrows 的参考实现 (df 含 value/entry/add/exit 列)，与重构前各回测脚本的写法相同。
+    仅用于校验 run() 的结果与测速，返回值结构与 run() 相同。
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    cash, units, avg_cost, entry_price, entry_day = p['initial_capital'], 0.0, 0.0, 0.0, -1
+    equity, position, trades = [], [], []
+    for i, row in df.iterrows():
+        value = row['value']
+        market_value = units * value
+        total = cash + market_value
+        equity.append(total)
+        exited = False
+        if units > 0:
+            if p['cost_basis'] == COST_AVERAGE:
+                gain = (market_value - units * avg_cost) / (units * avg_cost)
+            else:
+                gain = value / entry_price - 1
+            action = (ACTION_STOP_LOSS if gain <= -p['stop_loss'] else ACTION_TAKE_PROFIT if gain >= p['take_profit']
+                      else ACTION_SIGNAL_EXIT if row['exit'] else 0)
+            if action:
+                if p['sizing'] == SIZING_CASH:
+                    cash += market_value
+                trades.append((i, action, units, value, gain, total, entry_day, entry_price, cash, 0.0))
+                units, avg_cost, entry_price, entry_day, exited = 0.0, 0.0, 0.0, -1, True
+        if exited and not p['rebuy_on_exit_day']:
+            position.append(units)
+            continue
+        can_buy = cash >= p['buy_amount'] if p['sizing'] == SIZING_CASH else units < p['max_position']
+        action = 0
+        if can_buy and units == 0 and row['entry']:
+            action = ACTION_ENTRY
+        elif can_buy and units > 0 and row['add'] and (
+                p['grid_step'] <= 0 or (avg_cost - value) / avg_cost >= p['grid_step']):
+            action = ACTION_ADD
+        if action:
+            total = cash + units * value
+            if p['sizing'] == SIZING_CASH:
+                bought, cost = p['buy_amount'] / value, p['buy_amount']
+                cash -= p['buy_amount']
+            else:
+                bought = min(p['buy_amount'], p['max_position'] - units)
+                cost = bought * value
+            if action == ACTION_ENTRY:
+                avg_cost, entry_price, entry_day, units = value, value, i, bought
+            else:
+                avg_cost = (units * avg_cost + cost) / (units + bought)
+                units += bought
+            trades.append((i, action, bought, value, 0.0, total, entry_day, entry_price, cash, units))
+        position.append(units)
+    return {
+        'equity': np.array(equity, dtype=np.float64),
+        'position': np.array(position, dtype=np.float64),
+        'cash': cash,
+        'units': units,
+        'trades': np.array(trades, dtype=TRADE_DTYPE),
+    }
+
+
+def benchmark(values, entry, add=None, exit=None, params=None, repeat=20):
+    """比对 run() 与 iterrows 参考实现的结果，返回 (是否一致, 内核耗时秒, 参考耗时秒)"""
+    n = len(values)
+    frame = pd.DataFrame({'value': values, 'entry': _flags(entry, n), 'add': _flags(add, n), 'exit': _flags(exit, n)})
+    run(values, entry, add, exit, params)  # 预热 (含 JIT 编译)
+    fast_seconds = np.inf
+    for _ in range(repeat):  # 取多次中最快的一次，排除调度抖动
+        start = time.perf_counter()
+        fast = run(values, entry, add, exit, params)
+        fast_seconds = min(fast_seconds, time.perf_counter() - start)
+    slow_seconds = np.inf
+    for _ in range(3):
+        start = time.perf_counter()
+        slow = reference_run(frame, params)
+        slow_seconds = min(slow_seconds, time.perf_counter() - start)
+    same = (np.array_equal(fast['equity'], slow['equity']) and np.array_equal(fast['position'], slow['position'])
+            and fast['cash'] == slow['cash'] and np.array_equal(fast['trades'], slow['trades']))
+    return same, fast_seconds, slow_seconds
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='回测内核与 iterrows 参考实现的比对与测速')
+    parser.add_argument('csv', help='基金净值 CSV (date,net_value)')
+    parser.add_argument('--rsi-buy', type=float, default=30.0, help='RSI(6) 加仓阈值')
+    args = parser.parse_args()
+
+    import fund_loader
+    df = fund_loader.load_fund_frame(args.csv, columns=['date', 'net_value']).sort_values('date')
+    nav = df['net_value'].to_numpy(dtype=np.float64)
+    delta = np.diff(nav, prepend=np.nan)
+    up = pd.Series(np.where(delta > 0, delta, 0.0)).ewm(span=6, adjust=False).mean()
+    down = pd.Series(np.where(delta < 0, -delta, 0.0)).ewm(span=6, adjust=False).mean()
+    rsi_6 = (100 - 100 / (1 + up / down.replace(0, np.nan))).to_numpy()
+    # 网格补仓参数集 (与 py/backtester_v5 相同的止损止盈与网格步长)
+    same, fast, slow = benchmark(nav, True, rsi_6 <= args.rsi_buy, None, {'grid_step': 0.04})
+    logger.info("%d 行：结果%s，内核 %.2f ms (%s)，iterrows %.1f ms，加速 %.0f 倍",
+                len(nav), '一致' if same else '不一致', fast * 1000, 'numba' if _jit_kernel else '纯 Python',
+                slow * 1000, slow / fast)
@@ -4,6 +4,9 @@ import numpy as np
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor
 
+import fund_loader
+import nav_store
+
 # ==========================================
 # 战法名称：【底部长城 · 超跌放量反弹战法】
 # ==========================================
@@ -29,8 +32,15 @@ def calculate_rsi(series, period=14):
 def analyze_single_file(file_path):
     try:
         symbol = os.path.basename(file_path).replace('.csv', '')
-        # 使用 utf-8-sig 处理 BOM 头
-        df = pd.read_csv(file_path, encoding='utf-8-sig')
+        # 编码与列名由共享读取模块探测并缓存
+        df = fund_loader.load_fund_frame(file_path)
+    except Exception as e:
+        print(f"解析 {file_path} 失败: {e}")
+        return None
+    return analyze_frame(symbol, df)
+
+def analyze_frame(symbol, df):
+    try:
         df.columns = df.columns.str.strip().str.lower() # 统一转小写去空格
         
         # 兼容性映射：中文列名映射到统一键名
@@ -97,7 +107,7 @@ def analyze_single_file(file_path):
                 "战法建议": "超卖反弹" if current_rsi < 30 else "等待放量"
             }
     except Exception as e:
-        print(f"解析 {file_path} 失败: {e}")
+        print(f"解析 {symbol} 失败: {e}")
     return None
 
 def main():
@@ -109,10 +119,16 @@ def main():
         print(f"错误: 未找到数据目录 {data_dir}")
         return
 
-    files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.csv')]
-    
     with ProcessPoolExecutor() as executor:
-        results = list(executor.map(analyze_single_file, files))
+        if data_dir == 'fund_data':
+            # 基金净值只需 date/net_value，直接从列式存储读取，免去逐个解析 CSV
+            panel = nav_store.load_panel(csv_dir=data_dir)
+            frames = [panel.frame(code, ['date', 'net_value']) for code in panel.codes]
+            results = list(executor.map(analyze_frame, panel.codes, frames, chunksize=64))
+        else:
+            files = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.csv')]
+            fund_loader.detect_schemas(files)
+            results = list(executor.map(analyze_single_file, files))
     
     valid_results = [r for r in results if r is not None]
     if not valid_results:
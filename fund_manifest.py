@@ -0,0 +1,198 @@
+"""
+基金数据清单 (Fund Manifest)
+
+抓取脚本在决定是否联网前只需要知道每只基金的最新日期和行数，
+以前的做法是逐个解析 CSV。本模块在 fund_store/manifest.json 中按基金代码记录：
+
+    first_date / last_date   首个、最新净值日期 (YYYY-MM-DD)
+    rows                     数据行数 (主 CSV + 增量日志)
+    size / mtime_ns          文件大小之和、最新修改时间 (主 CSV + 增量日志)
+    sha1                     文件内容哈希
+
+读取时先比对 size/mtime；不一致时再比对哈希 (如 git checkout 只改变了 mtime)，
+只有内容确实变化才重新解析日期列。清单缺失时各条目在首次访问时从文件重建。
+所有写入方 (fund_spider、MarketMonitor) 写完文件后调用 record_append()/refresh()，
+save() 以临时文件替换的方式原子写回。
+
+命令行：python fund_manifest.py   # 从 fund_data/ 全量重建清单
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import nav_store
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = os.path.join(nav_store.STORE_DIR, 'manifest.json')
+MANIFEST_VERSION = 1
+# ==========================================
+
+
+class FundManifest:
+    """线程安全的基金数据清单，条目在读取时按文件状态自动校验"""
+
+    def __init__(self, path=MANIFEST_PATH, csv_dir=nav_store.FUND_DATA_DIR):
+        self.path = path
+        self.csv_dir = csv_dir
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        # 清单缺失或格式不符时从空清单开始，条目在首次访问时从文件重建
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("清单 %s 读取失败，将重建: %s", self.path, e)
+            return False
+        if data.get('version') != MANIFEST_VERSION or data.get('csv_dir') != self.csv_dir:
+            return False
+        self._entries = data.get('funds', {})
+        return True
+
+    def _files(self, fund_code):
+        main = os.path.join(self.csv_dir, f"{fund_code}.csv")
+        if not os.path.exists(main):
+            return []
+        journal = nav_store.journal_path(fund_code, self.csv_dir)
+        return [main, journal] if os.path.exists(journal) else [main]
+
+    def _stat(self, fund_code):
+        # 与列式存储分片中记录的戳相同，二者按同一标准判断 CSV 是否变化
+        return nav_store.source_stamp(fund_code, self.csv_dir)
+
+    def _hash(self, fund_code):
+        digest = hashlib.sha1()
+        for path in self._files(fund_code):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def _scan(self, fund_code, stat):
+        """解析日期列，生成新的清单条目"""
+        filepath = os.path.join(self.csv_dir, f"{fund_code}.csv")
+        dates = pd.to_datetime(nav_store.read_csv_frame(filepath, usecols=['date'])['date'],
+                               format='%Y-%m-%d', errors='coerce').dropna().drop_duplicates()
+        return {
+            'first_date': dates.min().strftime('%Y-%m-%d') if not dates.empty else None,
+            'last_date': dates.max().strftime('%Y-%m-%d') if not dates.empty else None,
+            'rows': int(len(dates)),
+            'size': stat[0],
+            'mtime_ns': stat[1],
+            'sha1': self._hash(fund_code),
+        }
+
+    def entry(self, fund_code):
+        """返回经过校验的清单条目；本地文件不存在时返回 None"""
+        with self._lock:
+            stat = self._stat(fund_code)
+            if stat is None:
+                if self._entries.pop(fund_code, None) is not None:
+                    self._dirty = True
+                return None
+
+            entry = self._entries.get(fund_code)
+            if entry and (entry['size'], entry['mtime_ns']) == stat:
+                return entry
+            if entry and entry['size'] == stat[0] and entry['sha1'] == self._hash(fund_code):
+                # 内容未变，只是修改时间不同 (例如 git checkout)
+                entry['mtime_ns'] = stat[1]
+                self._dirty = True
+                return entry
+
+            try:
+                entry = self._scan(fund_code, stat)
+            except Exception as e:
+                logger.warning("扫描基金 %s 本地数据失败: %s", fund_code, e)
+                return None
+            self._entries[fund_code] = entry
+            self._dirty = True
+            return entry
+
+    def latest_date(self, fund_code):
+        """返回本地最新净值日期 (datetime.date)，无数据时返回 None"""
+        entry = self.entry(fund_code)
+        if not entry or not entry['last_date']:
+            return None
+        return datetime.strptime(entry['last_date'], '%Y-%m-%d').date()
+
+    def row_count(self, fund_code):
+        entry = self.entry(fund_code)
+        return entry['rows'] if entry else 0
+
+    def record_append(self, fund_code, new_dates):
+        """
+        写入方追加新行后调用：new_dates 为本次新增的日期 (均晚于原最新日期)，
+        直接合并到原条目，无需重新解析文件。
+        """
+        with self._lock:
+            stat = self._stat(fund_code)
+            entry = self._entries.get(fund_code)
+            dates = pd.to_datetime(pd.Series(list(new_dates)), errors='coerce').dropna()
+            if stat is None or entry is None or entry['last_date'] is None or dates.empty:
+                self._entries.pop(fund_code, None)
+                return self.entry(fund_code)
+
+            entry.update({
+                'first_date': min(entry['first_date'], dates.min().strftime('%Y-%m-%d')),
+                'last_date': max(entry['last_date'], dates.max().strftime('%Y-%m-%d')),
+                'rows': entry['rows'] + int(dates.nunique()),
+                'size': stat[0],
+                'mtime_ns': stat[1],
+                'sha1': self._hash(fund_code),
+            })
+            self._dirty = True
+            return entry
+
+    def refresh(self, fund_code):
+        """写入方整体重写文件后调用，强制重新扫描该基金"""
+        with self._lock:
+            self._entries.pop(fund_code, None)
+            return self.entry(fund_code)
+
+    def rebuild(self):
+        """从 CSV 目录全量重建清单"""
+        start = time.time()
+        with self._lock:
+            self._entries = {}
+            if os.path.isdir(self.csv_dir):
+                for name in sorted(os.listdir(self.csv_dir)):
+                    fund_code, ext = os.path.splitext(name)
+                    if ext == '.csv' and len(fund_code) == 6 and fund_code.isdigit():
+                        self.entry(fund_code)
+            self._dirty = True
+        logger.info("基金清单重建完成: %d 只基金，耗时 %.2f 秒", len(self._entries), time.time() - start)
+
+    def save(self):
+        """若有变更，原子写回清单文件"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            data = {'version': MANIFEST_VERSION, 'csv_dir': self.csv_dir,
+                    'funds': dict(sorted(self._entries.items()))}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=0)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            return True
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    manifest = FundManifest()
+    manifest.rebuild()
+    manifest.save()
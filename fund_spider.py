@@ -1,17 +1,22 @@
 import pandas as pd
-import requests
 import os
 import time
 import asyncio
 import aiohttp
 from aiohttp import ClientSession
-from bs4 import BeautifulSoup
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
+import json
 import logging
 import concurrent.futures
 from functools import partial
 
+import fund_manifest
+import http_cache
+import lsjz_parser
+import nav_store
+import rate_limiter
+
 # ================= 配置区 =================
 # 配置日志输出格式
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,6 +26,10 @@ INPUT_FILE = 'C类.txt'        # 输入基金代码文件
 OUTPUT_DIR = 'fund_data'     # 输出文件夹
 # 天天基金历史净值 API 地址
 BASE_URL_NET_VALUE = "http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={fund_code}&page={page_index}&per=20"
+# 增量模式：只请求 (本地最新日期, 今天] 的日期区间，单页取满，日常更新每只基金通常一次请求
+BASE_URL_NET_VALUE_RANGE = ("http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={fund_code}"
+                            "&page={page_index}&per={per}&sdate={sdate}&edate={edate}")
+RANGE_PAGE_SIZE = 49         # 接口单页最多返回的行数
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -28,9 +37,18 @@ HEADERS = {
 }
 
 REQUEST_TIMEOUT = 30
-REQUEST_DELAY = 3.5          # 请求页面的基础延迟
-MAX_CONCURRENT = 15          # 最大并发抓取基金数
+MAX_CONCURRENT = 15          # 最大并发抓取基金数 (请求速率由 rate_limiter 按主机自适应控制)
+THROTTLE_RETRIES = 3         # 被限流 (514 等) 或超时的请求在限速器减速后重试的次数
 MAX_FUNDS_PER_RUN = 0        # 限制运行数量，0表示抓取全部
+# 首次回填按自然年日期区间分块抓取，已结束的年度逐行追加到 fund_data/backfill/<code>.jsonl，中断后重跑只补缺块。
+# 该目录随 fund_data 由爬虫工作流提交，CI 中断的回填在下次运行时续传；回填落盘后断点即删除
+BACKFILL_DIR = os.path.join(OUTPUT_DIR, 'backfill')
+CHECKPOINT_FORMAT = 'year-range'   # 断点文件首行的格式标记，与之不符的旧断点 (按页码) 直接丢弃
+
+# 列式存储写入器：save_to_csv 暂存，抓取结束后统一落盘
+NAV_WRITER = nav_store.NavStoreWriter(csv_dir=OUTPUT_DIR)
+# 基金清单：记录各基金本地最新日期/行数，免去逐个解析 CSV
+MANIFEST = fund_manifest.FundManifest(csv_dir=OUTPUT_DIR)
 # ==========================================
 
 def get_all_fund_codes(file_path):
@@ -59,98 +77,189 @@ def get_all_fund_codes(file_path):
         return []
 
 def load_latest_date(fund_code):
-    """读取本地 CSV 以获取增量抓取的起始日期"""
-    output_path = os.path.join(OUTPUT_DIR, f"{fund_code}.csv")
-    if os.path.exists(output_path):
+    """从基金清单获取增量抓取的起始日期 (清单条目过期时才会重新解析本地文件)"""
+    try:
+        return MANIFEST.latest_date(fund_code)
+    except Exception:
+        return None
+
+async def fetch_page(session, url):
+    """
+    执行异步 HTTP GET 请求。先查 http_cache (命中时不联网)；联网前向共享限速器取令牌，并回报响应状态，
+    被限流或超时的请求在限速器减速后重试，不再直接判为失败。
+    """
+    cached = http_cache.lookup(url)
+    if cached is not None:
+        return cached.text
+    limiter = rate_limiter.limiter_for(url)
+    for _ in range(THROTTLE_RETRIES + 1):
+        await limiter.acquire_async()
         try:
-            # 仅读取 date 列以提高速度
-            df = pd.read_csv(output_path, usecols=['date'], parse_dates=['date'], encoding='utf-8')
-            if not df.empty:
-                return df['date'].max().to_pydatetime().date()
-        except Exception:
+            async with session.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT) as response:
+                limiter.record(response.status)
+                if response.status == 200:
+                    text = await response.text()
+                    http_cache.store(url, 200, text, response.charset, response.content_type)
+                    return text
+                if response.status not in rate_limiter.THROTTLE_STATUS:
+                    raise aiohttp.ClientError(f"HTTP 错误: {response.status}")
+                error = aiohttp.ClientError(f"触发频率限制 ({response.status})")
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            limiter.record_error()
+            error = e
+    raise error
+
+def to_record(row):
+    """LsjzRow → save_to_csv 使用的记录字典 (数值已由解析器转换，save_to_csv 的格式处理对其同样适用)"""
+    return {
+        'date': row.date.strftime('%Y-%m-%d'),
+        'net_value': row.net_value,
+        'cumulative_net_value': row.cumulative_net_value,
+        'daily_growth_rate': row.daily_growth_rate,
+        'purchase_status': row.purchase_status,
+        'redemption_status': row.redemption_status,
+        'dividend': row.dividend
+    }
+
+def checkpoint_path(fund_code):
+    return os.path.join(BACKFILL_DIR, f"{fund_code}.jsonl")
+
+def load_checkpoint(fund_code):
+    """
+    读取回填断点，返回 {(sdate, edate): 记录列表}。
+    断点按日期区间记录，只保存已结束的区间，接口新增净值不影响已保存的内容；格式不符的旧断点返回 None。
+    """
+    path = checkpoint_path(fund_code)
+    chunks = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('format') != CHECKPOINT_FORMAT:
+                logger.info(f"基金 {fund_code} 回填断点格式已变化，丢弃")
+                return None
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # 中断时写了一半的行
+                chunks[(entry['sdate'], entry['edate'])] = entry['records']
+    except (OSError, ValueError):
+        return None
+    return chunks
+
+def start_checkpoint(fund_code):
+    os.makedirs(BACKFILL_DIR, exist_ok=True)
+    with open(checkpoint_path(fund_code), 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'format': CHECKPOINT_FORMAT}) + '\n')
+
+def append_checkpoint(fund_code, chunk, records):
+    sdate, edate = chunk
+    with open(checkpoint_path(fund_code), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'sdate': sdate, 'edate': edate, 'records': records}, ensure_ascii=False) + '\n')
+
+def clear_checkpoint(fund_code):
+    try:
+        os.remove(checkpoint_path(fund_code))
+    except FileNotFoundError:
+        pass
+
+def backfill_chunks(oldest, newest):
+    """覆盖 [oldest, newest] 的自然年区间 [(sdate, edate)]，从最新年度开始"""
+    return [(f"{year}-01-01", f"{year}-12-31") for year in range(newest.year, oldest.year - 1, -1)]
+
+async def fetch_range_rows(fund_code, session, sdate, edate):
+    """按日期区间 [sdate, edate] 单页取满逐页抓取，返回 LsjzRow 列表 (最新在前)；接口无数据表时返回 None"""
+    rows = []
+    page_index, total_pages = 1, 1
+    while page_index <= total_pages:
+        url = BASE_URL_NET_VALUE_RANGE.format(fund_code=fund_code, page_index=page_index, per=RANGE_PAGE_SIZE,
+                                              sdate=sdate, edate=edate)
+        page = lsjz_parser.parse_page(await fetch_page(session, url))
+        if page is None:
+            http_cache.invalidate(url)
             return None
-    return None
+        total_pages = page.pages
+        rows.extend(page.rows)
+        page_index += 1
+    return rows
 
-async def fetch_page(session, url):
-    """执行异步 HTTP GET 请求"""
-    async with session.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT) as response:
-        if response.status == 200:
-            return await response.text()
-        elif response.status == 514:
-            raise aiohttp.ClientError("触发频率限制 (514)")
-        else:
-            raise aiohttp.ClientError(f"HTTP 错误: {response.status}")
+async def fetch_range(fund_code, session, latest_date):
+    """增量抓取：按日期区间请求 (latest_date, 今天]，区间超过一页时才继续翻页"""
+    sdate = (latest_date + timedelta(days=1)).strftime('%Y-%m-%d')
+    edate = datetime.now().strftime('%Y-%m-%d')
+    rows = await fetch_range_rows(fund_code, session, sdate, edate)
+    if rows is None:
+        return "无数据表"
+    # 防御接口忽略 sdate 的情况，仍按本地最新日期过滤
+    all_records = [to_record(row) for row in rows if row.date > latest_date]
+
+    if not all_records:
+        return f"已是最新 ({latest_date})"
+    return all_records
+
+async def fetch_history(fund_code, session):
+    """
+    首次回填：首页与末页给出最新/最早净值日期，据此按自然年日期区间并发抓取 (速率由共享限速器控制)，
+    按区间从新到旧拼接。已结束的年度取回即写入断点；部分区间失败时返回错误，已取回的区间留待下次运行续传。
+    """
+    url = BASE_URL_NET_VALUE.format(fund_code=fund_code, page_index=1)
+    first = lsjz_parser.parse_page(await fetch_page(session, url))
+    if first is None:
+        http_cache.invalidate(url)
+        return "无数据表"
+    if not first.rows:
+        return "记录为空"
+    if first.pages <= 1:
+        return [to_record(row) for row in first.rows]
+
+    last_url = BASE_URL_NET_VALUE.format(fund_code=fund_code, page_index=first.pages)
+    last = lsjz_parser.parse_page(await fetch_page(session, last_url))
+    if last is None or not last.rows:
+        http_cache.invalidate(last_url)
+        return "末页无数据表"
+    chunks = backfill_chunks(last.rows[-1].date, first.rows[0].date)
+
+    done = load_checkpoint(fund_code)
+    if done is None:
+        done = {}
+        start_checkpoint(fund_code)
+    missing = [chunk for chunk in chunks if chunk not in done]
+    logger.info(f"基金 {fund_code} 回填 {len(chunks)} 个年度区间，断点已有 {len(chunks) - len(missing)} 个")
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    async def fetch_one(chunk):
+        rows = await fetch_range_rows(fund_code, session, *chunk)
+        if rows is None:
+            raise ValueError(f"区间 {chunk[0]}~{chunk[1]} 无数据表")
+        records = [to_record(row) for row in rows]
+        if chunk[1] < today:  # 区间已结束，内容不再变化
+            append_checkpoint(fund_code, chunk, records)
+        done[chunk] = records
+
+    results = await asyncio.gather(*(fetch_one(chunk) for chunk in missing), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        return f"回填未完成 ({len(errors)}/{len(chunks)} 个区间失败，下次运行续传): {errors[0]}"
+
+    return [record for chunk in chunks for record in done[chunk]]
 
 async def fetch_net_values(fund_code, session, semaphore, executor):
-    """核心抓取函数：支持 ETF 增量逻辑"""
+    """
+    核心抓取函数：本地已有数据时按日期区间增量抓取 (通常一次请求)，否则并发回填全部历史。
+    返回 (基金代码, 记录列表)；无需保存时第二项为说明字符串。
+    """
     async with semaphore:
         logger.info(f"开始处理基金: {fund_code}")
-        all_records = []
-        
+
         # 线程池异步读取本地最新日期
         latest_date = await asyncio.get_event_loop().run_in_executor(executor, load_latest_date, fund_code)
-        
+
         try:
-            # 1. 抓取第一页获取总信息
-            url_p1 = BASE_URL_NET_VALUE.format(fund_code=fund_code, page_index=1)
-            text = await fetch_page(session, url_p1)
-            
-            # 解析总页数
-            total_pages_match = re.search(r'pages:(\d+)', text)
-            total_pages = int(total_pages_match.group(1)) if total_pages_match else 1
-            
-            soup = BeautifulSoup(text, 'lxml')
-            table = soup.find('table')
-            if not table:
-                return fund_code, "无数据表"
-                
-            rows = table.find_all('tr')[1:] # 跳过表头
-            if not rows:
-                return fund_code, "记录为空"
-
-            # 检查 API 最新日期
-            api_latest_str = rows[0].find_all('td')[0].text.strip()
-            api_latest_date = datetime.strptime(api_latest_str, '%Y-%m-%d').date()
-
-            # 如果本地已是最新，直接跳过
-            if latest_date and api_latest_date <= latest_date:
-                return fund_code, f"已是最新 ({latest_date})"
-
-            # 2. 循环抓取各页
-            page_index = 1
-            stop_fetch = False
-            while page_index <= total_pages and not stop_fetch:
-                if page_index > 1:
-                    await asyncio.sleep(REQUEST_DELAY)
-                    current_url = BASE_URL_NET_VALUE.format(fund_code=fund_code, page_index=page_index)
-                    text = await fetch_page(session, current_url)
-                    rows = BeautifulSoup(text, 'lxml').find('table').find_all('tr')[1:]
-
-                for row in rows:
-                    tds = row.find_all('td')
-                    if len(tds) < 7: continue
-                    
-                    date_str = tds[0].text.strip()
-                    row_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-                    # 增量终止条件
-                    if latest_date and row_date <= latest_date:
-                        stop_fetch = True
-                        break
-
-                    # 收集数据项
-                    all_records.append({
-                        'date': date_str,
-                        'net_value': tds[1].text.strip(),
-                        'cumulative_net_value': tds[2].text.strip(),
-                        'daily_growth_rate': tds[3].text.strip(),
-                        'purchase_status': tds[4].text.strip(),
-                        'redemption_status': tds[5].text.strip(),
-                        'dividend': tds[6].text.strip() if len(tds) > 6 else ''
-                    })
-                page_index += 1
-
-            return fund_code, all_records
+            if latest_date:
+                result = await fetch_range(fund_code, session, latest_date)
+            else:
+                result = await fetch_history(fund_code, session)
+            return fund_code, result
 
         except Exception as e:
             logger.error(f"抓取基金 {fund_code} 异常: {e}")
@@ -158,10 +267,11 @@ async def fetch_net_values(fund_code, session, semaphore, executor):
 
 def save_to_csv(fund_code, data):
     """
-    修改后的保存逻辑：针对 ETF 格式进行适配
+    增量保存逻辑：针对 ETF 格式进行适配
     格式：date, net_value, cumulative_net_value, daily_growth_rate, purchase_status, redemption_status, dividend
+    新增行追加到 fund_data/journal/<code>.csv，累计一定行数后由 nav_store 合并回主文件，
+    不再每次读取并重写完整历史。
     """
-    output_path = os.path.join(OUTPUT_DIR, f"{fund_code}.csv")
     if not isinstance(data, list) or not data:
         return False, 0
 
@@ -188,37 +298,28 @@ def save_to_csv(fund_code, data):
         new_df['date'] = pd.to_datetime(new_df['date'], errors='coerce')
         new_df.dropna(subset=['date'], inplace=True)
 
-        # 4. 读取旧数据合并
-        old_count = 0
-        if os.path.exists(output_path):
-            old_df = pd.read_csv(output_path, parse_dates=['date'], encoding='utf-8')
-            old_count = len(old_df)
-            combined = pd.concat([new_df, old_df], ignore_index=True)
-        else:
-            combined = new_df
-
-        # 5. 去重、排序、格式化日期
-        combined.drop_duplicates(subset=['date'], keep='first', inplace=True)
-        combined.sort_values(by='date', ascending=False, inplace=True)
-        combined['date'] = combined['date'].dt.strftime('%Y-%m-%d')
-
-        # 6. 强制列顺序 (确保满足用户要求的 CSV 结构)
-        target_cols = ['date', 'net_value', 'cumulative_net_value', 'daily_growth_rate', 
-                       'purchase_status', 'redemption_status', 'dividend']
-        
-        for col in target_cols:
-            if col not in combined.columns:
-                combined[col] = "" # 缺失列补全
+        # 4. 新增行去重、排序、格式化日期 (抓取已在本地最新日期处截止，无需读取旧数据)
+        new_df.drop_duplicates(subset=['date'], keep='first', inplace=True)
+        new_df.sort_values(by='date', ascending=False, inplace=True)
+        new_df['date'] = new_df['date'].dt.strftime('%Y-%m-%d')
+
+        # 5. 强制列顺序 (确保满足用户要求的 CSV 结构)
+        for col in nav_store.CSV_COLUMNS:
+            if col not in new_df.columns:
+                new_df[col] = "" # 缺失列补全
         
-        final_df = combined[target_cols]
+        final_df = new_df[nav_store.CSV_COLUMNS]
+        if final_df.empty:
+            return True, 0
 
-        # 7. 写入文件
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-        final_df.to_csv(output_path, index=False, encoding='utf-8')
+        # 6. 追加写入 CSV 导出与列式存储
+        nav_store.append_csv_rows(fund_code, final_df, csv_dir=OUTPUT_DIR)
+        NAV_WRITER.append(fund_code, final_df)
+        MANIFEST.record_append(fund_code, final_df['date'])
         
-        added = len(final_df) - old_count
-        logger.info(f"基金 {fund_code} 保存成功: 新增 {max(0, added)} 条记录")
-        return True, max(0, added)
+        added = len(final_df)
+        logger.info(f"基金 {fund_code} 保存成功: 新增 {added} 条记录")
+        return True, added
 
     except Exception as e:
         logger.error(f"保存基金 {fund_code} 失败: {e}")
@@ -251,12 +352,18 @@ async def fetch_all_funds(fund_codes):
                     if ok:
                         success_count += 1
                         total_added += count
+                        clear_checkpoint(fund_code)  # 回填结果已写入本地，断点不再需要
                     else:
                         failed_list.append(fund_code)
                 else:
                     # 如果不是列表，可能是“已最新”或“错误”
                     if "已是最新" not in str(result):
                         failed_list.append(fund_code)
+
+            # 将本次更新的基金统一写入列式存储，并保存基金清单
+            await loop.run_in_executor(executor, NAV_WRITER.flush)
+            await loop.run_in_executor(executor, MANIFEST.save)
+            rate_limiter.log_summary()
             
             return success_count, total_added, failed_list
 
@@ -268,6 +375,7 @@ def main():
     
     # 初始化环境
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(NAV_WRITER.store_dir, exist_ok=True)
     
     # 读取代码
     codes = get_all_fund_codes(INPUT_FILE)
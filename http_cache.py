@@ -0,0 +1,261 @@
+"""
+爬虫 HTTP 响应缓存 (Record / Replay)
+
+所有爬虫都只能联网运行：解析逻辑有误时重跑一遍就要重新抓取全部页面，爬虫的性能测试也无法离线进行。
+本模块在请求层加一层透明缓存，把 GET 响应保存在 .http_cache/ 下：
+
+    objects/ab/<sha256>       响应正文，按内容的 sha256 寻址 (相同内容只存一份)
+    index/cd/<key>.json       请求键 → {url, status, encoding, content_type, sha256, fetched_at}
+
+请求键由 URL 与查询参数规范化后求 sha256 (忽略 rt/_ 等随机防缓存参数)。
+工作模式由环境变量 HTTP_CACHE_MODE 选择：
+
+    cache   (默认) 按 TTL_RULES 中各类接口的有效期复用缓存，过期或未命中时联网并记录；
+            历史净值只复用 edate 早于今天的区间 (见 LSJZ_CLOSED_RANGE_TTL)，其余净值页总是联网
+    record  始终联网，并记录响应
+    replay  只读缓存、忽略有效期，未命中时抛出 CacheMiss (不联网)，用于离线重放与性能测试
+    off     不读不写缓存
+
+命中缓存的请求不经过 rate_limiter，因此重放以磁盘速度进行。
+调用方式：
+    http_cache.get(url, ...)                  代替 rate_limiter.get (同步 requests 调用方)
+    http_cache.lookup(url) / http_cache.store(url, ...)   异步调用方 (aiohttp) 自行收发时使用
+    http_cache.invalidate(url)                响应无法解析时删除该条目
+    http_cache.install()                      拦截第三方库 (akshare) 经 requests 发出的 GET 请求
+
+命令行：python http_cache.py --stats          # 缓存条目数与占用空间
+        python http_cache.py --prune 30        # 删除 30 天前记录的条目及不再引用的正文
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import rate_limiter
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = '.http_cache'
+MODE = os.environ.get('HTTP_CACHE_MODE', 'cache')
+MODES = ('cache', 'record', 'replay', 'off')
+
+# 历史净值接口：只有 edate 早于今天的日期区间内容固定，可长期复用；不带区间的分页 (新净值会使各页整体后移)
+# 与截至今天的区间 (增量抓取当天重跑须能取到晚间新出的净值) 有效期为 0，cache 模式下总是联网
+LSJZ_PATTERN = re.compile(r'F10DataApi\.aspx\?.*type=lsjz')
+LSJZ_CLOSED_RANGE_TTL = 30 * 86400
+LSJZ_OPEN_TTL = 0
+# 其他接口的缓存有效期 (秒)，按顺序匹配 URL，均不匹配时使用 DEFAULT_TTL
+TTL_RULES = [
+    (re.compile(r'FundArchivesDatas\.aspx\?.*type=jjcc'), 86400),          # 持仓明细：按季度更新
+    (re.compile(r'/(jbgk|jjfl|jjjl|ccmx)_\d{6}\.html'), 7 * 86400),      # 概况/费率/经理/持仓页
+    (re.compile(r'fundcode_search\.js'), 86400),                           # 基金代码列表
+]
+DEFAULT_TTL = 3600
+IGNORED_PARAMS = {'rt', '_', 'v'}    # 随机数/时间戳参数，不参与请求键
+# ==========================================
+
+
+class CacheMiss(requests.exceptions.ConnectionError):
+    """replay 模式下缓存未命中 (继承 ConnectionError，调用方原有的网络异常处理同样适用)"""
+
+
+_local = threading.local()
+
+
+def set_mode(mode):
+    global MODE
+    if mode not in MODES:
+        raise ValueError(f"未知的缓存模式: {mode} (可选 {', '.join(MODES)})")
+    MODE = mode
+
+
+def canonical_url(url, params=None):
+    """合并查询参数、去掉随机参数并排序，得到用于缓存键的规范 URL"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += [(k, str(v)) for k, v in (params.items() if isinstance(params, dict) else params)]
+    query = sorted((k, v) for k, v in query if k not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+
+def _key(url, params=None):
+    return hashlib.sha256(('GET ' + canonical_url(url, params)).encode('utf-8')).hexdigest()
+
+
+def _index_path(key):
+    return os.path.join(CACHE_DIR, 'index', key[:2], key + '.json')
+
+
+def _object_path(digest):
+    return os.path.join(CACHE_DIR, 'objects', digest[:2], digest)
+
+
+def _lsjz_ttl(url):
+    edate = dict(parse_qsl(urlsplit(url).query, keep_blank_values=True)).get('edate', '')
+    if edate and edate < time.strftime('%Y-%m-%d'):
+        return LSJZ_CLOSED_RANGE_TTL
+    return LSJZ_OPEN_TTL
+
+
+def ttl_for(url):
+    if LSJZ_PATTERN.search(url):
+        return _lsjz_ttl(url)
+    for pattern, ttl in TTL_RULES:
+        if pattern.search(url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _response(url, status, content, encoding=None, content_type=None):
+    """由缓存内容构造 requests.Response，调用方可照常使用 .text/.json()/.raise_for_status()"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = content
+    response.encoding = encoding
+    response.url = url
+    response.headers = CaseInsensitiveDict({'Content-Type': content_type} if content_type else {})
+    return response
+
+
+def lookup(url, params=None):
+    """
+    查询缓存：命中 (且在 cache 模式下未过期) 时返回 requests.Response，否则返回 None。
+    replay 模式下未命中抛出 CacheMiss；record/off 模式总是返回 None。
+    """
+    if MODE in ('record', 'off'):
+        return None
+    try:
+        with open(_index_path(_key(url, params)), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if MODE == 'cache' and time.time() - entry['fetched_at'] > ttl_for(canonical_url(url, params)):
+            return None
+        with open(_object_path(entry['sha256']), 'rb') as f:
+            content = f.read()
+    except (OSError, ValueError, KeyError):
+        if MODE == 'replay':
+            raise CacheMiss(f"缓存未命中 (replay 模式): {canonical_url(url, params)}")
+        return None
+    return _response(url, entry['status'], content, entry.get('encoding'), entry.get('content_type'))
+
+
+def store(url, status, content, encoding=None, content_type=None, params=None):
+    """记录一次成功响应 (只缓存 200)；content 为 bytes 或 str (str 按 encoding 或 utf-8 编码)"""
+    if MODE in ('replay', 'off') or status != 200:
+        return
+    if isinstance(content, str):
+        encoding = encoding or 'utf-8'
+        content = content.encode(encoding)
+    digest = hashlib.sha256(content).hexdigest()
+    try:
+        if not os.path.exists(_object_path(digest)):
+            _atomic_write(_object_path(digest), content)
+        entry = {'url': canonical_url(url, params), 'status': status, 'encoding': encoding,
+                 'content_type': content_type, 'sha256': digest, 'fetched_at': time.time()}
+        _atomic_write(_index_path(_key(url, params)), json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+    except OSError as e:
+        logger.warning("写入 HTTP 缓存失败 (%s): %s", url, e)
+
+
+def invalidate(url, params=None):
+    """删除一条缓存 (调用方发现响应内容无法解析时使用，避免在有效期内反复命中坏页面)"""
+    try:
+        os.remove(_index_path(_key(url, params)))
+    except OSError:
+        pass
+
+
+def get(url, session=None, params=None, **kwargs):
+    """带缓存的 GET：命中直接返回，未命中时经 rate_limiter.get 联网并记录响应"""
+    cached = lookup(url, params)
+    if cached is not None:
+        return cached
+    _local.bypass = True    # 避免 install() 的拦截对同一请求重复查询/记录
+    try:
+        response = rate_limiter.get(url, session=session, params=params, **kwargs)
+    finally:
+        _local.bypass = False
+    store(url, response.status_code, response.content, response.encoding,
+          response.headers.get('Content-Type'), params)
+    return response
+
+
+_original_request = requests.Session.request
+
+
+def _cached_request(self, method, url, params=None, **kwargs):
+    if method.upper() != 'GET' or MODE == 'off' or getattr(_local, 'bypass', False):
+        return _original_request(self, method, url, params=params, **kwargs)
+    cached = lookup(url, params)
+    if cached is not None:
+        return cached
+    response = _original_request(self, method, url, params=params, **kwargs)
+    store(url, response.status_code, response.content, response.encoding,
+          response.headers.get('Content-Type'), params)
+    return response
+
+
+def install():
+    """让本进程内所有经 requests 发出的 GET 请求 (包括 akshare 内部请求) 都经过缓存"""
+    requests.Session.request = _cached_request
+
+
+def stats():
+    entries = glob.glob(os.path.join(CACHE_DIR, 'index', '*', '*.json'))
+    objects = glob.glob(os.path.join(CACHE_DIR, 'objects', '*', '*'))
+    return len(entries), len(objects), sum(os.path.getsize(p) for p in objects)
+
+
+def prune(max_age_days):
+    """删除早于 max_age_days 天记录的条目，以及不再被任何条目引用的正文，返回 (删除条目数, 删除正文数)"""
+    cutoff = time.time() - max_age_days * 86400
+    referenced, removed_entries = set(), 0
+    for path in glob.glob(os.path.join(CACHE_DIR, 'index', '*', '*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = {}
+        if entry.get('fetched_at', 0) < cutoff:
+            os.remove(path)
+            removed_entries += 1
+        else:
+            referenced.add(entry.get('sha256'))
+    removed_objects = 0
+    for path in glob.glob(os.path.join(CACHE_DIR, 'objects', '*', '*')):
+        if os.path.basename(path) not in referenced:
+            os.remove(path)
+            removed_objects += 1
+    return removed_entries, removed_objects
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='爬虫 HTTP 响应缓存')
+    parser.add_argument('--stats', action='store_true', help='显示缓存条目数与占用空间')
+    parser.add_argument('--prune', type=float, metavar='DAYS', help='删除 DAYS 天前记录的条目')
+    args = parser.parse_args()
+
+    if args.prune is not None:
+        removed = prune(args.prune)
+        logger.info("已删除 %d 个条目、%d 份正文", *removed)
+    n_entries, n_objects, size = stats()
+    logger.info("缓存目录 %s: %d 个条目，%d 份正文，共 %.1f MB", CACHE_DIR, n_entries, n_objects, size / 1e6)
@@ -0,0 +1,292 @@
+"""
+指数数据存储 (Index Store)
+
+多个指数序列统一保存在 index_data/ 下的一个存储中，并按指数记录最新日期，
+下载脚本据此只抓取缺失的日期区间：
+
+    index_data/index_store.npz    所有指数的列数组
+        names       序列名 (U32)
+        offsets     各序列在列数组中的起止位置 (int64)
+        date        日期 (datetime64[D], 每个序列内部升序)
+        net_value   收盘价/净值 (float64)
+    index_data/index_store.json   每个序列的 first_date / last_date / rows / source / updated_at
+    index_data/<序列名>.csv        CSV 导出 (date,net_value，升序)，与旧版 000300.csv 格式一致
+
+序列名即指数代码；来源不同的同代码序列加前缀区分 (如 akshare 行情为 'ak_000905')。
+
+读取方统一使用 load_index_store()：同一进程内按文件修改时间缓存，
+MarketMonitor、ell_decision、backtest_module 直接从内存取升序序列或按日期对齐的多指数表。
+存储缺失时自动从 index_data/*.csv 迁移。
+
+命令行：python index_store.py   # 加载存储 (缺失时从 CSV 迁移) 并打印各序列概况
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import http_cache
+import lsjz_parser
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = 'index_data'
+STORE_FILE = 'index_store.npz'
+META_FILE = 'index_store.json'
+MARKET_INDEX = '000300'          # 大盘基准序列
+
+LSJZ_URL = 'http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={code}&page={page}&per={per}'
+LSJZ_PAGE_SIZE = 20
+# 增量模式：按日期区间 (本地最新日期, 今天] 请求，单页取满，日常更新一次请求即可
+LSJZ_RANGE_URL = LSJZ_URL + '&sdate={sdate}&edate={edate}'
+LSJZ_RANGE_PAGE_SIZE = 49        # 接口单页最多返回的行数
+# ==========================================
+
+
+def _csv_name(name):
+    return re.sub(r'[^0-9A-Za-z_.-]', '_', name) + '.csv'
+
+
+def _to_arrays(df):
+    """DataFrame (date, net_value) → 升序、按日期去重 (保留先出现的行) 的列数组"""
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    values = pd.to_numeric(df['net_value'], errors='coerce').to_numpy(dtype=np.float64)
+    valid = dates.notna().to_numpy() & ~np.isnan(values)
+    date_arr = dates.to_numpy()[valid].astype('datetime64[D]')
+    values = values[valid]
+    order = np.argsort(date_arr, kind='stable')
+    date_arr, values = date_arr[order], values[order]
+    keep = np.ones(len(date_arr), dtype=bool)
+    keep[1:] = date_arr[1:] != date_arr[:-1]
+    return {'date': date_arr[keep], 'net_value': values[keep]}
+
+
+class IndexStore:
+    """多指数序列存储，读取时整体加载到内存"""
+
+    def __init__(self, data_dir=INDEX_DIR):
+        self.data_dir = data_dir
+        self.series_arrays = {}
+        self.meta = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        if os.path.exists(self._path(STORE_FILE)):
+            self._load()
+        else:
+            self._migrate_csv()
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def _load(self):
+        with np.load(self._path(STORE_FILE), allow_pickle=False) as npz:
+            names, offsets = npz['names'], npz['offsets']
+            dates, values = npz['date'], npz['net_value']
+        self.series_arrays = {
+            str(name): {'date': dates[offsets[i]:offsets[i + 1]], 'net_value': values[offsets[i]:offsets[i + 1]]}
+            for i, name in enumerate(names)
+        }
+        if os.path.exists(self._path(META_FILE)):
+            with open(self._path(META_FILE), 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+
+    def _migrate_csv(self):
+        """首次使用时把已有的 index_data/*.csv 导入存储"""
+        for path in sorted(glob.glob(os.path.join(self.data_dir, '*.csv'))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                df = pd.read_csv(path, usecols=['date', 'net_value'])
+            except (ValueError, OSError) as e:
+                logger.warning("跳过无法识别的指数文件 %s: %s", path, e)
+                continue
+            self.update(name, df, source='csv')
+        if self._dirty:
+            logger.info("已从 CSV 迁移 %d 个指数序列到 %s", len(self._dirty), self._path(STORE_FILE))
+
+    @property
+    def names(self):
+        return sorted(self.series_arrays)
+
+    def __contains__(self, name):
+        return name in self.series_arrays
+
+    def last_date(self, name):
+        """返回序列最新日期 (datetime.date)，序列不存在时返回 None"""
+        arrays = self.series_arrays.get(name)
+        if arrays is None or len(arrays['date']) == 0:
+            return None
+        return arrays['date'][-1].astype(object)
+
+    def arrays(self, name):
+        return self.series_arrays[name]
+
+    def series(self, name, start=None, end=None):
+        """返回升序 DataFrame (date, net_value)；序列不存在时返回空 DataFrame"""
+        arrays = self.series_arrays.get(name)
+        if arrays is None:
+            return pd.DataFrame(columns=['date', 'net_value'])
+        lo = 0 if start is None else int(np.searchsorted(arrays['date'], np.datetime64(pd.Timestamp(start).date(), 'D')))
+        hi = len(arrays['date']) if end is None else int(np.searchsorted(arrays['date'], np.datetime64(pd.Timestamp(end).date(), 'D'), side='right'))
+        return pd.DataFrame({
+            'date': pd.to_datetime(arrays['date'][lo:hi]),
+            'net_value': arrays['net_value'][lo:hi],
+        })
+
+    def aligned(self, names, start=None, end=None, dates=None, ffill=True):
+        """
+        返回以日期为索引、每个序列一列的对齐表。
+        dates 为空时使用各序列日期的并集；ffill=True 时用最近一个已知值填充缺失日 (不引入未来数据)。
+        """
+        frames = {name: self.series(name, start, end).set_index('date')['net_value'] for name in names}
+        table = pd.DataFrame(frames)
+        if dates is not None:
+            table = table.reindex(pd.DatetimeIndex(dates).union(table.index)).sort_index()
+        if ffill:
+            table = table.ffill()
+        if dates is not None:
+            table = table.reindex(pd.DatetimeIndex(dates))
+        return table
+
+    def update(self, name, df, source=None):
+        """合并新数据 (同一日期以新数据为准)，返回新增的行数"""
+        new = _to_arrays(df)
+        with self._lock:
+            old = self.series_arrays.get(name)
+            before = 0 if old is None else len(old['date'])
+            if old is not None and len(old['date']):
+                merged = {col: np.concatenate([new[col], old[col]]) for col in new}
+                new = _to_arrays(pd.DataFrame({'date': merged['date'], 'net_value': merged['net_value']}))
+            self.series_arrays[name] = new
+            entry = self.meta.setdefault(name, {})
+            if source:
+                entry['source'] = source
+            if len(new['date']):
+                entry.update({
+                    'first_date': str(new['date'][0]),
+                    'last_date': str(new['date'][-1]),
+                    'rows': int(len(new['date'])),
+                    'updated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                })
+            self._dirty.add(name)
+            return len(new['date']) - before
+
+    def save(self):
+        """原子写回存储与元数据，并重新导出有变化的序列 CSV"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            os.makedirs(self.data_dir, exist_ok=True)
+            names = self.names
+            lengths = [len(self.series_arrays[n]['date']) for n in names]
+            offsets = np.zeros(len(names) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(lengths)
+            payload = {
+                'names': np.array(names, dtype='U32'),
+                'offsets': offsets,
+                'date': np.concatenate([self.series_arrays[n]['date'] for n in names]) if names
+                        else np.array([], dtype='datetime64[D]'),
+                'net_value': np.concatenate([self.series_arrays[n]['net_value'] for n in names]) if names
+                             else np.array([], dtype=np.float64),
+            }
+            tmp_path = f"{self._path(STORE_FILE)}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, **payload)
+            os.replace(tmp_path, self._path(STORE_FILE))
+
+            tmp_path = f"{self._path(META_FILE)}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(sorted(self.meta.items())), f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self._path(META_FILE))
+
+            for name in self._dirty:
+                df = self.series(name)
+                df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+                df.to_csv(self._path(_csv_name(name)), index=False, encoding='utf-8')
+            self._dirty.clear()
+            return True
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def load_index_store(data_dir=INDEX_DIR):
+    """返回进程内缓存的 IndexStore；存储文件被其他进程更新后自动重新加载"""
+    path = os.path.join(data_dir, STORE_FILE)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    key = os.path.abspath(data_dir)
+    with _STORES_LOCK:
+        cached = _STORES.get(key)
+        if cached is None or (mtime is not None and cached[0] != mtime):
+            store = IndexStore(data_dir)
+            if store._dirty:
+                store.save()
+                mtime = os.path.getmtime(path)
+            cached = _STORES[key] = (mtime, store)
+        return cached[1]
+
+
+def fetch_lsjz_history(code, latest_date=None, session=None, headers=None):
+    """
+    从天天基金历史净值接口按页抓取 (最新在前)，只返回晚于 latest_date 的行。
+    latest_date 为空时逐页回填全部历史；否则只请求 (latest_date, 今天] 的日期区间，
+    区间内不超过 LSJZ_RANGE_PAGE_SIZE 行时一次请求即可完成。请求经 http_cache 缓存，联网时频率由共享的 rate_limiter 控制。
+    """
+    latest = None if latest_date is None else pd.Timestamp(latest_date)
+    if latest is not None:
+        date_range = {'sdate': (latest + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+                      'edate': pd.Timestamp.today().strftime('%Y-%m-%d')}
+    pages, page_index = [], 1
+    while True:
+        if latest is None:
+            url = LSJZ_URL.format(code=code, page=page_index, per=LSJZ_PAGE_SIZE)
+        else:
+            url = LSJZ_RANGE_URL.format(code=code, page=page_index, per=LSJZ_RANGE_PAGE_SIZE, **date_range)
+        logger.info("正在获取指数 %s 的第 %d 页数据...", code, page_index)
+        response = http_cache.get(url, session=session, headers=headers, timeout=30)
+        response.raise_for_status()
+
+        page = lsjz_parser.parse_page(response.text)
+        if page is None:
+            http_cache.invalidate(url)
+            logger.error("API返回内容格式不正确，可能已无数据或接口变更。")
+            break
+        total_pages = page.pages
+        df_page = pd.DataFrame({
+            'date': pd.to_datetime([row.date.strftime('%Y-%m-%d') for row in page.rows]),
+            'net_value': [row.net_value for row in page.rows],
+        }).dropna(subset=['net_value'])
+        if df_page.empty:
+            logger.info("第 %d 页无有效数据，抓取结束。", page_index)
+            break
+
+        if latest is not None:
+            # 区间请求只含新日期，这里仅防御接口忽略 sdate 的情况
+            reached = (df_page['date'] <= latest).any()
+            pages.append(df_page[df_page['date'] > latest])
+            if reached:
+                logger.info("已下载到本地最新数据，增量更新完成。")
+                break
+        else:
+            pages.append(df_page)
+
+        if page_index >= total_pages:
+            logger.info("已获取所有历史数据，共 %d 页。", total_pages)
+            break
+        page_index += 1
+
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=['date', 'net_value'])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = load_index_store()
+    for name in store.names:
+        logger.info("%s: %s", name, store.meta.get(name))
@@ -0,0 +1,209 @@
+"""
+批量技术指标引擎 (Batch Indicator Engine)
+
+analyzer_V5 原先对每只基金单独构建 DataFrame 并调用 pandas rolling/ewm，全市场约 1500 条流水线。
+本模块把所有基金放进一个 观测序号 × 基金 的二维 float64 数组，一次性计算 V5 扫描所需的全部指标：
+
+    RSI(14) / RSI(6)     span-EWM 定义 (adjust=False)，与逐只计算一致
+    MACD / Signal        最新值与前一值，用于判断金叉/死叉
+    MA50 / MA250         最新值、净值比值，以及近 50 日 MA50/MA250 比值的拟合斜率
+    布林带 (20)          最新中轨与标准差
+    近 1 月最大回撤      与 pd.DateOffset(months=1) 的窗口一致
+    连续下跌             末尾连续下跌天数 (全历史 / 近 10 日)
+
+每只基金的有效数据按自身交易日右对齐 (最后一行即各基金最新净值，历史较短的基金上方以 NaN 填充)，
+因此窗口按基金自己的观测计数，与逐只计算的语义相同；所有内核都把 NaN 视为"尚无数据"。
+EWM 按 pandas 的递推公式逐行更新，结果与逐只计算逐位一致；滚动均值/标准差按窗口直接求和，
+与 pandas 的在线算法仅有浮点残差 (恒定序列的标准差 pandas 可能给出 1e-8 量级的非零值，
+analyzer_V5 以 BOLL_FLAT_STD 阈值统一处理)。校验：python analyzer_V5.py --verify
+"""
+import logging
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+RSI_WINDOWS = (14, 6)
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+MA_SHORT, MA_LONG = 50, 250
+TREND_WINDOW = 50                # MA50/MA250 比值拟合斜率的窗口
+BOLL_WINDOW = 20
+MDD_MONTHS = 1
+RECENT_DROP_ROWS = 10            # "近10日连跌" 统计的净值个数
+RSI_SMA_WINDOW = 14              # MarketMonitor 使用的简单均值 RSI 窗口
+
+# 堆叠更新的 EWM 顺序：RSI14 涨/RSI6 涨/RSI14 跌/RSI6 跌/EMA12/EMA26
+EWM_SPANS = (RSI_WINDOWS[0], RSI_WINDOWS[1], RSI_WINDOWS[0], RSI_WINDOWS[1], MACD_FAST, MACD_SLOW)
+# 计算最新指标所需的末尾观测数 (近 50 日的 MA250)
+TAIL_ROWS = MA_LONG + TREND_WINDOW - 1
+# ==========================================
+
+_EWM_ALPHA = (2.0 / (np.array(EWM_SPANS, dtype=np.float64) + 1.0))[:, None]
+_EWM_DENOM = (1.0 - _EWM_ALPHA) + _EWM_ALPHA
+_SIGNAL_ALPHA = 2.0 / (MACD_SIGNAL + 1.0)
+_SIGNAL_DENOM = (1.0 - _SIGNAL_ALPHA) + _SIGNAL_ALPHA
+
+
+def build_observation_matrix(panel, codes):
+    """
+    将各基金的升序 (date, net_value) 右对齐为二维数组。
+    返回 (dates, values, lengths)：dates 为 datetime64[D] (缺失为 NaT)，values 为 float64 (缺失为 NaN)。
+    """
+    lengths = np.array([panel.row_count(c) for c in codes], dtype=np.int64)
+    n_rows = int(lengths.max()) if len(codes) else 0
+    dates = np.full((n_rows, len(codes)), np.datetime64('NaT'), dtype='datetime64[D]')
+    values = np.full((n_rows, len(codes)), np.nan)
+    for j, code in enumerate(codes):
+        arrays = panel.arrays(code, ['date', 'net_value'])
+        n = len(arrays['date'])
+        dates[n_rows - n:, j] = arrays['date']
+        values[n_rows - n:, j] = arrays['net_value']
+    return dates, values, lengths
+
+
+def _ewm_step(state, x, alpha, denom):
+    """pandas ewm(adjust=False) 的单步递推：首个观测直接取值，之后与当前值相同时保持不变"""
+    update = ((1.0 - alpha) * state + alpha * x) / denom
+    return np.where(np.isnan(state), x, np.where(state != x, update, state))
+
+
+def gain_loss(prev, value):
+    """单步涨跌幅拆分，与 delta.where(delta > 0, 0) 一致：首个观测 (prev 为 NaN) 的涨跌记为 0"""
+    delta = value - prev
+    valid = ~np.isnan(value)
+    gain = np.where(valid, np.where(delta > 0, delta, 0.0), np.nan)
+    loss = np.where(valid, np.where(delta < 0, -delta, 0.0), np.nan)
+    return gain, loss
+
+
+def ewm_advance(state, signal, gain, loss, value):
+    """
+    RSI 与 MACD 的全部 EWM 前进一步：state 形状 (6, 基金数)，顺序见 EWM_SPANS；signal 为 MACD 的信号线。
+    返回新的 (state, signal)。
+    """
+    state = _ewm_step(state, np.stack([gain, gain, loss, loss, value, value]), _EWM_ALPHA, _EWM_DENOM)
+    signal = _ewm_step(signal, state[4] - state[5], _SIGNAL_ALPHA, _SIGNAL_DENOM)
+    return state, signal
+
+
+def _ewm_states(values):
+    """沿时间轴递推全部 EWM，返回 (state, signal, macd_prev, signal_prev)"""
+    n_rows, n_funds = values.shape
+    state = np.full((len(EWM_SPANS), n_funds), np.nan)
+    signal = np.full(n_funds, np.nan)
+    macd_prev = signal_prev = np.full(n_funds, np.nan)
+    prev = np.full(n_funds, np.nan)
+    for t in range(n_rows):
+        gain, loss = gain_loss(prev, values[t])
+        if t == n_rows - 1:
+            macd_prev, signal_prev = state[4] - state[5], signal
+        state, signal = ewm_advance(state, signal, gain, loss, values[t])
+        prev = values[t]
+    return state, signal, macd_prev, signal_prev
+
+
+def _rsi(avg_gain, avg_loss):
+    rs = avg_gain / np.where(avg_loss == 0, 1e-10, avg_loss)
+    return 100 - (100 / (1 + rs))
+
+
+def _rolling_mean_tail(values, window, n_out):
+    """最后 n_out 行的滚动均值 (min_periods=1，只统计非 NaN)"""
+    tail = values[-(window + n_out - 1):]
+    pad = window + n_out - 1 - len(tail)
+    if pad > 0:
+        tail = np.vstack([np.full((pad, values.shape[1]), np.nan), tail])
+    windows = np.lib.stride_tricks.sliding_window_view(tail, window, axis=0)
+    counts = (~np.isnan(windows)).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(windows, axis=-1) / counts
+
+
+def _trailing_true(flags):
+    """每列末尾连续为 True 的行数"""
+    if len(flags) == 0:
+        return np.zeros(flags.shape[1], dtype=np.int64)
+    rev = flags[::-1]
+    return np.where(rev.all(axis=0), len(rev), np.argmax(~rev, axis=0))
+
+
+def _month_max_drawdown(dates, values):
+    """近一个月 (日期 >= 最新日期 - 1 个月) 窗口内的最大回撤；窗口不足 2 个净值时为 0"""
+    latest = pd.DatetimeIndex(dates[-1])
+    cutoff = (latest - pd.DateOffset(months=MDD_MONTHS)).to_numpy().astype('datetime64[D]')
+    in_window = dates >= cutoff
+    running_max = np.maximum.accumulate(np.where(in_window, values, -np.inf), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdown = np.where(in_window, (running_max - values) / running_max, -np.inf)
+    mdd = drawdown.max(axis=0)
+    return np.where(in_window.sum(axis=0) >= 2, mdd, 0.0)
+
+
+def compute_indicators(dates, values):
+    """
+    对右对齐的二维数组从头计算每只基金最新一日的指标，返回 {指标名: 长度为基金数的数组}。
+    调用方需保证每列的有效数据连续且不含 NaN/非正值 (analyzer_V5 会先筛除这类基金)。
+    """
+    lengths = (~np.isnan(values)).sum(axis=0)
+    state, signal, macd_prev, signal_prev = _ewm_states(values)
+    drops = _trailing_true(values[1:] < values[:-1])
+    return tail_indicators(dates[-TAIL_ROWS:], values[-TAIL_ROWS:], lengths, state, signal, macd_prev, signal_prev, drops)
+
+
+def tail_indicators(dates, values, lengths, state, signal, macd_prev, signal_prev, drops):
+    """
+    由末尾 TAIL_ROWS 个观测 (右对齐) 与 EWM 状态计算最新指标。
+    compute_indicators 与持久化的增量状态 (indicator_state) 共用，两者结果逐位一致。
+    """
+    # 统一为 C 连续布局，使求和顺序 (进而浮点结果) 与调用方的数组布局无关
+    values, dates = np.ascontiguousarray(values), np.ascontiguousarray(dates)
+    n_rows, _ = values.shape
+    latest = values[-1]
+    prev = values[-2] if n_rows >= 2 else np.full_like(latest, np.nan)
+
+    ma_short = _rolling_mean_tail(values, MA_SHORT, TREND_WINDOW)
+    ma_long = _rolling_mean_tail(values, MA_LONG, TREND_WINDOW)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = ma_short / ma_long
+    # 等距 x 的最小二乘斜率 (与 np.polyfit(x, y, 1)[0] 相同)
+    x = np.arange(TREND_WINDOW, dtype=np.float64)
+    x -= x.mean()
+    slope = (x[:, None] * ratio).sum(axis=0) / (x * x).sum()
+
+    boll = values[-BOLL_WINDOW:]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        boll_mid = np.nanmean(boll, axis=0)
+        boll_std = np.nanstd(boll, axis=0, ddof=1)
+
+    # MarketMonitor 的 RSI：涨跌幅的 14 日简单均值 (min_periods=1)，平均跌幅为 0 时为 NaN
+    sma_values = values[-(RSI_SMA_WINDOW + 1):]
+    gain, loss = gain_loss(np.vstack([np.full((1, values.shape[1]), np.nan), sma_values[:-1]]), sma_values)
+    avg_gain = _rolling_mean_tail(gain, RSI_SMA_WINDOW, 1)[-1]
+    avg_loss = _rolling_mean_tail(loss, RSI_SMA_WINDOW, 1)[-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi_sma = 100 - (100 / (1 + avg_gain / np.where(avg_loss == 0, np.nan, avg_loss)))
+
+    return {
+        'length': lengths,
+        'rsi_14': _rsi(state[0], state[2]),
+        'rsi_6': _rsi(state[1], state[3]),
+        'rsi_sma_14': rsi_sma,
+        'macd': state[4] - state[5],
+        'signal': signal,
+        'macd_prev': macd_prev,
+        'signal_prev': signal_prev,
+        'latest': latest,
+        'prev': prev,
+        'ma50': ma_short[-1],
+        'ma250': ma_long[-1],
+        'ma_ratio_slope': slope,
+        'boll_mid': boll_mid,
+        'boll_std': boll_std,
+        'month_mdd': _month_max_drawdown(dates, values),
+        'consecutive_drops': drops,
+        'recent_drops': np.minimum(drops, RECENT_DROP_ROWS - 1),
+    }
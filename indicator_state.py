@@ -0,0 +1,373 @@
+"""
+持久化的增量技术指标状态 (Streaming Indicator State)
+
+EWM 类指标 (RSI 的 span-EWM、MACD 的 EMA12/EMA26/Signal) 以前每次运行都从第一条净值重算，
+而每天每只基金只新增一条观测。本模块为每只基金保存足以继续递推的状态：
+
+    count                   已处理的观测数
+    ewm / signal            RSI14/RSI6 涨跌 EWM、EMA12、EMA26 与 MACD 信号线 (递推公式与 pandas 一致)
+    macd_prev / signal_prev 上一观测的 MACD 与信号线 (判断金叉/死叉)
+    wilder_gain/loss/count  Wilder 平滑的平均涨跌 (bot.rsi_wilder 的 RSI(12))
+    ring_value / ring_date  最近 TAIL_ROWS 个观测的环形缓冲区 (MA50/MA250/BOLL20/近 1 月回撤)
+    peak / max_drawdown     全历史净值峰值与最大回撤
+    drops                   末尾连续下跌天数
+
+状态按列保存在 fund_store/indicator_state.npz (基金 × 字段)。每日更新时每只基金只需处理新增行，
+与基金的历史长度无关；历史被改写 (非单纯追加) 的基金自动从头重建。
+最新指标由 indicator_engine.tail_indicators() 从环形缓冲区与 EWM 状态计算，
+与批量引擎从头计算的结果逐位一致。
+
+读取方：analyzer_V5 (sync 后取 indicators)、MarketMonitor (latest_row 按本地窗口增量推进)、
+bot.rsi_wilder (wilder_rsi_series 使用同一 Wilder 递推)。
+
+命令行：python indicator_state.py            # 与列式存储同步并保存
+        python indicator_state.py --verify   # 从头重算并与增量推进的状态逐字段比较
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import indicator_engine
+import nav_store
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+STATE_PATH = os.path.join(nav_store.STORE_DIR, 'indicator_state.npz')
+STATE_VERSION = 1                # 状态字段或递推逻辑变化时递增，旧状态自动作废
+RING_SIZE = indicator_engine.TAIL_ROWS
+WILDER_PERIOD = 12               # bot.rsi_wilder 的 RSI 周期
+# ==========================================
+
+# 每只基金一个值的状态字段及初始值
+_SCALAR_FIELDS = {
+    'count': 0, 'signal': np.nan, 'macd_prev': np.nan, 'signal_prev': np.nan,
+    'wilder_gain': 0.0, 'wilder_loss': 0.0, 'wilder_count': 0,
+    'peak': np.nan, 'max_drawdown': 0.0, 'drops': 0,
+}
+
+
+def wilder_advance(avg_gain, avg_loss, count, prev, value, period=WILDER_PERIOD):
+    """
+    Wilder 平均涨跌前进一步。前 period 个涨跌幅累加后取均值作为初值，之后按
+    (prev * (period - 1) + x) / period 递推；首个观测没有涨跌幅，不计入。
+    返回新的 (avg_gain, avg_loss, count)。
+    """
+    has_delta = ~np.isnan(prev) & ~np.isnan(value)
+    delta = np.where(has_delta, value - prev, 0.0)
+    gain, loss = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+    count = count + has_delta
+    warm = has_delta & (count <= period)
+    avg_gain = np.where(warm, avg_gain + gain, np.where(has_delta, (avg_gain * (period - 1) + gain) / period, avg_gain))
+    avg_loss = np.where(warm, avg_loss + loss, np.where(has_delta, (avg_loss * (period - 1) + loss) / period, avg_loss))
+    done = has_delta & (count == period)
+    return np.where(done, avg_gain / period, avg_gain), np.where(done, avg_loss / period, avg_loss), count
+
+
+def wilder_rsi(avg_gain, avg_loss, count, period=WILDER_PERIOD):
+    """由 Wilder 平均涨跌计算 RSI；平均跌幅为 0 时为 100，预热不足时为 NaN"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = np.where(avg_loss != 0, avg_gain / np.where(avg_loss != 0, avg_loss, 1.0), np.inf)
+    return np.where(count >= period, 100 - (100 / (1 + rs)), np.nan)
+
+
+def wilder_rsi_series(values, period=WILDER_PERIOD):
+    """对一条升序序列逐点计算 Wilder RSI，返回同长度数组 (预热期为 NaN)"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    avg_gain, avg_loss, count = np.zeros(1), np.zeros(1), np.zeros(1, dtype=np.int64)
+    prev = np.full(1, np.nan)
+    for i, v in enumerate(values):
+        value = np.array([v])
+        avg_gain, avg_loss, count = wilder_advance(avg_gain, avg_loss, count, prev, value, period)
+        out[i] = wilder_rsi(avg_gain, avg_loss, count, period)[0]
+        prev = value
+    return out
+
+
+class IndicatorStateStore:
+    """全部基金的增量指标状态；按基金代码索引，所有更新在基金维度上向量化"""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset([])
+        if path and os.path.exists(path):
+            self._load()
+
+    def _reset(self, codes):
+        n = len(codes)
+        self.codes = list(codes)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self.fields = {name: np.full(n, init, dtype=np.int64 if isinstance(init, int) else np.float64)
+                       for name, init in _SCALAR_FIELDS.items()}
+        self.fields['ewm'] = np.full((len(indicator_engine.EWM_SPANS), n), np.nan)
+        self.fields['ring_value'] = np.full((n, RING_SIZE), np.nan)
+        self.fields['ring_date'] = np.full((n, RING_SIZE), np.datetime64('NaT'), dtype='datetime64[D]')
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as npz:
+                if int(npz['version']) != STATE_VERSION or npz['ring_value'].shape[1] != RING_SIZE:
+                    logger.info("指标状态版本已变化，将从头重建")
+                    return
+                codes = [str(c) for c in npz['codes']]
+                fields = {name: npz[name] for name in list(_SCALAR_FIELDS) + ['ewm', 'ring_value', 'ring_date']}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("指标状态 %s 读取失败，将从头重建: %s", self.path, e)
+            return
+        self.codes = codes
+        self._index = {code: i for i, code in enumerate(codes)}
+        self.fields = fields
+
+    def __contains__(self, fund_code):
+        return fund_code in self._index
+
+    def _ensure(self, codes):
+        """为尚无状态的基金追加初始状态，返回各代码的行号数组"""
+        new = [c for c in dict.fromkeys(codes) if c not in self._index]
+        if new:
+            fresh = IndicatorStateStore(path=None)
+            fresh._reset(new)
+            for name, arr in self.fields.items():
+                axis = 1 if name == 'ewm' else 0
+                self.fields[name] = np.concatenate([arr, fresh.fields[name]], axis=axis)
+            for code in new:
+                self._index[code] = len(self.codes)
+                self.codes.append(code)
+        return np.array([self._index[c] for c in codes], dtype=np.int64)
+
+    def _clear(self, rows):
+        """将指定行恢复为初始状态 (历史被改写时从头重建)"""
+        for name, init in _SCALAR_FIELDS.items():
+            self.fields[name][rows] = init
+        self.fields['ewm'][:, rows] = np.nan
+        self.fields['ring_value'][rows] = np.nan
+        self.fields['ring_date'][rows] = np.datetime64('NaT')
+
+    def _last(self, rows):
+        """各行最近一个观测的 (日期, 净值)；无观测时为 (NaT, NaN)"""
+        count = self.fields['count'][rows]
+        slot = (count - 1) % RING_SIZE
+        has = count > 0
+        value = np.where(has, self.fields['ring_value'][rows, slot], np.nan)
+        date = np.where(has, self.fields['ring_date'][rows, slot], np.datetime64('NaT'))
+        return date, value
+
+    def _advance(self, rows, dates, values):
+        """指定行各前进一个观测 (rows 不可重复)"""
+        f = self.fields
+        _, prev = self._last(rows)
+        gain, loss = indicator_engine.gain_loss(prev, values)
+        f['macd_prev'][rows] = f['ewm'][4, rows] - f['ewm'][5, rows]
+        f['signal_prev'][rows] = f['signal'][rows]
+        f['ewm'][:, rows], f['signal'][rows] = indicator_engine.ewm_advance(
+            f['ewm'][:, rows], f['signal'][rows], gain, loss, values)
+        f['wilder_gain'][rows], f['wilder_loss'][rows], f['wilder_count'][rows] = wilder_advance(
+            f['wilder_gain'][rows], f['wilder_loss'][rows], f['wilder_count'][rows], prev, values)
+
+        peak = np.fmax(f['peak'][rows], values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            drawdown = (peak - values) / peak
+        f['peak'][rows] = peak
+        f['max_drawdown'][rows] = np.fmax(f['max_drawdown'][rows], drawdown)
+        f['drops'][rows] = np.where(values < prev, f['drops'][rows] + 1, 0)
+
+        slot = f['count'][rows] % RING_SIZE
+        f['ring_value'][rows, slot] = values
+        f['ring_date'][rows, slot] = dates
+        f['count'][rows] += 1
+        self._dirty = True
+
+    def _feed(self, feeds):
+        """feeds: {基金代码: (升序日期数组, 净值数组)}，逐轮推进，每轮处理所有仍有新观测的基金"""
+        if not feeds:
+            return
+        codes = list(feeds)
+        rows = self._ensure(codes)
+        lengths = np.array([len(feeds[c][1]) for c in codes], dtype=np.int64)
+        n_rounds = int(lengths.max())
+        # 左对齐：第 r 行是各基金的第 r 个新观测
+        dates = np.full((n_rounds, len(codes)), np.datetime64('NaT'), dtype='datetime64[D]')
+        values = np.full((n_rounds, len(codes)), np.nan)
+        for j, code in enumerate(codes):
+            dates[:lengths[j], j], values[:lengths[j], j] = feeds[code]
+        order = np.argsort(-lengths, kind='stable')
+        rows, lengths, dates, values = rows[order], lengths[order], dates[:, order], values[:, order]
+        active = len(codes)
+        for r in range(n_rounds):
+            # 按新观测数降序排列后，仍需推进的基金始终是前 active 列
+            while active and lengths[active - 1] <= r:
+                active -= 1
+            self._advance(rows[:active], dates[r, :active], values[r, :active])
+
+    def sync(self, panel, codes=None):
+        """
+        将状态与列式存储对齐：历史仅追加了新行的基金只推进新行，历史被改写或尚无状态的基金从头重建。
+        返回 (增量推进的基金数, 重建的基金数)。
+        """
+        with self._lock:
+            codes = list(panel.codes if codes is None else codes)
+            feeds, rebuild = {}, []
+            rows = self._ensure(codes)
+            counts = self.fields['count'][rows]
+            last_dates, last_values = self._last(rows)
+            for code, count, last_date, last_value in zip(codes, counts, last_dates, last_values):
+                arrays = panel.arrays(code, ['date', 'net_value'])
+                n = len(arrays['date'])
+                if count > 0 and n >= count and arrays['date'][count - 1] == last_date and (
+                        arrays['net_value'][count - 1] == last_value
+                        or (np.isnan(last_value) and np.isnan(arrays['net_value'][count - 1]))):
+                    if n > count:
+                        feeds[code] = (arrays['date'][count:], arrays['net_value'][count:])
+                else:
+                    rebuild.append(code)
+                    if n:
+                        feeds[code] = (arrays['date'], arrays['net_value'])
+            if rebuild:
+                self._clear(self._ensure(rebuild))
+                self._dirty = True
+            self._feed(feeds)
+            return len(feeds) - len([c for c in rebuild if c in feeds]), len(rebuild)
+
+    def indicators(self, codes):
+        """返回各基金最新一日的指标 (键与 indicator_engine.compute_indicators 相同，另含 Wilder RSI 与全历史回撤)"""
+        with self._lock:
+            rows = np.array([self._index[c] for c in codes], dtype=np.int64)
+            f = self.fields
+            count = f['count'][rows]
+            # 环形缓冲区按时间顺序展开为 观测 × 基金 (历史不足时上方为 NaN)
+            order = (count[:, None] + np.arange(RING_SIZE)) % RING_SIZE
+            values = np.take_along_axis(f['ring_value'][rows], order, axis=1).T
+            dates = np.take_along_axis(f['ring_date'][rows], order, axis=1).T
+            result = indicator_engine.tail_indicators(
+                dates, values, count, f['ewm'][:, rows], f['signal'][rows],
+                f['macd_prev'][rows], f['signal_prev'][rows], f['drops'][rows])
+            result['rsi_wilder'] = wilder_rsi(f['wilder_gain'][rows], f['wilder_loss'][rows], f['wilder_count'][rows])
+            result['max_drawdown'] = f['max_drawdown'][rows].copy()
+            result['last_date'] = dates[-1]
+            return result
+
+    def latest_row(self, fund_code, df):
+        """
+        供 MarketMonitor 使用：用本地窗口 df (date, net_value) 中晚于状态最新日期的行推进该基金，
+        返回与 _calculate_indicators 结果最后一行同名的字段字典。
+        基金尚无状态、窗口与状态不衔接或窗口早于状态时返回 None，由调用方回退到按窗口计算。
+        """
+        with self._lock:
+            if fund_code not in self._index or df is None or df.empty:
+                return None
+            row = np.array([self._index[fund_code]])
+            if self.fields['count'][row[0]] == 0:
+                return None
+            last_date, last_value = self._last(row)
+            dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+            values = pd.to_numeric(df['net_value'], errors='coerce').to_numpy(dtype=np.float64)
+            order = np.argsort(dates, kind='stable')
+            dates, values = dates[order], values[order]
+            match = np.flatnonzero(dates == last_date[0])
+            if len(match) != 1 or values[match[0]] != last_value[0]:
+                return None
+            if match[0] + 1 < len(dates):
+                self._feed({fund_code: (dates[match[0] + 1:], values[match[0] + 1:])})
+            ind = {name: arr[0] for name, arr in self.indicators([fund_code]).items()}
+            bb_band = ind['boll_std'] * 2
+            return {
+                'date': pd.Timestamp(ind['last_date']),
+                'net_value': ind['latest'],
+                'rsi': ind['rsi_sma_14'],
+                'ma_ratio': ind['latest'] / ind['ma50'] if ind['ma50'] != 0 else np.nan,
+                'macd': ind['macd'],
+                'signal': ind['signal'],
+                'bb_upper': ind['boll_mid'] + bb_band,
+                'bb_lower': ind['boll_mid'] - bb_band,
+                'length': int(ind['length']),
+            }
+
+    def save(self):
+        """若有变更，原子写回状态文件"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return False
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, version=np.int64(STATE_VERSION),
+                                    codes=np.array(self.codes, dtype='U6'), **self.fields)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            return True
+
+
+def _equal(a, b):
+    return a.shape == b.shape and bool(np.all((a == b) | (pd.isna(a) & pd.isna(b))))
+
+
+def verify(panel=None, holdback=5, store=None):
+    """
+    校验增量推进与从头重算完全一致，返回不一致的字段名列表：
+      1. 先用截去最近 holdback 行的历史建立状态，再同步完整历史 (增量推进 holdback 步)；
+      2. 与从头重算的状态逐字段比较；
+      3. 与批量引擎 compute_indicators 从头计算的最新指标比较 (不含缺失净值的基金)；
+      4. store 不为空时 (如已保存的状态)，同步后同样与从头重算的状态比较。
+    """
+    panel = panel or nav_store.load_panel()
+    codes = list(panel.codes)
+    start = time.time()
+    full = IndicatorStateStore(path=None)
+    full.sync(panel)
+    full_seconds = time.time() - start
+
+    truncated = {c: {k: v[:max(len(v) - holdback, 0)] for k, v in panel.arrays(c, ['date', 'net_value']).items()}
+                 for c in codes}
+    partial = IndicatorStateStore(path=None)
+    partial._feed({c: (a['date'], a['net_value']) for c, a in truncated.items() if len(a['date'])})
+    start = time.time()
+    appended, rebuilt = partial.sync(panel)
+    incremental_seconds = time.time() - start
+
+    mismatches = []
+    candidates = [('增量推进', partial)] + ([('已保存状态', store)] if store is not None else [])
+    for label, other in candidates:
+        if label == '已保存状态':
+            other.sync(panel)
+        rows = np.array([other._index[c] for c in codes], dtype=np.int64)
+        for name, arr in full.fields.items():
+            other_arr = other.fields[name][:, rows] if name == 'ewm' else other.fields[name][rows]
+            if not _equal(arr, other_arr):
+                mismatches.append(f"{label}:{name}")
+
+    clean = [c for c in codes if len(panel.arrays(c, ['net_value'])['net_value'])
+             and not np.isnan(panel.arrays(c, ['net_value'])['net_value']).any()]
+    dates, values, _ = indicator_engine.build_observation_matrix(panel, clean)
+    expected = indicator_engine.compute_indicators(dates, values)
+    actual = full.indicators(clean)
+    for name, arr in expected.items():
+        if not _equal(np.asarray(arr), np.asarray(actual[name])):
+            mismatches.append(f"批量引擎:{name}")
+
+    logger.info("从头重算 %d 只基金耗时 %.2f 秒；增量推进 %d 步 (%d 只基金，%d 只重建) 耗时 %.3f 秒；不一致字段: %s",
+                len(codes), full_seconds, holdback, appended, rebuilt, incremental_seconds, mismatches or '无')
+    return mismatches
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='增量技术指标状态')
+    parser.add_argument('--verify', action='store_true', help='从头重算并与增量推进的状态逐字段比较')
+    args = parser.parse_args()
+
+    panel = nav_store.load_panel()
+    store = IndicatorStateStore()
+    if args.verify:
+        raise SystemExit(1 if verify(panel, store=store) else 0)
+    t0 = time.time()
+    appended, rebuilt = store.sync(panel)
+    store.save()
+    logger.info("指标状态同步完成: 增量推进 %d 只，重建 %d 只，耗时 %.2f 秒", appended, rebuilt, time.time() - t0)
@@ -0,0 +1,304 @@
+"""
+天天基金历史净值接口 (F10DataApi.aspx?type=lsjz) 响应解析器
+
+接口返回一段 JS：var apidata={ content:"<table>...</table>",records:N,pages:P,curpage:C};
+表格固定 7 列 (净值日期/单位净值/累计净值/日增长率/申购状态/赎回状态/分红送配)。
+各爬虫原先用 BeautifulSoup(text, 'lxml') 或 pd.read_html 解析整页 HTML，每页都要构建完整的 DOM / DataFrame。
+本模块用一条预编译正则直接匹配 <tr> 行，产出带类型的 LsjzRow：
+
+    date                  datetime.date
+    net_value             单位净值 (float，缺失为 NaN)
+    cumulative_net_value  累计净值 (float，缺失为 NaN)
+    daily_growth_rate     日增长率，小数 (1.20% → 0.012)，'--' 或空为 NaN
+    purchase_status / redemption_status / dividend   原样字符串
+
+非 7 列的行 ("暂无数据" 占位行、货币基金的收益表) 直接跳过，与原先 len(tds) < 7 的处理一致。
+content 中的 \\r\\n、\\t、\\" 等 JS 转义在匹配前还原 (与原 data_source 的 replace("\\\\r\\\\n", "\\n") 一致)；
+7 列表格里有日期单元格却没能全部匹配成行时，parse_page 返回 None，调用方按出错页处理，不会把格式变化当成 "没有新数据"。
+
+校验：python lsjz_parser.py --verify [--samples 目录]   逐页对照 BeautifulSoup 与 pd.read_html 的解析结果，有不一致时退出码为 1
+基准：python lsjz_parser.py --bench  [--samples 目录]   比较三种解析方式的单页耗时
+目录中含 apidata 的文件视为一页接口响应。默认的 lsjz_samples/ 是按线上响应格式手工构造的合成样例，数值为虚构
+(普通首页、分红与份额折算、空区间、QDII、带 \\r\\n / \\t / \\" 转义的首页)，并非真实抓包；拿到真实响应后可放入同一目录。
+同名的 <样例>.expected.csv 为人工核对的期望解析结果 (golden)，存在时逐行比对。内置的合成样例页始终参与校验。
+"""
+import argparse
+import csv
+import datetime
+import glob
+import logging
+import math
+import os
+import re
+import sys
+import time
+from io import StringIO
+from typing import NamedTuple
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+SAMPLES_DIR = 'lsjz_samples'     # --verify / --bench 默认读取的样例目录 (存在时，合成样例)
+BENCH_REPEAT = 50                # 基准测试中每页重复解析的次数
+# ==========================================
+
+_CONTENT_RE = re.compile(r'content:"(.*?)",records:', re.S)
+_META_RE = re.compile(r'records:(\d+),pages:(\d+),curpage:(\d+)')
+# 单元格内容：不跨越 <td>/<tr> 边界，允许内嵌 <span> 等标签
+_CELL = r"<td[^>]*>((?:[^<]|<(?!/?t[dr][\s>]))*)</td>\s*"
+_ROW_RE = re.compile(r"<tr>\s*<td[^>]*>(\d{4}-\d{2}-\d{2})</td>\s*" + _CELL * 6 + r"</tr>")
+_TAG_RE = re.compile(r'<[^>]+>')
+# content 是 JS 字符串，部分响应保留了 \r\n、\t、\" 等转义序列，匹配前还原
+_ESCAPES = (('\\r\\n', '\n'), ('\\n', '\n'), ('\\r', '\n'), ('\\t', '\t'), ('\\"', '"'), ("\\'", "'"), ('\\/', '/'))
+_DATE_CELL_RE = re.compile(r"<td[^>]*>\s*\d{4}-\d{2}-\d{2}\s*</td>")
+_HEADER_RE = re.compile(r"<th[\s>]")
+
+
+class LsjzRow(NamedTuple):
+    date: datetime.date
+    net_value: float
+    cumulative_net_value: float
+    daily_growth_rate: float
+    purchase_status: str
+    redemption_status: str
+    dividend: str
+
+
+class LsjzPage(NamedTuple):
+    rows: list                   # LsjzRow 列表，按接口顺序 (最新在前)
+    records: int                 # 查询范围内的总记录数
+    pages: int                   # 总页数
+    curpage: int
+
+
+def _float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def _rate(text):
+    """日增长率：'1.20%' → 0.012；不带百分号时按小数处理；'--'/空为 NaN"""
+    if text.endswith('%'):
+        return _float(text[:-1]) / 100.0
+    return _float(text)
+
+
+def _text(cell):
+    return (_TAG_RE.sub('', cell) if '<' in cell else cell).strip()
+
+
+def iter_rows(content):
+    """逐行解析表格 HTML (content 字段)，产出 LsjzRow"""
+    for m in _ROW_RE.finditer(content):
+        day, nav, acc, rate, purchase, redemption, dividend = m.groups()
+        yield LsjzRow(datetime.date(int(day[:4]), int(day[5:7]), int(day[8:10])),
+                      _float(_text(nav)), _float(_text(acc)), _rate(_text(rate)),
+                      _text(purchase), _text(redemption), _text(dividend))
+
+
+def _unescape(content):
+    if '\\' not in content:
+        return content
+    for escaped, char in _ESCAPES:
+        content = content.replace(escaped, char)
+    return content
+
+
+def parse_page(text):
+    """
+    解析一页接口响应，返回 LsjzPage。以下情况返回 None (调用方按出错页处理，不会误判为没有新净值)：
+    响应中没有 content 字段 (接口变更或出错页)；7 列净值表中有日期单元格，但匹配出的行数与之不符 (格式变化)。
+    非 7 列的表 (货币基金的收益表) 与 "暂无数据" 页返回空的 rows。
+    """
+    content = _CONTENT_RE.search(text)
+    if content is None:
+        return None
+    meta = _META_RE.search(text, content.end() - len(',records:'))
+    records, pages, curpage = (int(x) for x in meta.groups()) if meta else (0, 1, 1)
+    table = _unescape(content.group(1))
+    rows = list(iter_rows(table))
+    if len(_HEADER_RE.findall(table)) in (0, 7) and len(rows) != len(_DATE_CELL_RE.findall(table)):
+        logger.warning("净值表有 %d 个日期单元格，只解析出 %d 行，按出错页处理",
+                       len(_DATE_CELL_RE.findall(table)), len(rows))
+        return None
+    return LsjzPage(rows, records, pages, curpage)
+
+
+# ---------------- 校验与基准 ----------------
+
+def _bs4_rows(text):
+    """参照实现：原 fund_spider 的 BeautifulSoup 解析 (字符串)"""
+    from bs4 import BeautifulSoup
+    table = BeautifulSoup(text, 'lxml').find('table')
+    if not table:
+        return []
+    rows = []
+    for row in table.find_all('tr')[1:]:
+        tds = row.find_all('td')
+        if len(tds) < 7:
+            continue
+        rows.append([td.text.strip() for td in tds[:7]])
+    return rows
+
+
+def _read_html_frame(text):
+    """参照实现：原 index_store / MarketMonitor 的 pd.read_html 解析"""
+    import pandas as pd
+    match = _CONTENT_RE.search(text)
+    tables = pd.read_html(StringIO(_unescape(match.group(1))))
+    return tables[0]
+
+
+def sample_payloads():
+    """内置样例页：普通净值、分红行、'--' 增长率、空值、暂无数据、49 行区间页"""
+    def page(rows, records=None, pages=1):
+        body = ''.join(
+            f"<tr><td>{d}</td><td class='tor bold'>{nav}</td><td class='tor bold'>{acc}</td>"
+            f"<td class='tor bold {'grn' if rate.startswith('-') else 'red'}'>{rate}</td>"
+            f"<td>{buy}</td><td>{sell}</td><td class='red unbold'>{div}</td></tr>"
+            for d, nav, acc, rate, buy, sell, div in rows
+        ) or "<tr><td align='center' colspan='7'>暂无数据!</td></tr>"
+        table = ("<table class='w782 comm lsjz'><thead><tr><th class='first'>净值日期</th><th>单位净值</th>"
+                 "<th>累计净值</th><th>日增长率</th><th>申购状态</th><th>赎回状态</th>"
+                 "<th class='tor last'>分红送配</th></tr></thead><tbody>" + body + "</tbody></table>")
+        records = len(rows) if records is None else records
+        return f'var apidata={{ content:"{table}",records:{records},pages:{pages},curpage:1}};'
+
+    start = datetime.date(2025, 12, 31)
+    regular = []
+    for i in range(49):
+        day = start - datetime.timedelta(days=i)
+        rate = f"{(i % 7 - 3) * 0.37:.2f}%"
+        regular.append((day.isoformat(), f"{1.2 + i * 0.0013:.4f}", f"{2.1 + i * 0.0013:.4f}",
+                        rate, '开放申购', '开放赎回', ''))
+    special = [
+        ('2025-06-30', '1.0523', '1.8523', '--', '暂停申购', '开放赎回', '每份派现金0.0150元'),
+        ('2025-06-27', '1.0611', '1.8461', '0.00%', '限制大额申购', '开放赎回', ''),
+        ('2025-06-26', '', '', '', '封闭期', '封闭期', ''),
+        ('2025-06-25', '1.0611', '1.8461', '-1.26%', '开放申购', '开放赎回', '每份基金份额折算1.0203份'),
+    ]
+    return {
+        'builtin/page_20': page(regular[:20], records=2380, pages=119),
+        'builtin/range_49': page(regular, records=49),
+        'builtin/special': page(special),
+        'builtin/empty': page([], records=0, pages=0),
+    }
+
+
+def load_samples(samples_dir=None):
+    samples = sample_payloads()
+    samples_dir = samples_dir or (SAMPLES_DIR if os.path.isdir(SAMPLES_DIR) else None)
+    if samples_dir:
+        for path in sorted(glob.glob(os.path.join(samples_dir, '**', '*'), recursive=True)):
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    text = f.read()
+                if 'apidata' in text and 'content:' in text:
+                    samples[path] = text
+    return samples
+
+
+def _same_float(expected, actual):
+    return (math.isnan(expected) and math.isnan(actual)) or abs(expected - actual) < 1e-12
+
+
+def expected_path(sample_path):
+    """样例响应对应的期望解析结果文件 (<样例>.expected.csv)"""
+    return os.path.splitext(sample_path)[0] + '.expected.csv'
+
+
+def _check_golden(name, page, path):
+    """按期望结果 CSV (列同 LsjzRow，数值为空表示 NaN) 逐行比对，返回不一致描述的列表"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        expected = list(csv.DictReader(f))
+    rows = [] if page is None else page.rows
+    if len(rows) != len(expected):
+        return [f"{name}: 行数 {len(rows)} != 期望 {len(expected)}"]
+    mismatches = []
+    for row, ref in zip(rows, expected):
+        numbers = [float(ref[field]) if ref[field] else math.nan
+                   for field in ('net_value', 'cumulative_net_value', 'daily_growth_rate')]
+        texts = [ref[field] for field in ('purchase_status', 'redemption_status', 'dividend')]
+        if (row.date.isoformat() != ref['date'] or not all(_same_float(a, b) for a, b in zip(numbers, row[1:4]))
+                or list(row[4:]) != texts):
+            mismatches.append(f"{name}: {tuple(row)} != 期望 {ref}")
+    return mismatches
+
+
+def verify(samples):
+    """逐页对照两种参照解析 (有期望结果文件时再比对 golden)，返回不一致描述的列表"""
+    import pandas as pd
+    mismatches = []
+    # 行格式变化 (这里是 <tr> 带了属性) 时必须返回 None，而不是一页空数据
+    changed = sample_payloads()['builtin/special'].replace('<tr><td>', "<tr class='odd'><td>")
+    if parse_page(changed) is not None:
+        mismatches.append("builtin/changed_format: 行格式变化时未返回 None")
+    for name, text in samples.items():
+        page = parse_page(text)
+        if os.path.isfile(expected_path(name)):
+            mismatches.extend(_check_golden(name, page, expected_path(name)))
+        expected = _bs4_rows(text)
+        if page is None or len(page.rows) != len(expected):
+            mismatches.append(f"{name}: 行数 {None if page is None else len(page.rows)} != {len(expected)}")
+            continue
+        for row, ref in zip(page.rows, expected):
+            ref_typed = (datetime.date.fromisoformat(ref[0]), _float(ref[1]), _float(ref[2]), _rate(ref[3]))
+            if (row.date != ref_typed[0] or not all(_same_float(a, b) for a, b in zip(row[1:4], ref_typed[1:]))
+                    or list(row[4:]) != ref[4:]):
+                mismatches.append(f"{name}: {tuple(row)} != {ref}")
+
+        frame = _read_html_frame(text)
+        dates = pd.to_datetime(frame.iloc[:, 0], errors='coerce')
+        navs = pd.to_numeric(frame.iloc[:, 1], errors='coerce')
+        keep = dates.notna().to_numpy()
+        ref_dates = [d.date() for d in dates[keep]]
+        if ref_dates != [row.date for row in page.rows]:
+            mismatches.append(f"{name}: 日期与 pd.read_html 不一致")
+        elif not all(_same_float(a, row.net_value) for a, row in zip(navs[keep].tolist(), page.rows)):
+            mismatches.append(f"{name}: 单位净值与 pd.read_html 不一致")
+    return mismatches
+
+
+def bench(samples, repeat=BENCH_REPEAT):
+    """返回 {解析方式: 平均每页耗时 (微秒)}"""
+    parsers = {
+        'regex (lsjz_parser)': parse_page,
+        'BeautifulSoup lxml': _bs4_rows,
+        'pd.read_html': _read_html_frame,
+    }
+    texts = [t for t in samples.values() if 'colspan' not in t]    # 只统计有数据的页
+    timings = {}
+    for label, parse in parsers.items():
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                parse(text)
+        timings[label] = (time.perf_counter() - t0) / (repeat * len(texts)) * 1e6
+    return timings
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='天天基金历史净值接口解析器')
+    parser.add_argument('--verify', action='store_true', help='对照 BeautifulSoup 与 pd.read_html 校验解析结果')
+    parser.add_argument('--bench', action='store_true', help='比较各解析方式的单页耗时')
+    parser.add_argument('--samples', help=f'接口响应样例目录 (默认 {SAMPLES_DIR}，不存在时只用内置样例)')
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    logger.info("样例页 %d 份", len(samples))
+    if args.verify:
+        mismatches = verify(samples)
+        for line in mismatches[:20]:
+            logger.error(line)
+        logger.info("校验完成：%d 页 (golden %d 页)，%d 处不一致", len(samples),
+                    sum(os.path.isfile(expected_path(name)) for name in samples), len(mismatches))
+    if args.bench:
+        timings = bench(samples)
+        baseline = timings['regex (lsjz_parser)']
+        for label, micros in timings.items():
+            logger.info("%-22s %9.1f 微秒/页 (%.1fx)", label, micros, micros / baseline)
+    if args.verify and mismatches:
+        sys.exit(1)
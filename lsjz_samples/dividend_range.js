@@ -0,0 +1 @@
+var apidata={ content:"<table class='w782 comm lsjz'><thead><tr><th class='first'>净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th><th>申购状态</th><th>赎回状态</th><th class='tor last'>分红送配</th></tr></thead><tbody><tr><td>2025-07-04</td><td class='tor bold'>1.0702</td><td class='tor bold'>2.4352</td><td class='tor bold red'>0.53%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-07-03</td><td class='tor bold'>1.0646</td><td class='tor bold'>2.4296</td><td class='tor bold red'>0.26%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-07-02</td><td class='tor bold'>1.0618</td><td class='tor bold'>2.4268</td><td class='tor bold grn'>-0.34%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-07-01</td><td class='tor bold'>1.0654</td><td class='tor bold'>2.4304</td><td class='tor bold red'>0.90%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-06-30</td><td class='tor bold'>1.0559</td><td class='tor bold'>2.4209</td><td class='tor bold grn'>-4.46%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'>每份派现金0.0500元</td></tr><tr><td>2025-06-27</td><td class='tor bold'>1.1052</td><td class='tor bold'>2.4202</td><td class='tor bold red'>0.12%</td><td>暂停申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-06-26</td><td class='tor bold'>1.1039</td><td class='tor bold'>2.4189</td><td class='tor bold grn'>-0.71%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-06-25</td><td class='tor bold'>1.1118</td><td class='tor bold'>2.4268</td><td class='tor bold'>--</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'>每份基金份额折算1.0203份</td></tr><tr><td>2025-06-24</td><td class='tor bold'>1.1344</td><td class='tor bold'>2.4231</td><td class='tor bold red'>1.11%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-06-23</td><td class='tor bold'>1.1219</td><td class='tor bold'>2.4106</td><td class='tor bold '>0.00%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-06-20</td><td class='tor bold'>1.1219</td><td class='tor bold'>2.4106</td><td class='tor bold grn'>-0.29%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr></tbody></table>",records:11,pages:1,curpage:1};
\ No newline at end of file
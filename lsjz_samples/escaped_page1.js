@@ -0,0 +1 @@
+var apidata={ content:"<table class=\"w782 comm lsjz\"><thead><tr><th class=\"first\">净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th><th>申购状态</th><th>赎回状态</th><th class=\"tor last\">分红送配</th></tr>\r\n</thead><tbody>\r\n<tr>\r\n\t<td>2025-12-31</td>\r\n\t<td class=\"tor bold\">1.2318</td>\r\n\t<td class=\"tor bold\">3.8648</td>\r\n\t<td class=\"tor bold red\">0.41%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-30</td>\r\n\t<td class=\"tor bold\">1.2268</td>\r\n\t<td class=\"tor bold\">3.8598</td>\r\n\t<td class=\"tor bold grn\">-0.23%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-29</td>\r\n\t<td class=\"tor bold\">1.2296</td>\r\n\t<td class=\"tor bold\">3.8626</td>\r\n\t<td class=\"tor bold \">0.00%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-26</td>\r\n\t<td class=\"tor bold\">1.2296</td>\r\n\t<td class=\"tor bold\">3.8626</td>\r\n\t<td class=\"tor bold red\">1.05%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-25</td>\r\n\t<td class=\"tor bold\">1.2168</td>\r\n\t<td class=\"tor bold\">3.8498</td>\r\n\t<td class=\"tor bold grn\">-1.38%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-24</td>\r\n\t<td class=\"tor bold\">1.2338</td>\r\n\t<td class=\"tor bold\">3.8668</td>\r\n\t<td class=\"tor bold red\">0.62%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-23</td>\r\n\t<td class=\"tor bold\">1.2262</td>\r\n\t<td class=\"tor bold\">3.8592</td>\r\n\t<td class=\"tor bold red\">0.09%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-22</td>\r\n\t<td class=\"tor bold\">1.2251</td>\r\n\t<td class=\"tor bold\">3.8581</td>\r\n\t<td class=\"tor bold grn\">-0.45%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-19</td>\r\n\t<td class=\"tor bold\">1.2306</td>\r\n\t<td class=\"tor bold\">3.8636</td>\r\n\t<td class=\"tor bold red\">0.74%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-18</td>\r\n\t<td class=\"tor bold\">1.2216</td>\r\n\t<td class=\"tor bold\">3.8546</td>\r\n\t<td class=\"tor bold grn\">-0.11%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-17</td>\r\n\t<td class=\"tor bold\">1.2229</td>\r\n\t<td class=\"tor bold\">3.8559</td>\r\n\t<td class=\"tor bold red\">1.42%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-16</td>\r\n\t<td class=\"tor bold\">1.2058</td>\r\n\t<td class=\"tor bold\">3.8388</td>\r\n\t<td class=\"tor bold grn\">-2.07%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-15</td>\r\n\t<td class=\"tor bold\">1.2313</td>\r\n\t<td class=\"tor bold\">3.8643</td>\r\n\t<td class=\"tor bold red\">0.16%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-12</td>\r\n\t<td class=\"tor bold\">1.2293</td>\r\n\t<td class=\"tor bold\">3.8623</td>\r\n\t<td class=\"tor bold red\">0.33%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-11</td>\r\n\t<td class=\"tor bold\">1.2253</td>\r\n\t<td class=\"tor bold\">3.8583</td>\r\n\t<td class=\"tor bold grn\">-0.57%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-10</td>\r\n\t<td class=\"tor bold\">1.2323</td>\r\n\t<td class=\"tor bold\">3.8653</td>\r\n\t<td class=\"tor bold red\">0.25%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-09</td>\r\n\t<td class=\"tor bold\">1.2292</td>\r\n\t<td class=\"tor bold\">3.8622</td>\r\n\t<td class=\"tor bold red\">0.93%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-08</td>\r\n\t<td class=\"tor bold\">1.2179</td>\r\n\t<td class=\"tor bold\">3.8509</td>\r\n\t<td class=\"tor bold grn\">-0.08%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-05</td>\r\n\t<td class=\"tor bold\">1.2189</td>\r\n\t<td class=\"tor bold\">3.8519</td>\r\n\t<td class=\"tor bold red\">0.51%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n<tr>\r\n\t<td>2025-12-04</td>\r\n\t<td class=\"tor bold\">1.2127</td>\r\n\t<td class=\"tor bold\">3.8457</td>\r\n\t<td class=\"tor bold grn\">-0.36%</td>\r\n\t<td>开放申购</td>\r\n\t<td>开放赎回</td>\r\n\t<td class=\"red unbold\"></td></tr>\r\n</tbody></table>",records:5341,pages:268,curpage:1};
\ No newline at end of file
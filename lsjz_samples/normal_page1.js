@@ -0,0 +1 @@
+var apidata={ content:"<table class='w782 comm lsjz'><thead><tr><th class='first'>净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th><th>申购状态</th><th>赎回状态</th><th class='tor last'>分红送配</th></tr></thead><tbody><tr><td>2025-12-31</td><td class='tor bold'>1.2318</td><td class='tor bold'>3.8648</td><td class='tor bold red'>0.41%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-30</td><td class='tor bold'>1.2268</td><td class='tor bold'>3.8598</td><td class='tor bold grn'>-0.23%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-29</td><td class='tor bold'>1.2296</td><td class='tor bold'>3.8626</td><td class='tor bold '>0.00%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-26</td><td class='tor bold'>1.2296</td><td class='tor bold'>3.8626</td><td class='tor bold red'>1.05%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-25</td><td class='tor bold'>1.2168</td><td class='tor bold'>3.8498</td><td class='tor bold grn'>-1.38%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-24</td><td class='tor bold'>1.2338</td><td class='tor bold'>3.8668</td><td class='tor bold red'>0.62%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-23</td><td class='tor bold'>1.2262</td><td class='tor bold'>3.8592</td><td class='tor bold red'>0.09%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-22</td><td class='tor bold'>1.2251</td><td class='tor bold'>3.8581</td><td class='tor bold grn'>-0.45%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-19</td><td class='tor bold'>1.2306</td><td class='tor bold'>3.8636</td><td class='tor bold red'>0.74%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-18</td><td class='tor bold'>1.2216</td><td class='tor bold'>3.8546</td><td class='tor bold grn'>-0.11%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-17</td><td class='tor bold'>1.2229</td><td class='tor bold'>3.8559</td><td class='tor bold red'>1.42%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-16</td><td class='tor bold'>1.2058</td><td class='tor bold'>3.8388</td><td class='tor bold grn'>-2.07%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-15</td><td class='tor bold'>1.2313</td><td class='tor bold'>3.8643</td><td class='tor bold red'>0.16%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-12</td><td class='tor bold'>1.2293</td><td class='tor bold'>3.8623</td><td class='tor bold red'>0.33%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-11</td><td class='tor bold'>1.2253</td><td class='tor bold'>3.8583</td><td class='tor bold grn'>-0.57%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-10</td><td class='tor bold'>1.2323</td><td class='tor bold'>3.8653</td><td class='tor bold red'>0.25%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-09</td><td class='tor bold'>1.2292</td><td class='tor bold'>3.8622</td><td class='tor bold red'>0.93%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-08</td><td class='tor bold'>1.2179</td><td class='tor bold'>3.8509</td><td class='tor bold grn'>-0.08%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-05</td><td class='tor bold'>1.2189</td><td class='tor bold'>3.8519</td><td class='tor bold red'>0.51%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-04</td><td class='tor bold'>1.2127</td><td class='tor bold'>3.8457</td><td class='tor bold grn'>-0.36%</td><td>开放申购</td><td>开放赎回</td><td class='red unbold'></td></tr></tbody></table>",records:5341,pages:268,curpage:1};
\ No newline at end of file
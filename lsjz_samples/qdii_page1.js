@@ -0,0 +1 @@
+var apidata={ content:"<table class='w782 comm lsjz'><thead><tr><th class='first'>净值日期</th><th>单位净值</th><th>累计净值</th><th>日增长率</th><th>申购状态</th><th>赎回状态</th><th class='tor last'>分红送配</th></tr></thead><tbody><tr><td>2025-12-29</td><td class='tor bold'>6.2841</td><td class='tor bold'>6.2841</td><td class='tor bold grn'>-0.48%</td><td>限制大额申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-26</td><td class='tor bold'>6.3144</td><td class='tor bold'>6.3144</td><td class='tor bold red'>0.07%</td><td>限制大额申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-24</td><td class='tor bold'>6.3100</td><td class='tor bold'>6.3100</td><td class='tor bold red'>0.31%</td><td>限制大额申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-23</td><td class='tor bold'>6.2905</td><td class='tor bold'>6.2905</td><td class='tor bold'></td><td>限制大额申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-22</td><td class='tor bold'>6.2512</td><td class='tor bold'>6.2512</td><td class='tor bold red'>0.65%</td><td>暂停申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-19</td><td class='tor bold'>6.2108</td><td class='tor bold'>6.2108</td><td class='tor bold red'>1.26%</td><td>暂停申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-18</td><td class='tor bold'>6.1335</td><td class='tor bold'>6.1335</td><td class='tor bold grn'>-1.93%</td><td>限制大额申购</td><td>开放赎回</td><td class='red unbold'></td></tr><tr><td>2025-12-17</td><td class='tor bold'>6.2542</td><td class='tor bold'>6.2542</td><td class='tor bold grn'>-0.02%</td><td>限制大额申购</td><td>开放赎回</td><td class='red unbold'></td></tr></tbody></table>",records:2516,pages:315,curpage:1};
\ No newline at end of file
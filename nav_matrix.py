@@ -0,0 +1,236 @@
+"""
+日期对齐的稠密净值矩阵 (Dense NAV Matrix)
+
+跨基金计算 (排名、共同期指标、V5 全市场扫描) 需要按日期对齐所有基金。
+本模块从列式存储 (nav_store) 构建 交易日 × 基金 的 float32 矩阵，
+以 .npy 保存并通过内存映射打开，任何进程都可以 O(1) 打开并零拷贝切片：
+
+    nav_matrix/dates.npy                 交易日 (datetime64[D], 升序，所有基金日期的并集)
+    nav_matrix/net_value.npy             单位净值 (float32, 形状 = 交易日数 × 基金数，缺失为 NaN)
+    nav_matrix/cumulative_net_value.npy  累计净值 (float32, 同上)
+    nav_matrix/mask.npy                  有效数据掩码 (bool, 同上)
+    nav_matrix/index.json                基金代码 → 列号索引及构建信息
+
+矩阵为派生数据，不纳入版本库；open_matrix() 先将列式存储与 CSV 同步，发现矩阵缺失或早于列式存储时自动重建。
+index.json 记录构建来源的存储目录，用另一个存储打开已有矩阵会抛出 ValueError，
+使用非默认数据目录时须同时指定对应的 store_dir / matrix_dir (见 derived_dirs)。
+float32 约 7 位有效数字，足够表示 4 位小数的净值，但与 CSV 原值存在 1e-7 量级误差。
+
+命令行：python nav_matrix.py   # 重建矩阵
+"""
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+import nav_store
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+MATRIX_DIR = 'nav_matrix'
+MATRIX_FIELDS = ['net_value', 'cumulative_net_value']
+INDEX_FILE = 'index.json'
+# ==========================================
+
+
+def _store_mtime(store_dir):
+    """列式存储中最新分片的修改时间，用于判断矩阵是否过期"""
+    mtimes = [
+        os.path.getmtime(os.path.join(store_dir, nav_store.SHARD_NAME.format(shard=s)))
+        for s in range(nav_store.NUM_SHARDS)
+        if os.path.exists(os.path.join(store_dir, nav_store.SHARD_NAME.format(shard=s)))
+    ]
+    return max(mtimes) if mtimes else 0.0
+
+
+def _source_tag(matrix_dir, store_dir):
+    return os.path.relpath(os.path.abspath(store_dir), os.path.abspath(matrix_dir)).replace(os.sep, '/')
+
+
+def derived_dirs(csv_dir):
+    """
+    返回 csv_dir 对应的 (store_dir, matrix_dir)：默认数据目录使用默认位置，
+    其他目录使用与之并列的 <csv_dir>_store / <csv_dir>_matrix，避免不同数据集共用派生数据。
+    """
+    if os.path.abspath(csv_dir) == os.path.abspath(nav_store.FUND_DATA_DIR):
+        return nav_store.STORE_DIR, MATRIX_DIR
+    base = os.path.normpath(csv_dir)
+    return f"{base}_store", f"{base}_matrix"
+
+
+def _save_npy(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def build_matrix(store_dir=nav_store.STORE_DIR, matrix_dir=MATRIX_DIR, csv_dir=nav_store.FUND_DATA_DIR):
+    """从列式存储构建稠密矩阵，返回 (交易日数, 基金数)"""
+    start = time.time()
+    panel = nav_store.load_panel(store_dir=store_dir, csv_dir=csv_dir)
+    codes = list(panel.codes)
+    if codes:
+        dates = np.unique(np.concatenate([panel.arrays(c, ['date'])['date'] for c in codes]))
+    else:
+        dates = np.array([], dtype='datetime64[D]')
+
+    shape = (len(dates), len(codes))
+    matrices = {field: np.full(shape, np.nan, dtype=np.float32) for field in MATRIX_FIELDS}
+    mask = np.zeros(shape, dtype=bool)
+    for j, code in enumerate(codes):
+        arrays = panel.arrays(code, ['date'] + MATRIX_FIELDS)
+        rows = np.searchsorted(dates, arrays['date'])
+        for field in MATRIX_FIELDS:
+            matrices[field][rows, j] = arrays[field]
+        mask[rows, j] = ~np.isnan(arrays['net_value'])
+
+    os.makedirs(matrix_dir, exist_ok=True)
+    _save_npy(os.path.join(matrix_dir, 'dates.npy'), dates)
+    for field in MATRIX_FIELDS:
+        _save_npy(os.path.join(matrix_dir, f'{field}.npy'), matrices[field])
+    _save_npy(os.path.join(matrix_dir, 'mask.npy'), mask)
+
+    # 索引最后写入，作为本次构建完成的标志
+    index = {
+        'codes': codes,
+        'shape': list(shape),
+        'source_mtime': _store_mtime(store_dir),
+        'source': _source_tag(matrix_dir, store_dir),
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    tmp_path = os.path.join(matrix_dir, f'{INDEX_FILE}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(matrix_dir, INDEX_FILE))
+
+    logger.info("净值矩阵构建完成: %d 个交易日 × %d 只基金，耗时 %.2f 秒", shape[0], shape[1], time.time() - start)
+    return shape
+
+
+class NavMatrix:
+    """
+    内存映射的 交易日 × 基金 净值矩阵。
+
+    行 (日期) 切片与连续列切片均为零拷贝视图；按代码列表选列属于高级索引，会复制所选列。
+    """
+
+    def __init__(self, matrix_dir=MATRIX_DIR, mmap_mode='r'):
+        with open(os.path.join(matrix_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.codes = self.index['codes']
+        self._columns = {code: j for j, code in enumerate(self.codes)}
+        self.dates = np.load(os.path.join(matrix_dir, 'dates.npy'), mmap_mode=mmap_mode)
+        self.fields = {
+            field: np.load(os.path.join(matrix_dir, f'{field}.npy'), mmap_mode=mmap_mode)
+            for field in MATRIX_FIELDS
+        }
+        self.mask = np.load(os.path.join(matrix_dir, 'mask.npy'), mmap_mode=mmap_mode)
+        if list(self.mask.shape) != self.index['shape']:
+            raise ValueError(f"净值矩阵文件与索引不一致: {self.mask.shape} != {self.index['shape']}")
+
+    @property
+    def net_value(self):
+        return self.fields['net_value']
+
+    @property
+    def cumulative_net_value(self):
+        return self.fields['cumulative_net_value']
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    def __contains__(self, fund_code):
+        return fund_code in self._columns
+
+    def column(self, fund_code):
+        """返回基金代码对应的列号"""
+        return self._columns[fund_code]
+
+    def columns(self, fund_codes):
+        """返回一组基金代码对应的列号数组 (不存在的代码会被忽略)"""
+        return np.array([self._columns[c] for c in fund_codes if c in self._columns], dtype=np.int64)
+
+    def row_slice(self, start=None, end=None):
+        """返回 [start, end] 日期区间 (含两端) 对应的行切片"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right'))
+        return slice(lo, hi)
+
+    def fund(self, fund_code, field='net_value', start=None, end=None):
+        """返回单只基金在日期区间内的 (日期, 数值) 一维视图，缺失日为 NaN"""
+        rows = self.row_slice(start, end)
+        return self.dates[rows], self.fields[field][rows, self._columns[fund_code]]
+
+    def window(self, field='net_value', start=None, end=None, fund_codes=None):
+        """
+        返回日期区间内的 (日期, 二维数组, 掩码)。
+        fund_codes 为空时返回全部列的零拷贝视图，否则按代码顺序选列。
+        """
+        rows = self.row_slice(start, end)
+        values, mask = self.fields[field][rows], self.mask[rows]
+        if fund_codes is not None:
+            cols = self.columns(fund_codes)
+            values, mask = values[:, cols], mask[:, cols]
+        return self.dates[rows], values, mask
+
+    def valid_range(self, field=None):
+        """返回每只基金首个与最后一个有效数据的行号 (无数据的基金为 -1)；field 为空时按 mask 判断"""
+        mask = np.asarray(self.mask) if field is None else ~np.isnan(self.fields[field])
+        has_data = mask.any(axis=0)
+        first = np.where(has_data, mask.argmax(axis=0), -1)
+        last = np.where(has_data, len(mask) - 1 - mask[::-1].argmax(axis=0), -1)
+        return first, last
+
+
+def is_stale(matrix_dir=MATRIX_DIR, store_dir=nav_store.STORE_DIR):
+    """矩阵不存在，或列式存储在矩阵构建后又有更新"""
+    index_path = os.path.join(matrix_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return True
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return True
+    return _store_mtime(store_dir) > index.get('source_mtime', 0.0)
+
+
+def check_source(matrix_dir=MATRIX_DIR, store_dir=nav_store.STORE_DIR):
+    """已有矩阵由另一个存储构建时抛出 ValueError；早期版本的矩阵未记录来源，视为一致"""
+    try:
+        with open(os.path.join(matrix_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            source = json.load(f).get('source')
+    except (OSError, ValueError):
+        return
+    if source is not None and source != _source_tag(matrix_dir, store_dir):
+        raise ValueError(f"净值矩阵 {matrix_dir} 由 {os.path.normpath(os.path.join(matrix_dir, source))} 构建，"
+                         f"与列式存储 {store_dir} 不一致，请为该数据集指定单独的 matrix_dir")
+
+
+def open_matrix(matrix_dir=MATRIX_DIR, store_dir=nav_store.STORE_DIR, csv_dir=nav_store.FUND_DATA_DIR, rebuild=True):
+    """
+    打开净值矩阵；rebuild=True 时先将列式存储与 csv_dir 同步，若矩阵缺失或过期则重建。
+    矩阵、存储与 csv_dir 的来源不一致时抛出 ValueError。
+    """
+    check_source(matrix_dir, store_dir)
+    if rebuild:
+        if nav_store.store_exists(store_dir):
+            nav_store.sync_store(store_dir, csv_dir)
+        if not nav_store.store_exists(store_dir) or is_stale(matrix_dir, store_dir):
+            build_matrix(store_dir, matrix_dir, csv_dir)
+    else:
+        nav_store.check_source(store_dir, csv_dir)
+    return NavMatrix(matrix_dir)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_matrix()
+    t0 = time.time()
+    matrix = open_matrix(rebuild=False)
+    logger.info("打开矩阵 %s 耗时 %.4f 秒", matrix.shape, time.time() - t0)
@@ -0,0 +1,529 @@
+"""
+基金净值列式存储 (NAV Panel Store)
+
+fund_data/*.csv 每次分析都要全量解析约 85MB 文本 (包括从不使用的申购/赎回状态、分红列)。
+本模块把分析所需的数值列按列式 .npz 分片保存在 fund_store/ 目录下：
+
+    fund_store/panel_00.npz ... panel_15.npz   (按 int(基金代码) % NUM_SHARDS 分片)
+        codes                 基金代码 (U6)
+        offsets               各基金在列数组中的起止位置 (int64, 长度 = 基金数 + 1)
+        date                  日期 (datetime64[D], 每只基金内部升序)
+        net_value             单位净值 (float64)
+        cumulative_net_value  累计净值 (float64)
+        daily_growth_rate     日增长率 (float64)
+        stamps                写入时各基金 CSV (主文件 + 增量日志) 的 (大小, 修改时间 ns)
+        source                构建来源 CSV 目录 (相对于存储目录的路径)
+
+写入方：fund_spider.save_to_csv、MarketMonitor 通过 NavStoreWriter 暂存，抓取结束后统一 flush()。
+读取方：统一使用 load_panel()，返回 NavPanel，可按基金代码取数组视图或 DataFrame。
+CSV 文件是数据源，列式存储为派生数据 (不纳入版本库)：存储缺失时 load_panel() 从 CSV 重建；
+每个存储只对应一个 CSV 目录，用其他目录打开已有存储会抛出 ValueError (见 check_source)；
+已有存储时按分片比对 stamps 与 CSV 的当前大小/修改时间 (与 fund_manifest 相同的判断)，
+只重新读取变化的基金，因此绕过 NavStoreWriter 直接改写 CSV 的脚本也不会让分析读到旧数据。
+
+CSV 导出采用增量日志：新增行先追加到 fund_data/journal/<code>.csv，
+日志累计 COMPACT_THRESHOLD_ROWS 行后才合并回主文件 (降序、去重)，
+因此每次抓取的写入量只与新增行数相关。仓库内的读取方统一经 fund_loader.load_fund_frame()
+或 read_fund_csv()/read_csv_frame() 读取 (自动合并日志)；数据更新工作流每周运行一次 --compact，
+直接读取主 CSV 的外部脚本最多滞后一周，需要完整数据时先运行 --compact。
+
+命令行：python nav_store.py --rebuild   # 从 fund_data/*.csv 全量重建
+        python nav_store.py --compact   # 将所有增量日志合并回主 CSV
+"""
+import argparse
+import glob
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+FUND_DATA_DIR = 'fund_data'      # CSV 导出目录
+STORE_DIR = 'fund_store'         # 列式存储目录
+NUM_SHARDS = 16                  # 分片数量 (单只基金更新时只重写其所在分片)
+SHARD_NAME = 'panel_{shard:02d}.npz'
+
+# 列式存储中保存的数值列 (date 单独处理)
+VALUE_COLUMNS = ['net_value', 'cumulative_net_value', 'daily_growth_rate']
+PANEL_COLUMNS = ['date'] + VALUE_COLUMNS
+
+# CSV 导出格式与增量日志
+CSV_COLUMNS = ['date', 'net_value', 'cumulative_net_value', 'daily_growth_rate',
+               'purchase_status', 'redemption_status', 'dividend']
+JOURNAL_SUBDIR = 'journal'       # fund_data/journal/<code>.csv 保存尚未合并的新增行
+COMPACT_THRESHOLD_ROWS = 20      # 日志累计行数达到该值时合并回主文件 (约一个月)
+# ==========================================
+
+
+def shard_of(fund_code):
+    """返回基金代码所在的分片编号"""
+    return int(fund_code) % NUM_SHARDS
+
+
+def _shard_path(store_dir, shard):
+    return os.path.join(store_dir, SHARD_NAME.format(shard=shard))
+
+
+def frame_to_arrays(df):
+    """
+    将任意顺序的净值 DataFrame 转为升序、按日期去重的列数组字典。
+    date 列可以是字符串或 datetime，缺失的数值列以 NaN 补齐。
+    """
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    valid = dates.notna().to_numpy()
+    arrays = {'date': dates.to_numpy()[valid].astype('datetime64[D]')}
+    for col in VALUE_COLUMNS:
+        if col in df.columns:
+            arrays[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)[valid]
+        else:
+            arrays[col] = np.full(valid.sum(), np.nan)
+
+    # 升序排列并去重 (保留同一日期的第一条，与 fund_spider 的去重规则一致)
+    order = np.argsort(arrays['date'], kind='stable')
+    sorted_dates = arrays['date'][order]
+    keep = np.ones(len(sorted_dates), dtype=bool)
+    keep[1:] = sorted_dates[1:] != sorted_dates[:-1]
+    return {col: arr[order][keep] for col, arr in arrays.items()}
+
+
+def journal_path(fund_code, csv_dir=FUND_DATA_DIR):
+    return os.path.join(csv_dir, JOURNAL_SUBDIR, f"{fund_code}.csv")
+
+
+def journal_row_count(fund_code, csv_dir=FUND_DATA_DIR):
+    """返回增量日志中的数据行数 (不含表头)"""
+    path = journal_path(fund_code, csv_dir)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        return max(0, f.read().count(b'\n') - 1)
+
+
+def source_stamp(fund_code, csv_dir=FUND_DATA_DIR):
+    """返回某基金 CSV 导出 (主文件 + 增量日志) 的 (大小之和, 最新修改时间 ns)；主文件不存在时返回 None"""
+    try:
+        stats = [os.stat(os.path.join(csv_dir, f"{fund_code}.csv"))]
+    except FileNotFoundError:
+        return None
+    try:
+        stats.append(os.stat(journal_path(fund_code, csv_dir)))
+    except FileNotFoundError:
+        pass
+    return sum(st.st_size for st in stats), max(st.st_mtime_ns for st in stats)
+
+
+def csv_fund_codes(csv_dir=FUND_DATA_DIR):
+    """CSV 导出目录中的基金代码 (文件名为 6 位数字的 .csv)"""
+    if not os.path.isdir(csv_dir):
+        return []
+    codes = []
+    for name in os.listdir(csv_dir):
+        fund_code, ext = os.path.splitext(name)
+        if ext == '.csv' and len(fund_code) == 6 and fund_code.isdigit():
+            codes.append(fund_code)
+    return sorted(codes)
+
+
+def read_csv_frame(filepath, usecols=None, dtype=None):
+    """
+    读取单个基金 CSV，并把增量日志中尚未合并的行放在前面一并返回。
+    同一日期以日志中最后追加的行为准；返回的行顺序未排序。
+    """
+    csv_dir = os.path.dirname(filepath)
+    fund_code = os.path.splitext(os.path.basename(filepath))[0]
+    frames = []
+    jpath = journal_path(fund_code, csv_dir)
+    if os.path.exists(jpath):
+        # 日志按追加顺序保存，倒序后最新追加的行在最前，去重时优先保留
+        frames.append(pd.read_csv(jpath, usecols=usecols, dtype=dtype, encoding='utf-8',
+                                  keep_default_na=dtype is not str).iloc[::-1])
+    if os.path.exists(filepath):
+        frames.append(pd.read_csv(filepath, usecols=usecols, dtype=dtype, encoding='utf-8',
+                                  keep_default_na=dtype is not str))
+    if not frames:
+        raise FileNotFoundError(filepath)
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def read_fund_csv(filepath):
+    """只读取数值列，将单个基金 CSV (含增量日志) 转为列数组字典"""
+    df = read_csv_frame(filepath, usecols=lambda c: c in PANEL_COLUMNS)
+    return frame_to_arrays(df)
+
+
+def append_csv_rows(fund_code, new_df, csv_dir=FUND_DATA_DIR):
+    """
+    将新增行写入 CSV 导出 (new_df 须为 CSV_COLUMNS 列、日期已格式化为字符串)。
+    主文件不存在时直接写入主文件；否则追加到增量日志，
+    日志达到 COMPACT_THRESHOLD_ROWS 行时合并回主文件。
+    """
+    os.makedirs(csv_dir, exist_ok=True)
+    output_path = os.path.join(csv_dir, f"{fund_code}.csv")
+    if not os.path.exists(output_path):
+        new_df.to_csv(output_path, index=False, encoding='utf-8')
+        return
+
+    jpath = journal_path(fund_code, csv_dir)
+    os.makedirs(os.path.dirname(jpath), exist_ok=True)
+    write_header = not os.path.exists(jpath)
+    new_df.to_csv(jpath, mode='a', header=write_header, index=False, encoding='utf-8')
+
+    if journal_row_count(fund_code, csv_dir) >= COMPACT_THRESHOLD_ROWS:
+        compact_csv(fund_code, csv_dir)
+
+
+def compact_csv(fund_code, csv_dir=FUND_DATA_DIR):
+    """将某基金的增量日志合并回主 CSV (降序、按日期去重)，返回合并的日志行数"""
+    jpath = journal_path(fund_code, csv_dir)
+    if not os.path.exists(jpath):
+        return 0
+    output_path = os.path.join(csv_dir, f"{fund_code}.csv")
+    journal_rows = journal_row_count(fund_code, csv_dir)
+
+    # 以字符串读取，保证主文件中已有数值的格式原样保留
+    combined = read_csv_frame(output_path, dtype=str)
+    for col in CSV_COLUMNS:
+        if col not in combined.columns:
+            combined[col] = ""
+    combined = combined.drop_duplicates(subset=['date'], keep='first')
+    combined = combined.sort_values(by='date', ascending=False)[CSV_COLUMNS]
+
+    tmp_path = f"{output_path}.tmp"
+    combined.to_csv(tmp_path, index=False, encoding='utf-8')
+    os.replace(tmp_path, output_path)
+    os.remove(jpath)
+    return journal_rows
+
+
+def compact_all(csv_dir=FUND_DATA_DIR):
+    """合并目录下全部增量日志，返回处理的基金数量"""
+    count = 0
+    for jpath in glob.glob(os.path.join(csv_dir, JOURNAL_SUBDIR, '*.csv')):
+        fund_code = os.path.splitext(os.path.basename(jpath))[0]
+        compact_csv(fund_code, csv_dir)
+        count += 1
+    logger.info("增量日志合并完成: %d 只基金", count)
+    return count
+
+
+class NavPanel:
+    """
+    内存中的全市场净值面板。
+
+    所有基金的各列首尾相接存放在同一组连续数组中，arrays()/frame()
+    按 offsets 切片返回视图，不复制数据。
+    """
+
+    def __init__(self, codes, offsets, columns):
+        self.codes = list(codes)
+        self._index = {code: i for i, code in enumerate(self.codes)}
+        self._offsets = offsets
+        self._columns = columns
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, fund_code):
+        return fund_code in self._index
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    @property
+    def total_rows(self):
+        return int(self._offsets[-1])
+
+    def row_count(self, fund_code):
+        i = self._index[fund_code]
+        return int(self._offsets[i + 1] - self._offsets[i])
+
+    def arrays(self, fund_code, columns=None):
+        """返回指定基金的 {列名: 升序数组视图}"""
+        i = self._index[fund_code]
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return {col: self._columns[col][start:end] for col in (columns or PANEL_COLUMNS)}
+
+    def frame(self, fund_code, columns=None):
+        """返回指定基金的升序 DataFrame (date 为 datetime64 列)"""
+        return pd.DataFrame(self.arrays(fund_code, columns))
+
+
+def _shard_stamps(npz, codes):
+    """分片中记录的 {基金代码: (大小, 修改时间 ns)}；早期版本的分片没有 stamps，视为全部过期"""
+    if 'stamps' not in npz.files:
+        return {}
+    return {code: (int(size), int(mtime)) for code, (size, mtime) in zip(codes, npz['stamps'])}
+
+
+def _load_shard(path):
+    """读取单个分片，返回 ({基金代码: 列数组字典}, {基金代码: 写入时的 CSV 戳})"""
+    with np.load(path, allow_pickle=False) as npz:
+        codes = [str(c) for c in npz['codes']]
+        offsets = npz['offsets']
+        columns = {col: npz[col] for col in PANEL_COLUMNS}
+        stamps = _shard_stamps(npz, codes)
+    funds = {
+        code: {col: arr[offsets[i]:offsets[i + 1]] for col, arr in columns.items()}
+        for i, code in enumerate(codes)
+    }
+    return funds, stamps
+
+
+def _source_tag(store_dir, csv_dir):
+    """CSV 目录相对于存储目录的路径：与当前工作目录无关，仓库整体移动后仍然一致"""
+    return os.path.relpath(os.path.abspath(csv_dir), os.path.abspath(store_dir)).replace(os.sep, '/')
+
+
+def check_source(store_dir=STORE_DIR, csv_dir=FUND_DATA_DIR):
+    """
+    确认已有存储由 csv_dir 构建；不一致时抛出 ValueError，
+    避免用另一个数据目录打开 (进而同步改写) 默认存储。早期版本的分片未记录来源，视为一致。
+    """
+    for shard in range(NUM_SHARDS):
+        path = _shard_path(store_dir, shard)
+        if not os.path.exists(path):
+            continue
+        with np.load(path, allow_pickle=False) as npz:
+            if 'source' not in npz.files:
+                return
+            source = str(npz['source'])
+        if source != _source_tag(store_dir, csv_dir):
+            raise ValueError(f"列式存储 {store_dir} 由 {os.path.normpath(os.path.join(store_dir, source))} 构建，"
+                             f"与数据目录 {csv_dir} 不一致，请为该数据目录指定单独的 store_dir")
+        return
+
+
+def _write_shard(path, funds, stamps, source):
+    """将 {基金代码: 列数组字典}、各基金的 CSV 戳及来源目录原子写入单个分片 (先写临时文件再替换)"""
+    codes = sorted(funds)
+    lengths = [len(funds[c]['date']) for c in codes]
+    offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+
+    payload = {'codes': np.array(codes, dtype='U6'), 'offsets': offsets, 'source': np.array(source),
+               'stamps': np.array([stamps.get(c) or (-1, -1) for c in codes], dtype=np.int64).reshape(-1, 2)}
+    for col in PANEL_COLUMNS:
+        if codes:
+            payload[col] = np.concatenate([funds[c][col] for c in codes])
+        else:
+            payload[col] = np.array([], dtype='datetime64[D]' if col == 'date' else np.float64)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **payload)
+    os.replace(tmp_path, path)
+
+
+def store_exists(store_dir=STORE_DIR):
+    return any(os.path.exists(_shard_path(store_dir, s)) for s in range(NUM_SHARDS))
+
+
+def build_store(csv_dir=FUND_DATA_DIR, store_dir=STORE_DIR):
+    """从 CSV 目录全量重建列式存储，返回写入的基金数量"""
+    start = time.time()
+    shards = {s: {} for s in range(NUM_SHARDS)}
+    stamps = {}
+    for fund_code in csv_fund_codes(csv_dir):
+        filepath = os.path.join(csv_dir, f"{fund_code}.csv")
+        # 先取戳再读文件：读取期间文件若被改写，下次同步时会重新读取
+        stamps[fund_code] = source_stamp(fund_code, csv_dir)
+        try:
+            shards[shard_of(fund_code)][fund_code] = read_fund_csv(filepath)
+        except Exception as e:
+            logger.warning("读取 %s 失败，跳过: %s", filepath, e)
+
+    os.makedirs(store_dir, exist_ok=True)
+    for shard, funds in shards.items():
+        _write_shard(_shard_path(store_dir, shard), funds, stamps, _source_tag(store_dir, csv_dir))
+
+    total = sum(len(f) for f in shards.values())
+    logger.info("列式存储重建完成: %d 只基金，耗时 %.2f 秒", total, time.time() - start)
+    return total
+
+
+def sync_store(store_dir=STORE_DIR, csv_dir=FUND_DATA_DIR, codes=None):
+    """
+    按分片比对存储中记录的 CSV 戳与 CSV 当前的大小/修改时间，
+    重新读取变化或新增的基金、删除 CSV 已不存在的基金，只重写有变化的分片。
+    codes 不为空时只检查这些基金所在的分片。CSV 目录不存在时不做检查。返回更新的基金数量。
+    """
+    if not os.path.isdir(csv_dir):
+        return 0
+    check_source(store_dir, csv_dir)
+    current = {}
+    for fund_code in csv_fund_codes(csv_dir):
+        current.setdefault(shard_of(fund_code), {})[fund_code] = source_stamp(fund_code, csv_dir)
+    wanted_shards = range(NUM_SHARDS) if codes is None else sorted({shard_of(c) for c in codes})
+
+    refreshed = 0
+    for shard in wanted_shards:
+        path = _shard_path(store_dir, shard)
+        expected = current.get(shard, {})
+        stored = {}
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as npz:
+                stored_codes = [str(c) for c in npz['codes']]
+                stored = _shard_stamps(npz, stored_codes)
+                stored.update({c: None for c in stored_codes if c not in stored})
+        stale = [c for c, stamp in expected.items() if stored.get(c, ()) != stamp]
+        removed = [c for c in stored if c not in expected]
+        if not stale and not removed:
+            continue
+
+        funds, stamps = _load_shard(path) if os.path.exists(path) else ({}, {})
+        for fund_code in removed:
+            funds.pop(fund_code, None)
+            stamps.pop(fund_code, None)
+        for fund_code in stale:
+            try:
+                funds[fund_code] = read_fund_csv(os.path.join(csv_dir, f"{fund_code}.csv"))
+                stamps[fund_code] = expected[fund_code]
+            except Exception as e:
+                logger.warning("读取基金 %s 的 CSV 失败，保留存储中的数据: %s", fund_code, e)
+        os.makedirs(store_dir, exist_ok=True)
+        _write_shard(path, funds, stamps, _source_tag(store_dir, csv_dir))
+        refreshed += len(stale) + len(removed)
+
+    if refreshed:
+        logger.info("列式存储已与 %s 同步: %d 只基金有变化", csv_dir, refreshed)
+    return refreshed
+
+
+def load_panel(store_dir=STORE_DIR, csv_dir=FUND_DATA_DIR, codes=None):
+    """
+    加载全市场净值面板。存储不存在时先从 CSV 重建；已有存储时先同步 CSV 中的变化 (见 sync_store)。
+    codes 不为空时只保留这些基金 (不在存储中的代码会被忽略)。
+    """
+    if not store_exists(store_dir):
+        logger.info("未找到列式存储 %s，从 %s 重建...", store_dir, csv_dir)
+        build_store(csv_dir, store_dir)
+    else:
+        sync_store(store_dir, csv_dir, codes)
+
+    wanted = set(codes) if codes is not None else None
+    fund_codes, lengths = [], []
+    parts = {col: [] for col in PANEL_COLUMNS}
+    for shard in range(NUM_SHARDS):
+        path = _shard_path(store_dir, shard)
+        if not os.path.exists(path):
+            continue
+        if wanted is not None and not any(shard_of(c) == shard for c in wanted):
+            continue
+        with np.load(path, allow_pickle=False) as npz:
+            shard_codes = [str(c) for c in npz['codes']]
+            offsets = npz['offsets']
+            columns = {col: npz[col] for col in PANEL_COLUMNS}
+        if wanted is None:
+            fund_codes.extend(shard_codes)
+            lengths.extend(np.diff(offsets).tolist())
+            for col in PANEL_COLUMNS:
+                parts[col].append(columns[col])
+            continue
+        for i, code in enumerate(shard_codes):
+            if code in wanted:
+                fund_codes.append(code)
+                lengths.append(int(offsets[i + 1] - offsets[i]))
+                for col in PANEL_COLUMNS:
+                    parts[col].append(columns[col][offsets[i]:offsets[i + 1]])
+
+    offsets = np.zeros(len(fund_codes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    columns = {
+        col: np.concatenate(parts[col]) if parts[col]
+        else np.array([], dtype='datetime64[D]' if col == 'date' else np.float64)
+        for col in PANEL_COLUMNS
+    }
+    return NavPanel(fund_codes, offsets, columns)
+
+
+def merge_arrays(new, old):
+    """合并两组列数组，同一日期以 new 为准"""
+    merged = pd.DataFrame({col: np.concatenate([new[col], old[col]]) for col in PANEL_COLUMNS})
+    return frame_to_arrays(merged)
+
+
+class NavStoreWriter:
+    """
+    线程安全的列式存储写入器。
+
+    put() 暂存某基金的完整历史，append() 只暂存新增行；
+    flush() 时按分片合并并原子写回，每个分片在一次抓取中最多重写一次。
+    写入方须先写好 CSV 再 flush()：分片中记录的是 flush() 时 CSV 的戳。
+    """
+
+    def __init__(self, store_dir=STORE_DIR, csv_dir=FUND_DATA_DIR):
+        self.store_dir = store_dir
+        self.csv_dir = csv_dir
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def put(self, fund_code, df):
+        """暂存某基金的完整历史 (任意顺序的 DataFrame)"""
+        arrays = frame_to_arrays(df)
+        with self._lock:
+            self._pending[fund_code] = ('replace', arrays)
+
+    def append(self, fund_code, df):
+        """暂存某基金的新增行，flush() 时与已有历史合并"""
+        arrays = frame_to_arrays(df)
+        with self._lock:
+            mode, pending = self._pending.get(fund_code, ('append', None))
+            if pending is not None:
+                arrays = merge_arrays(arrays, pending)
+            self._pending[fund_code] = (mode, arrays)
+
+    def flush(self):
+        """将暂存的更新写入磁盘，返回写入的基金数量"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # 首次写入时先从 CSV 建立完整存储，避免分片中只有本次更新的基金
+        if not store_exists(self.store_dir):
+            build_store(self.csv_dir, self.store_dir)
+        check_source(self.store_dir, self.csv_dir)
+
+        by_shard = {}
+        for fund_code, update in pending.items():
+            by_shard.setdefault(shard_of(fund_code), {})[fund_code] = update
+
+        for shard, updates in by_shard.items():
+            path = _shard_path(self.store_dir, shard)
+            funds, stamps = _load_shard(path) if os.path.exists(path) else ({}, {})
+            for fund_code, (mode, arrays) in updates.items():
+                stamp = source_stamp(fund_code, self.csv_dir)
+                if mode == 'append' and fund_code in funds:
+                    if fund_code in stamps:
+                        arrays = merge_arrays(arrays, funds[fund_code])
+                    elif stamp is not None:
+                        # 分片来自早期版本、无法确认与 CSV 一致：直接从已写好的 CSV 读取完整历史
+                        arrays = read_fund_csv(os.path.join(self.csv_dir, f"{fund_code}.csv"))
+                funds[fund_code] = arrays
+                stamps[fund_code] = stamp
+            _write_shard(path, funds, stamps, _source_tag(self.store_dir, self.csv_dir))
+
+        logger.info("列式存储已更新: %d 只基金，%d 个分片", len(pending), len(by_shard))
+        return len(pending)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='基金净值列式存储工具')
+    parser.add_argument('--rebuild', action='store_true', help='从 fund_data/*.csv 全量重建列式存储')
+    parser.add_argument('--compact', action='store_true', help='将 fund_data/journal/ 中的增量日志合并回主 CSV')
+    args = parser.parse_args()
+
+    if args.compact:
+        compact_all()
+    if args.rebuild or not store_exists():
+        build_store()
+    t0 = time.time()
+    panel = load_panel()
+    logger.info("加载 %d 只基金，共 %d 行，耗时 %.3f 秒",
+                len(panel), panel.total_rows, time.time() - t0)
@@ -0,0 +1,397 @@
+"""
+V5 组合回测 (Portfolio Backtest)
+
+py/ 下的回测脚本都是单只基金、各自一笔 INITIAL_CAPITAL 的孤立模拟；实盘则是每天从 V5 报告的
+I.1 组 (可试仓) 中挑选若干只基金，共用一笔资金。本模块在日期对齐的净值矩阵 (nav_matrix) 上
+按日重放全市场的 V5 排名，用单一现金池买卖：
+
+    信号      每个交易日收盘后，按 analyzer_V5 的规则 (阈值、四舍五入、分数与排序) 对全部基金
+              计算行动信号与退出信号；指标一次性向量化算出，每个值只用到当日及之前的净值
+    执行      次一交易日按当日净值成交 (基金当日无净值则顺延)：先卖后买
+    卖出      V5 退出提示 (RSI(14)>70 / MACD 死叉 / 近一月回撤>10%) 或相对成本止损/止盈；
+              持有不足 min_hold_days 个自然日的仓位暂不卖出 (C 类 7 天内赎回费)
+    买入      按 I.1 排名 (信号分数、近一月回撤降序) 依次买入未持有的基金，
+              单只不超过组合权益的 position_cap，持仓数不超过 max_positions
+
+指标按各基金自己的观测计数 (与逐只计算的窗口语义一致)，起始日前预留 WARMUP_ROWS 行预热；
+矩阵为 float32，四舍五入后的阈值比较与逐只计算偶有边界差异，可用 --verify 抽样核对。
+
+命令行：
+    python portfolio_backtest.py --start 2021-01-01 --end 2025-12-31 --max-positions 10
+    python portfolio_backtest.py --verify     # 抽样日期对照 analyzer_V5 的逐只计算
+"""
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import analyzer_V5
+import nav_matrix
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+START_DATE = '2021-01-01'
+END_DATE = '2025-12-31'
+WARMUP_ROWS = 400                # 起始日前用于指标预热的交易日行数 (MA250 + 50 日斜率窗口，并让 EWM 收敛)
+MIN_HISTORY = 60                 # 与 analyzer_V5 相同：不足 60 个净值的基金不参与排名
+LONG_HISTORY = 250               # 不足 250 个净值时 MA50/MA250 趋势为 "数据不足"
+TREND_WINDOW = 50                # MA50/MA250 比值拟合斜率的窗口
+RISK_FREE_RATE = 0.03
+TRADING_DAYS = 252
+
+DEFAULT_PARAMS = {
+    'initial_capital': 1000000.0,
+    'max_positions': 10,
+    'position_cap': 0.10,        # 单只基金占组合权益的上限
+    'min_trade_amount': 1000.0,
+    'stop_loss': 0.08,           # 相对持仓成本
+    'take_profit': 0.15,
+    'exit_on_signal': True,      # V5 退出提示触发卖出
+    'min_hold_days': 7,          # 自然日
+    'fee_rate': 0.0,             # 申购/赎回费率 (C 类为 0)
+}
+
+OUTPUT_EQUITY = 'portfolio_equity.csv'
+OUTPUT_POSITIONS = 'portfolio_positions.csv'
+OUTPUT_TRADES = 'portfolio_trades.csv'
+# ==========================================
+
+_S = analyzer_V5.SIGNAL_SCORES
+
+
+# ---------------- 观测坐标 ----------------
+def _observation_order(valid):
+    """
+    每列有效行在前 (保持日期顺序) 的行号排列。返回 (order, obs_valid)：
+    order[k, j] 为基金 j 第 k 个观测所在行，obs_valid[k, j] 表示该观测存在。
+    """
+    order = np.argsort(~valid, axis=0, kind='stable')
+    obs_valid = np.arange(len(valid))[:, None] < valid.sum(axis=0)
+    return order, obs_valid
+
+
+def _to_obs(values, order):
+    return np.take_along_axis(values, order, axis=0)
+
+
+def _to_dates(obs_values, order, obs_valid):
+    out = np.full(obs_values.shape, np.nan)
+    np.put_along_axis(out, order, np.where(obs_valid, obs_values, np.nan), axis=0)
+    return out
+
+
+def _run_length(flags):
+    """沿时间轴截至每一行末尾连续为 True 的行数"""
+    n = np.arange(1, len(flags) + 1)[:, None]
+    last_false = np.maximum.accumulate(np.where(flags, 0, n), axis=0)
+    return n - last_false
+
+
+def _month_max_drawdown(dates, values, valid):
+    """每个交易日的近一个月最大回撤 (窗口与 analyzer_V5 相同：日期 >= 当日 - 1 个月，不足 2 个净值为 0)"""
+    cutoff = (pd.DatetimeIndex(dates) - pd.DateOffset(months=1)).to_numpy().astype('datetime64[D]')
+    starts = np.searchsorted(dates, cutoff, side='left')
+    marked = np.where(valid, values, -np.inf)
+    mdd = np.zeros(values.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for t, a in enumerate(starts):
+            window, ok = marked[a:t + 1], valid[a:t + 1]
+            running_max = np.maximum.accumulate(window, axis=0)
+            drawdown = np.where(ok, (running_max - window) / running_max, -np.inf).max(axis=0)
+            mdd[t] = np.where(ok.sum(axis=0) >= 2, drawdown, 0.0)
+    return mdd
+
+
+# ---------------- 信号面板 ----------------
+def compute_signal_panel(dates, values, prior_counts=None):
+    """
+    对 交易日 × 基金 的净值数组计算每日 V5 信号 (缺失为 NaN)，返回 {名称: 同形状数组}：
+        eligible      当日有净值且历史观测 >= MIN_HISTORY
+        score         行动提示的信号分数 (analyzer_V5.SIGNAL_SCORES)
+        mdd           近一个月最大回撤
+        buyable       I.1 组 (回撤达标、趋势健康、分数达标且未触发止损否决)
+        exit          退出提示非 "持有"
+    prior_counts 为数组首行之前各基金已有的观测数 (用于历史长度门槛)。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    order, obs_valid = _observation_order(valid)
+    obs = pd.DataFrame(_to_obs(values, order))
+
+    # RSI(14)/RSI(6)：span-EWM，与 analyzer_V5.calculate_technical_indicators 相同
+    delta = obs.diff()
+    gain, loss = delta.where(delta > 0, 0), -delta.where(delta < 0, 0)
+    rsi = {}
+    for window in (14, 6):
+        avg_gain = gain.ewm(span=window, adjust=False, min_periods=1).mean()
+        avg_loss = loss.ewm(span=window, adjust=False, min_periods=1).mean()
+        rsi[window] = (100 - (100 / (1 + avg_gain / avg_loss.replace(0, 1e-10)))).to_numpy()
+
+    macd = obs.ewm(span=12, adjust=False).mean() - obs.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+    macd, signal = macd.to_numpy(), signal.to_numpy()
+    macd_prev, signal_prev = np.roll(macd, 1, axis=0), np.roll(signal, 1, axis=0)
+    macd_prev[0] = signal_prev[0] = np.nan
+    has_prev = ~np.isnan(macd_prev) & ~np.isnan(signal_prev)
+    weak_golden = has_prev & (macd > signal) & (macd_prev <= signal_prev) & ~(macd > 0)
+    dead_cross = has_prev & (macd < signal) & (macd_prev >= signal_prev)
+
+    # MA50/MA250 比值 (保留 2 位小数) 与近 50 个比值的最小二乘斜率
+    ratio = (obs.rolling(50, min_periods=1).mean() / obs.rolling(250, min_periods=1).mean()).to_numpy()
+    x = np.arange(TREND_WINDOW, dtype=np.float64) - (TREND_WINDOW - 1) / 2
+    k = np.arange(len(obs), dtype=np.float64)[:, None]
+    ratio_df = pd.DataFrame(ratio)
+    sum_y = ratio_df.rolling(TREND_WINDOW).sum().to_numpy()
+    sum_ky = (ratio_df * k).rolling(TREND_WINDOW).sum().to_numpy()
+    slope = (sum_ky - (k - (TREND_WINDOW - 1) / 2) * sum_y) / (x * x).sum()
+
+    # 布林带 (20)：只需判断是否位于下轨下方/下轨附近
+    mid, std = obs.rolling(20).mean().to_numpy(), obs.rolling(20).std().to_numpy()
+    value = obs.to_numpy()
+    upper, lower = mid + 2 * std, mid - 2 * std
+    band = upper - lower
+    with np.errstate(invalid='ignore', divide='ignore'):
+        near_lower = (value < upper) & (band > 1e-6) & ((value - lower) / band < 0.2)
+    boll_low = ~(std <= analyzer_V5.BOLL_FLAT_STD) & ~np.isnan(lower) & ((value <= lower) | near_lower)
+
+    prev_value = np.roll(value, 1, axis=0)
+    prev_value[0] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily_drop = np.where(prev_value > 0, (value - prev_value) / prev_value, 0.0)
+    recent_drops = np.minimum(_run_length(np.diff(value, axis=0, prepend=np.nan) < 0), 9)
+
+    # 回到日期坐标
+    def back(a):
+        return _to_dates(np.asarray(a, dtype=np.float64), order, obs_valid)
+
+    length = np.cumsum(valid, axis=0) + (0 if prior_counts is None else np.asarray(prior_counts)[None, :])
+    long_history = length >= LONG_HISTORY
+    rsi14, rsi6 = np.round(back(rsi[14]), 2), np.round(back(rsi[6]), 2)
+    ma_ratio = np.where(long_history, np.round(back(ratio), 2), np.nan)
+    trend_down = long_history & (back(slope) < -analyzer_V5.TREND_SLOPE_THRESHOLD)
+    drop = np.round(back(daily_drop), 4)
+    weak_golden, dead_cross, boll_low = back(weak_golden) == 1, back(dead_cross) == 1, back(boll_low) == 1
+    recent_drops = back(recent_drops)
+    mdd = _month_max_drawdown(dates, values, valid)
+
+    # analyzer_V5.generate_v5_action_signal 的分数 (取命中关键词的最高分)
+    grid = rsi14 <= analyzer_V5.EXTREME_RSI_THRESHOLD_P1
+    resonance = grid & (rsi6 <= analyzer_V5.SHORT_TERM_RSI_EXTREME)
+    panic = grid & ~resonance & (drop <= -analyzer_V5.MIN_DAILY_DROP_PERCENT)
+    month_ok = mdd >= analyzer_V5.MIN_MONTH_DRAWDOWN
+    streak = month_ok & (recent_drops >= 5) & ~grid
+    low_band = month_ok & boll_low
+    warn = month_ok & ~low_band & (mdd >= analyzer_V5.HIGH_ELASTICITY_MIN_DRAWDOWN)
+    watch = month_ok & ~low_band & ~warn & ~grid & ~streak
+    score = np.zeros(values.shape)
+    for hit, key in ((watch, '【震荡-关注】'), (warn, '🔥【震荡-预警】'), (weak_golden, '🛡️【防御-反弹】'),
+                     (streak, '✨【震荡-连跌】'), (low_band, '🎯【震荡-高吸】'),
+                     (grid & ~resonance & ~panic, '🌟【网格级】RSI极值'), (panic, '💥【网格级】RSI极值'),
+                     (resonance, '💥【网格级】RSI极值共振')):
+        score = np.where(hit, np.maximum(score, _S[key]), score)
+
+    eligible = valid & (length >= MIN_HISTORY)
+    # generate_report：趋势向下或 MA50/MA250 低于健康度阈值 → 趋势不健康；回撤 > 10% → 止损否决
+    trend_ok = ~trend_down & ~(ma_ratio < analyzer_V5.TREND_HEALTH_THRESHOLD)
+    buyable = eligible & month_ok & trend_ok & (score >= analyzer_V5.MIN_BUY_SIGNAL_SCORE) & ~(mdd > 0.10)
+    exit_signal = eligible & ((rsi14 > 70.0) | dead_cross | (mdd > 0.10))
+    return {'eligible': eligible, 'score': score, 'mdd': mdd, 'buyable': buyable, 'exit': exit_signal,
+            'rsi_14': rsi14, 'ma_ratio': ma_ratio}
+
+
+def rank_buyable(panel, t):
+    """第 t 行 I.1 组的列号，按 analyzer_V5 报告顺序 (信号分数、近一月回撤降序) 排列"""
+    cols = np.flatnonzero(panel['buyable'][t])
+    keys = (-panel['mdd'][t, cols], -panel['score'][t, cols])
+    return cols[np.lexsort(keys)]
+
+
+# ---------------- 组合模拟 ----------------
+def simulate(dates, values, panel, codes, params=None, start_row=0):
+    """
+    从 start_row 起逐日模拟共享现金池的组合。第 t 行的信号在第 t+1 行成交。
+    返回 {'equity': DataFrame (权益/现金/持仓数), 'positions': DataFrame (各基金市值), 'trades': DataFrame}。
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    prices = pd.DataFrame(values).ffill().to_numpy()
+    n = len(dates)
+
+    cash = p['initial_capital']
+    holdings = {}                # 列号 -> [份额, 成本, 买入行]
+    equity_rows, position_rows, trades = [], [], []
+    hold_days = np.timedelta64(p['min_hold_days'], 'D')
+
+    for t in range(start_row, n):
+        if t > start_row:
+            s = t - 1
+            # 1) 卖出：前一交易日的退出信号或止损/止盈，今日有净值才成交
+            for j in list(holdings):
+                units, cost, entry = holdings[j]
+                if not valid[t, j] or dates[t] - dates[entry] < hold_days:
+                    continue
+                change = prices[s, j] * units / cost - 1
+                reason = None
+                if change <= -p['stop_loss']:
+                    reason = '止损'
+                elif change >= p['take_profit']:
+                    reason = '止盈'
+                elif p['exit_on_signal'] and panel['exit'][s, j]:
+                    reason = 'V5退出提示'
+                if reason:
+                    amount = units * values[t, j] * (1 - p['fee_rate'])
+                    cash += amount
+                    del holdings[j]
+                    trades.append((dates[t], codes[j], '卖出', units, values[t, j], amount, amount - cost, reason))
+
+            # 2) 买入：前一交易日的 I.1 排名
+            slots = p['max_positions'] - len(holdings)
+            if slots > 0:
+                equity = cash + sum(units * prices[t, j] for j, (units, _, _) in holdings.items())
+                for j in rank_buyable(panel, s):
+                    if slots <= 0:
+                        break
+                    if j in holdings or not valid[t, j]:
+                        continue
+                    amount = min(equity * p['position_cap'], cash)
+                    if amount < p['min_trade_amount']:
+                        break
+                    units = amount * (1 - p['fee_rate']) / values[t, j]
+                    cash -= amount
+                    holdings[j] = [units, amount, t]
+                    slots -= 1
+                    trades.append((dates[t], codes[j], '买入', units, values[t, j], amount, 0.0,
+                                   f"I.1 信号分数 {panel['score'][s, j]:.1f}"))
+
+        # 3) 收盘估值
+        market_values = {j: units * prices[t, j] for j, (units, _, _) in holdings.items()}
+        invested = sum(market_values.values())
+        equity_rows.append((dates[t], cash + invested, cash, len(holdings)))
+        position_rows.extend((dates[t], codes[j], v) for j, v in market_values.items())
+
+    equity = pd.DataFrame(equity_rows, columns=['date', 'equity', 'cash', 'positions']).set_index('date')
+    equity.index = pd.to_datetime(equity.index)
+    positions = pd.DataFrame(position_rows, columns=['date', 'fund_code', 'value'])
+    positions = positions.pivot(index='date', columns='fund_code', values='value').reindex(equity.index).fillna(0.0)
+    trades = pd.DataFrame(trades, columns=['date', 'fund_code', 'action', 'units', 'nav', 'amount', 'pnl', 'reason'])
+    return {'equity': equity, 'positions': positions, 'trades': trades}
+
+
+def performance_metrics(equity, trades, risk_free_rate=RISK_FREE_RATE):
+    """组合绩效：累计/年化收益、年化波动、夏普、最大回撤、年化换手率"""
+    curve = equity['equity']
+    if len(curve) < 2:
+        return {}
+    years = (curve.index[-1] - curve.index[0]).days / 365.25
+    total_return = curve.iloc[-1] / curve.iloc[0] - 1
+    annual_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else 0.0
+    daily = curve.pct_change().dropna()
+    volatility = daily.std() * np.sqrt(TRADING_DAYS)
+    sharpe = (annual_return - risk_free_rate) / volatility if volatility > 0 else np.nan
+    max_drawdown = (1 - curve / curve.cummax()).max()
+    # 换手率：买卖金额的一半 / 平均权益，按年化
+    traded = trades['amount'].sum() if not trades.empty else 0.0
+    turnover = traded / 2 / curve.mean() / years if years > 0 else np.nan
+    return {
+        '累计收益率 (%)': round(total_return * 100, 2),
+        '年化收益率 (%)': round(annual_return * 100, 2),
+        '年化波动率 (%)': round(volatility * 100, 2),
+        '夏普比率': round(sharpe, 2),
+        '最大回撤 (%)': round(max_drawdown * 100, 2),
+        '年化换手率 (%)': round(turnover * 100, 2),
+        '交易次数': len(trades),
+        '平均持仓数': round(equity['positions'].mean(), 2),
+    }
+
+
+def load_window(matrix, start, end, warmup_rows=WARMUP_ROWS):
+    """取 [start - warmup_rows 行, end] 的净值 (float64)，返回 (dates, values, prior_counts, start_row)"""
+    rows = matrix.row_slice(start, end)
+    lo = max(0, rows.start - warmup_rows)
+    prior_counts = np.asarray(matrix.mask[:lo]).sum(axis=0)
+    values = np.asarray(matrix.net_value[lo:rows.stop], dtype=np.float64)
+    return np.asarray(matrix.dates[lo:rows.stop]), values, prior_counts, rows.start - lo
+
+
+def run_portfolio(start=START_DATE, end=END_DATE, params=None, matrix=None):
+    """在全市场上运行组合回测，返回 simulate 的结果并附带 'metrics'"""
+    matrix = matrix or nav_matrix.open_matrix()
+    t0 = time.time()
+    dates, values, prior_counts, start_row = load_window(matrix, start, end)
+    panel = compute_signal_panel(dates, values, prior_counts)
+    t1 = time.time()
+    result = simulate(dates, values, panel, matrix.codes, params, start_row)
+    result['metrics'] = performance_metrics(result['equity'], result['trades'])
+    logger.info("组合回测 %s ~ %s: %d 个交易日 × %d 只基金，信号 %.2f 秒，模拟 %.2f 秒",
+                start, end, len(dates) - start_row, values.shape[1], t1 - t0, time.time() - t1)
+    return result
+
+
+def main_verify(n_dates=3, n_funds=200, seed=0, start=START_DATE, end=END_DATE):
+    """
+    抽样若干交易日与基金：用截至当日的完整历史调用 analyzer_V5.analyze_fund_frame，
+    与向量化面板比较信号分数、I.1 归属与退出提示，返回不一致的 (日期, 基金, 字段, 逐只值, 面板值) 列表。
+    """
+    matrix = nav_matrix.open_matrix()
+    dates, values, prior_counts, start_row = load_window(matrix, start, end)
+    panel = compute_signal_panel(dates, values, prior_counts)
+    offset = matrix.row_slice(start, end).stop - len(dates)    # 窗口首行在矩阵中的行号
+    rng = np.random.default_rng(seed)
+    mismatches, checked = [], 0
+    for t in sorted(rng.choice(np.arange(start_row, len(dates)), size=min(n_dates, len(dates) - start_row), replace=False)):
+        cols = np.flatnonzero(panel['eligible'][t])
+        for j in rng.choice(cols, size=min(n_funds, len(cols)), replace=False):
+            history = np.asarray(matrix.net_value[:offset + t + 1, j], dtype=np.float64)
+            keep = ~np.isnan(history)
+            df = pd.DataFrame({'date': pd.to_datetime(matrix.dates[:offset + t + 1][keep]), 'value': history[keep]})
+            row = analyzer_V5.analyze_fund_frame(df, matrix.codes[j])
+            if row is None:
+                continue
+            checked += 1
+            df_row = pd.DataFrame([row])
+            df_row['signal_score'] = df_row['行动提示'].apply(analyzer_V5.signal_score)
+            expected = {
+                'score': float(df_row['signal_score'].iloc[0]),
+                'buyable': bool(row['最大回撤'] >= analyzer_V5.MIN_MONTH_DRAWDOWN
+                                and not (row['MA50/MA250趋势'] == '向下' or row['MA50/MA250'] < analyzer_V5.TREND_HEALTH_THRESHOLD)
+                                and df_row['signal_score'].iloc[0] >= analyzer_V5.MIN_BUY_SIGNAL_SCORE
+                                and not row['最大回撤'] > 0.10),
+                'exit': row['退出提示'] != '持有',
+            }
+            for key, value in expected.items():
+                actual = panel[key][t, j]
+                if (abs(actual - value) > 1e-9) if key == 'score' else (bool(actual) != value):
+                    mismatches.append((str(dates[t]), matrix.codes[j], key, value, actual))
+    logger.info("抽样核对 %d 个 (日期, 基金)，不一致 %d 个", checked, len(mismatches))
+    for m in mismatches[:20]:
+        logger.warning("不一致: %s", m)
+    return mismatches
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='V5 组合回测 (共享现金池)')
+    parser.add_argument('--start', default=START_DATE)
+    parser.add_argument('--end', default=END_DATE)
+    parser.add_argument('--capital', type=float, default=DEFAULT_PARAMS['initial_capital'])
+    parser.add_argument('--max-positions', type=int, default=DEFAULT_PARAMS['max_positions'])
+    parser.add_argument('--position-cap', type=float, default=DEFAULT_PARAMS['position_cap'])
+    parser.add_argument('--verify', action='store_true', help='抽样对照 analyzer_V5 的逐只计算')
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(1 if main_verify(start=args.start, end=args.end) else 0)
+    result = run_portfolio(args.start, args.end, {
+        'initial_capital': args.capital, 'max_positions': args.max_positions, 'position_cap': args.position_cap,
+    })
+    result['equity'].to_csv(OUTPUT_EQUITY, encoding='utf-8')
+    result['positions'].to_csv(OUTPUT_POSITIONS, encoding='utf-8')
+    result['trades'].to_csv(OUTPUT_TRADES, index=False, encoding='utf-8')
+    for key, value in result['metrics'].items():
+        print(f"{key}: {value}")
+    print(f"结果已写入 {OUTPUT_EQUITY} / {OUTPUT_POSITIONS} / {OUTPUT_TRADES}")
@@ -6,8 +6,14 @@ import os
 import numpy as np
 import logging
 import math
+import sys
 from datetime import datetime
 
+# 共享模块 (backtest_kernel 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backtest_kernel
+import fund_loader
+
 # --- 配置参数 (基于原脚本进行回测优化) ---
 FUND_DATA_DIR = 'fund_data'
 EXTREME_RSI_THRESHOLD_P1 = 29.0  # 买入信号 RSI 阈值
@@ -19,6 +25,14 @@ INITIAL_CAPITAL = 100000.0       # 初始资金 (元)
 BUY_AMOUNT_PER_TRADE = 10000.0   # 每次买入金额 (元)
 REPORT_FILE_NAME = 'fund_backtest_report.md'
 
+# 回测内核参数集 (backtest_kernel)
+RSI_PARAMS = {
+    'initial_capital': INITIAL_CAPITAL,
+    'buy_amount': BUY_AMOUNT_PER_TRADE,
+    'stop_loss': STOP_LOSS_PERCENT,
+    'take_profit': STOP_PROFIT_PERCENT,
+}
+
 # --- 复用原脚本的技术指标计算函数 (简化版，仅保留必要逻辑) ---
 # 警告: 实际回测中，这些函数应从 analyzer.py 中导入。这里为独立脚本演示，直接复制关键函数。
 
@@ -72,82 +86,19 @@ def run_backtest(df_fund, fund_code):
     df = df.dropna(subset=['RSI_14']).reset_index(drop=True)
     if df.empty: return None
 
-    # 3. 初始化回测变量
+    # 3. 买入条件：RSI 超卖 (一次性买入，卖出后才能再次买入)；止盈/止损由回测内核判断
     initial_capital = INITIAL_CAPITAL
-    cash = initial_capital
-    shares = 0.0        # 持有份额
-    avg_cost_per_share = 0.0 # 平均持仓成本（每份额）
+    values = df['value'].to_numpy(dtype=np.float64)
+    buy_signal = df['RSI_14'].to_numpy(dtype=np.float64) <= EXTREME_RSI_THRESHOLD_P1
+    result = backtest_kernel.run(values, entry=buy_signal, params=RSI_PARAMS)
     
-    trade_log = []
-    equity_values = []
-    
-    # 4. 逐日回测
-    for index, row in df.iterrows():
-        current_date = row['date']
-        current_value = row['value']
-        current_rsi = row['RSI_14']
-        
-        # 计算当前总资产 (净值 * 份额 + 现金)
-        market_value = shares * current_value
-        total_equity = cash + market_value
-        equity_values.append(total_equity)
-
-        # --- 卖出判断 (止盈/止损) ---
-        if shares > 0:
-            # 当前持仓成本
-            current_holding_cost = shares * avg_cost_per_share
-            # 当前收益率: (现值 - 成本) / 成本
-            current_profit_ratio = (market_value - current_holding_cost) / current_holding_cost
-            
-            # 止损信号: 跌幅 >= 8% (STOP_LOSS_PERCENT)
-            if current_profit_ratio <= -STOP_LOSS_PERCENT:
-                sale_amount = market_value
-                cash += sale_amount
-                trade_log.append({
-                    'Date': current_date, 'Action': 'SELL (Stop Loss)', 
-                    'Shares': shares, 'Value': current_value,
-                    'Gain_Ratio': current_profit_ratio, 'Equity': total_equity
-                })
-                shares = 0.0
-                avg_cost_per_share = 0.0
-                continue # 完成交易，跳过当日买入判断
-
-            # 止盈信号: 涨幅 >= 15% (STOP_PROFIT_PERCENT)
-            if current_profit_ratio >= STOP_PROFIT_PERCENT:
-                sale_amount = market_value
-                cash += sale_amount
-                trade_log.append({
-                    'Date': current_date, 'Action': 'SELL (Take Profit)', 
-                    'Shares': shares, 'Value': current_value,
-                    'Gain_Ratio': current_profit_ratio, 'Equity': total_equity
-                })
-                shares = 0.0
-                avg_cost_per_share = 0.0
-                continue # 完成交易，跳过当日买入判断
-        
-        # --- 买入判断 (RSI极值) ---
-        # 条件：RSI 超卖 AND 仍有现金 AND 当前没有持仓 (简化：一次性买入，卖出后才能再次买入)
-        if current_rsi <= EXTREME_RSI_THRESHOLD_P1 and cash >= BUY_AMOUNT_PER_TRADE and shares == 0:
-            buy_shares = BUY_AMOUNT_PER_TRADE / current_value
-            
-            # 更新成本和份额
-            total_buy_cost = shares * avg_cost_per_share + BUY_AMOUNT_PER_TRADE
-            shares += buy_shares
-            avg_cost_per_share = total_buy_cost / shares
-            cash -= BUY_AMOUNT_PER_TRADE
-            
-            trade_log.append({
-                'Date': current_date, 'Action': 'BUY', 
-                'Shares': buy_shares, 'Value': current_value,
-                'RSI': current_rsi, 'Equity': total_equity
-            })
-
     # --- 最终结算 ---
     # 如果回测结束时仍有持仓，则以最后一日净值清仓
-    final_equity = cash + shares * df['value'].iloc[-1]
+    final_equity = result['cash'] + result['units'] * values[-1]
+    equity_values = result['equity']
     equity_values[-1] = final_equity # 修正最后一天的总资产
     
-    # 5. 性能指标计算
+    # 4. 性能指标计算
     df_equity = pd.Series(equity_values, index=df['date'])
     df_equity = df_equity.replace(0, np.nan).dropna() # 避免初始0值影响计算
     
@@ -172,7 +123,8 @@ def run_backtest(df_fund, fund_code):
         '最大回撤': round(max_drawdown, 4),
         '年化收益率': round(annual_return, 4),
         '夏普比率': round(sharpe_ratio, 2),
-        '交易次数': len([t for t in trade_log if t['Action'] != 'BUY']) # 只统计卖出次数
+        '交易次数': backtest_kernel.count_actions(result['trades'], backtest_kernel.ACTION_STOP_LOSS,
+                                               backtest_kernel.ACTION_TAKE_PROFIT) # 只统计卖出次数
     }
 
 # --- 数据加载与主控函数 ---
@@ -180,9 +132,8 @@ def run_backtest(df_fund, fund_code):
 def load_fund_data(filepath, fund_code):
     """ 加载和清洗数据 (与 analyzer.py 逻辑相似) """
     try:
-        df = pd.read_csv(filepath, encoding='utf-8')
-    except UnicodeDecodeError:
-        df = pd.read_csv(filepath, encoding='gbk')
+        # 编码探测、列名统一与增量日志合并由共享读取模块完成
+        df = fund_loader.load_fund_frame(filepath)
     except Exception as e:
         logging.error(f"加载基金 {filepath} 失败: {e}")
         return None
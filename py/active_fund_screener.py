@@ -5,12 +5,17 @@ import numpy as np
 import akshare as ak
 import matplotlib.pyplot as plt
 import os
+import sys
 import time
 from datetime import datetime
 import pickle
 import warnings
 warnings.filterwarnings("ignore")
 
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
+
 # ==================== 配置区（直接编码阈值）===================
 THRESHOLDS = {
     'min_tenure': 5,                # 经理任职年限 ≥ 5年
@@ -247,6 +252,7 @@ def export_and_plot(df):
 
 # ==================== 主程序（保持不变） ====================
 def main():
+    http_cache.install()    # akshare 内部经 requests 发出的请求也走响应缓存 (HTTP_CACHE_MODE=replay 可离线重跑)
     print("启动 主动型基金筛选系统 v4.0（GitHub Actions 版）")
     print("正在读取 C类.txt 中的基金代码...")
     try:
@@ -3,12 +3,17 @@ import numpy as np
 import os
 import re
 import random
-import time
 import requests
 import concurrent.futures
 from bs4 import BeautifulSoup
 from datetime import datetime
 import warnings
+import sys
+
+# 共享模块 (nav_matrix 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
+import nav_matrix
 
 # 忽略 SettingWithCopyWarning
 warnings.filterwarnings('ignore', category=pd.errors.SettingWithCopyWarning)
@@ -96,12 +101,10 @@ def fetch_fund_info(fund_code, max_retries=MAX_RETRIES):
     
     for attempt in range(max_retries):
         headers = {'User-Agent': random.choice(USER_AGENTS)}
-        sleep_time = random.uniform(2.0, 4.0) 
-        time.sleep(sleep_time)
         
         try:
-            print(f"[{fund_code}] Fetching... (Attempt {attempt + 1}/{max_retries}, Sleep {sleep_time:.2f}s)")
-            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            print(f"[{fund_code}] Fetching... (Attempt {attempt + 1}/{max_retries})")
+            response = http_cache.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, 'html.parser')
 
@@ -189,42 +192,19 @@ def main():
         print(f"Error: Directory '{DATA_DIR}' not found.")
         return
 
-    files = [f for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
-    if not files:
-        print(f"Error: No CSV files in '{DATA_DIR}'.")
-        return
-
-    # 阶段 1: 确定共同期
+    # 阶段 1: 确定共同期 (基于日期对齐的净值矩阵，无需逐个解析 CSV)
     print("--- Phase 1/3: Determining Common Period ---")
-    earliest_start = pd.to_datetime('1900-01-01')
-    latest_end = pd.to_datetime('2200-01-01')
-
-    all_data_frames = {} 
-    
-    for f in files:
-        path = os.path.join(DATA_DIR, f)
-        code = f.replace('.csv', '')
-        try:
-            df = pd.read_csv(path, encoding='utf-8')
-        except UnicodeDecodeError:
-            df = pd.read_csv(path, encoding='gbk')
-
-        df.columns = df.columns.str.strip().str.lower()
-        date_col = next((c for c in df.columns if '日期' in c or 'date' in c), None)
-        nav_col = next((c for c in df.columns if '累计净值' in c or 'cumulative_net_value' in c), None)
-
-        if date_col and nav_col:
-            df = df.rename(columns={nav_col: 'cumulative_net_value', date_col: 'date'})
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.dropna(subset=['date', 'cumulative_net_value'])
-            
-            if not df.empty:
-                earliest_start = max(earliest_start, df['date'].min())
-                latest_end = min(latest_end, df['date'].max())
-                all_data_frames[code] = df
-        else:
-            print(f"Warning: Missing date or NAV column in {f}. Skipping.")
+    # 派生的列式存储与矩阵须与 DATA_DIR 对应，否则会分析默认 fund_data/ 的旧数据
+    store_dir, matrix_dir = nav_matrix.derived_dirs(DATA_DIR)
+    matrix = nav_matrix.open_matrix(matrix_dir=matrix_dir, store_dir=store_dir, csv_dir=DATA_DIR)
+    if not matrix.codes:
+        print(f"Error: No fund data in '{DATA_DIR}'.")
+        return
 
+    first, last = matrix.valid_range('cumulative_net_value')
+    has_data = first >= 0
+    earliest_start = pd.Timestamp(matrix.dates[first[has_data].max()])
+    latest_end = pd.Timestamp(matrix.dates[last[has_data].min()])
 
     if latest_end <= earliest_start:
         print("Error: No valid common period.")
@@ -232,12 +212,18 @@ def main():
 
     print(f"Common Period: {earliest_start.strftime('%Y-%m-%d')} to {latest_end.strftime('%Y-%m-%d')}")
 
-    # 阶段 2: 计算指标
+    # 阶段 2: 计算指标 (只切取共同期内的行，每只基金取矩阵中的一列)
     print("\n--- Phase 2/3: Calculating Metrics ---")
     results = []
     codes_to_fetch = []
 
-    for code, df in all_data_frames.items():
+    dates, nav_window, _ = matrix.window('cumulative_net_value', earliest_start, latest_end)
+    for j, code in enumerate(matrix.codes):
+        if not has_data[j]:
+            continue
+        nav = nav_window[:, j]
+        valid = ~np.isnan(nav)
+        df = pd.DataFrame({'date': dates[valid], 'cumulative_net_value': nav[valid].astype(np.float64)})
         metrics = calculate_metrics(df, earliest_start, latest_end)
         if metrics:
             results.append({
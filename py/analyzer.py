@@ -6,6 +6,11 @@ from datetime import datetime
 import pytz
 import logging
 import math
+import sys
+
+# 共享模块 (fund_loader 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
 
 # --- V5.0 策略所需配置参数 ---
 FUND_DATA_DIR = 'fund_data'
@@ -312,15 +317,8 @@ def analyze_single_fund(filepath):
     df = pd.DataFrame()
 
     try:
-        # 尝试使用 UTF-8
-        df = pd.read_csv(filepath)
-    except UnicodeDecodeError:
-        try:
-            # 尝试使用 GBK
-            df = pd.read_csv(filepath, encoding='gbk')
-        except Exception as e:
-            logging.error(f"分析基金 {filepath} 时发生编码或加载错误: {e}")
-            return None
+        # 编码探测 (UTF-8/GBK)、列名统一与增量日志合并由共享读取模块完成
+        df = fund_loader.load_fund_frame(filepath)
     except Exception as e:
         logging.error(f"分析基金 {filepath} 时发生加载错误: {e}")
         return None
@@ -6,6 +6,11 @@ from datetime import datetime
 import pytz
 import logging
 import math
+import sys
+
+# 共享模块 (fund_loader 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
 
 # --- V5.0 策略所需配置参数 ---
 FUND_DATA_DIR = 'fund_data'
@@ -344,11 +349,8 @@ def analyze_single_fund(filepath):
     df = pd.DataFrame()
 
     try:
-        # 尝试使用 UTF-8, 失败后尝试 GBK
-        try:
-            df = pd.read_csv(filepath)
-        except UnicodeDecodeError:
-            df = pd.read_csv(filepath, encoding='gbk')
+        # 编码探测 (UTF-8/GBK)、列名统一与增量日志合并由共享读取模块完成
+        df = fund_loader.load_fund_frame(filepath)
         
         if 'date' not in df.columns or 'net_value' not in df.columns:
             if 'Date' in df.columns and 'NetValue' in df.columns:
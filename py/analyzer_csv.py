@@ -6,6 +6,13 @@ from datetime import datetime
 import pytz
 import logging
 import math
+import sys
+
+# 共享模块 (nav_store 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
+import nav_store
+import signal_store
 
 # --- 配置参数 (完整保留) ---
 FUND_DATA_DIR = 'fund_data'
@@ -17,6 +24,7 @@ REPORT_BASE_NAME = 'fund_warning_report'
 
 # 【新增/修改】CSV 文件名改为固定名称
 CSV_FINAL_NAME = 'fund_warning_report_combined.csv'
+SIGNAL_STRATEGY = 'analyzer_csv' # 每日信号快照在 signal_store/ 中的策略名
 
 # --- 核心阈值调整 (完整保留) --
 EXTREME_RSI_THRESHOLD_P1 = 29.0 
@@ -273,22 +281,17 @@ def analyze_single_fund(filepath):
     分析单只基金
     """
     fund_code = os.path.splitext(os.path.basename(filepath))[0]
-    df = pd.DataFrame()
-
     try:
-        # 尝试默认 UTF-8 编码加载
-        df = pd.read_csv(filepath)
-    except UnicodeDecodeError:
-        try:
-            # 尝试 GBK 编码（解决中文环境乱码问题）
-            df = pd.read_csv(filepath, encoding='gbk')
-        except Exception as e:
-            logging.error(f"分析基金 {filepath} 时发生编码或加载错误: {e}")
-            return None
+        # 编码探测与固定类型解析由共享读取模块完成，只读取分析用到的列
+        df = fund_loader.load_fund_frame(filepath, ['date', 'net_value'])
     except Exception as e:
          logging.error(f"分析基金 {filepath} 时发生加载错误: {e}")
          return None
 
+    return analyze_fund_frame(df, fund_code)
+
+def analyze_fund_frame(df, fund_code):
+    """分析单只基金的净值 DataFrame (CSV 与列式存储共用)"""
     try:
         # 检查关键列是否存在，非净值文件将直接跳过
         if 'date' not in df.columns or 'net_value' not in df.columns:
@@ -336,34 +339,28 @@ def analyze_single_fund(filepath):
         return None
     except Exception as e:
         # 捕获后续处理中的其他错误 (如计算错误)
-        logging.error(f"分析基金 {filepath} 时发生数据处理错误: {e}")
+        logging.error(f"分析基金 {fund_code} 时发生数据处理错误: {e}")
         return None
 
 # --- 所有基金分析 (函数配置 9/13) ---
 def analyze_all_funds(target_codes=None):
-    """分析所有基金数据"""
+    """分析所有基金数据 (从列式存储一次性加载)"""
     try:
-        if target_codes:
-            # 目标代码模式：从 FUND_DATA_DIR 中查找特定文件
-            csv_files = [os.path.join(FUND_DATA_DIR, f'{code}.csv') for code in target_codes if os.path.exists(os.path.join(FUND_DATA_DIR, f'{code}.csv'))]
-        else:
-            # 明确指定查找 FUND_DATA_DIR 目录下的所有 CSV 文件
-            csv_files = glob.glob(os.path.join(FUND_DATA_DIR, '*.csv'))
-        
-        if not csv_files:
-            logging.warning(f"在目录 '{FUND_DATA_DIR}' 中未找到CSV文件")
-            # 如果 FUND_DATA_DIR 不存在，则尝试在当前目录查找，兼容之前运行环境
-            if FUND_DATA_DIR and not os.path.exists(FUND_DATA_DIR):
-                logging.warning(f"目录 '{FUND_DATA_DIR}' 不存在，尝试在当前目录查找...")
-                csv_files = glob.glob('*.csv')
-        
-        if not csv_files:
-             return []
+        if not os.path.isdir(FUND_DATA_DIR) and not nav_store.store_exists():
+            logging.warning(f"目录 '{FUND_DATA_DIR}' 不存在，尝试在当前目录查找...")
+            csv_files = glob.glob('*.csv')
+            results = [analyze_single_fund(f) for f in csv_files]
+            return [r for r in results if r is not None]
+
+        panel = nav_store.load_panel(csv_dir=FUND_DATA_DIR, codes=target_codes or None)
+        if not len(panel):
+            logging.warning(f"在目录 '{FUND_DATA_DIR}' 中未找到基金数据")
+            return []
             
-        logging.info(f"找到 {len(csv_files)} 个基金数据文件，开始分析...")
+        logging.info(f"找到 {len(panel)} 只基金数据，开始分析...")
         qualifying_funds = []
-        for filepath in csv_files:
-            result = analyze_single_fund(filepath)
+        for fund_code in panel.codes:
+            result = analyze_fund_frame(panel.frame(fund_code, ['date', 'net_value']), fund_code)
             if result is not None:
                 qualifying_funds.append(result)
         
@@ -728,6 +725,23 @@ def generate_report_csv(results, current_date_str):
 
 
 # --- 主函数 (函数配置 13/13) (大幅修改 CSV 处理逻辑) ---
+def _import_legacy_csv(report_file_csv, month_start, current_date_str):
+    """本月分区为空时，把旧版月度汇总 CSV 按 '日期' 列一次性导入信号快照 (当日数据由本次运行写入)"""
+    if signal_store.list_dates(SIGNAL_STRATEGY, month_start, current_date_str) or not os.path.exists(report_file_csv):
+        return
+    try:
+        df_historical = pd.read_csv(report_file_csv, dtype={'基金代码': str}, encoding='utf-8')
+    except Exception as e:
+        logging.error(f"读取历史 CSV 文件时发生错误: {e}")
+        return
+    if '日期' not in df_historical.columns:
+        logging.warning("历史CSV文件缺少'日期'列，跳过导入。")
+        return
+    for day, df_day in df_historical[df_historical['日期'] != current_date_str].groupby('日期'):
+        signal_store.append(SIGNAL_STRATEGY, day, df_day, run_at=pd.Timestamp(day))
+    logging.info(f"已将历史 CSV 中的 {df_historical['日期'].nunique()} 天记录导入信号快照。")
+
+
 def main():
     """主函数"""
     try:
@@ -763,38 +777,17 @@ def main():
         df_new_day = generate_report_csv(results, current_date_str)
         
         if not df_new_day.empty:
-            
-            # --- 【核心逻辑】读取历史数据并覆盖当日记录 ---
-            df_historical = pd.DataFrame()
-            if os.path.exists(report_file_csv):
-                try:
-                    df_historical = pd.read_csv(report_file_csv, encoding='utf-8')
-                    # 确保 '日期' 列存在
-                    if '日期' not in df_historical.columns:
-                         logging.warning("历史CSV文件缺少'日期'列，将重新生成。")
-                         df_historical = pd.DataFrame() # 视为无效，重新开始
-                    
-                except Exception as e:
-                    logging.error(f"读取历史 CSV 文件时发生错误: {e}")
-                    df_historical = pd.DataFrame()
-            
-            # 如果成功读取了历史数据
-            if not df_historical.empty:
-                # 排除历史数据中所有与今天日期相同的行（实现覆盖/更新）
-                df_filtered = df_historical[df_historical['日期'] != current_date_str].copy()
-                
-                # 追加今天的最新数据
-                df_final = pd.concat([df_filtered, df_new_day], ignore_index=True)
-                
-                logging.info(f"历史数据已更新：移除 {len(df_historical) - len(df_filtered)} 条旧记录，追加 {len(df_new_day)} 条新记录。")
-            else:
-                # 第一次运行或读取失败，直接使用今天的数据
-                df_final = df_new_day
-                logging.info(f"第一次生成 CSV 报告，共 {len(df_new_day)} 条记录。")
+            month_start = now.strftime('%Y-%m-01')
+            _import_legacy_csv(report_file_csv, month_start, current_date_str)
+
+            # 当日结果作为新文件追加到信号分区，同一天重复运行时读取以最后一次为准
+            signal_store.append(SIGNAL_STRATEGY, current_date_str, df_new_day, run_at=now)
 
-            # 将最终结果保存到固定名称的 CSV 文件
+            # 月度汇总 CSV 由本月各日分区导出
+            df_final = signal_store.query(SIGNAL_STRATEGY, month_start, current_date_str)
+            df_final = df_final.drop(columns=[signal_store.DATE_COLUMN, signal_store.RUN_COLUMN])
             df_final.to_csv(report_file_csv, index=False, encoding='utf-8')
-            logging.info(f"✅ 统一 CSV 报告已保存/更新到 {report_file_csv}")
+            logging.info(f"✅ 统一 CSV 报告已从信号快照导出到 {report_file_csv}，共 {len(df_final)} 条记录。")
         
         else:
             logging.info(f"没有符合条件的基金，CSV 文件 {report_file_csv} 未作更新。")
@@ -2,11 +2,14 @@ import pandas as pd
 import numpy as np
 import os
 import re # 导入正则表达式库
+import sys
+import yaml
 from datetime import datetime, timedelta
-# 从您的 sell_decision 模块导入必要的函数
-# 注意：该文件假设 sell_decision.py 中的函数已正确实现且可用
-# 【重要修改】：此处需要假设 sell_decision.py 中已增加了 decide_buy 函数
-from sell_decision import load_config, calculate_indicators, get_big_market_status, decide_sell, decide_buy
+
+# 共享模块 (fund_loader、index_store 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
+import index_store
 
 # --- 回测配置 ---
 # 覆盖更长时间，这里假设从 2018 年开始，以便进行五年以上回测
@@ -14,6 +17,67 @@ START_DATE = '2018-01-01'
 END_DATE = datetime.now().strftime('%Y-%m-%d')
 # 固定初始投入资金，用于净值基准计算
 INITIAL_CAPITAL = 10000.0
+# 持仓与参数配置 (与本脚本同目录)
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'holdings_config.yaml')
+FUND_DATA_DIR = 'fund_data/'
+# --verify 抽样校验的基金数 (逐日切片推导是 O(n²) 的，每只基金数秒)
+VERIFY_SAMPLE_SIZE = 5
+
+# --- 配置与指标计算 (移植自 ell_decision.py) ---
+def load_config(config_path=CONFIG_PATH):
+    """加载配置文件，返回 (参数字典, {基金代码: 成本净值})。"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        holdings_config = yaml.safe_load(f) or {}
+    params = holdings_config.get('parameters', {}) or {}
+    holdings = {}
+    for code, holding in holdings_config.items():
+        if code == 'parameters':
+            continue
+        # 新版配置每只基金为 {cost_nav, buy_date}，旧版直接是成本净值
+        holdings[str(code)] = holding.get('cost_nav') if isinstance(holding, dict) else holding
+    return params, holdings
+
+def calculate_indicators(df, rsi_win, ma_win, bb_win, adx_win):
+    """
+    计算基金净值的RSI(14)、MACD、MA50、布林带位置和ADX。
+    """
+    df = df.copy()
+    
+    # 1. RSI (14)
+    delta = df['net_value'].diff()
+    up = delta.where(delta > 0, 0)
+    down = -delta.where(delta < 0, 0)
+    avg_up = up.ewm(com=rsi_win - 1, adjust=False, min_periods=rsi_win).mean()
+    avg_down = down.ewm(com=rsi_win - 1, adjust=False, min_periods=rsi_win).mean()
+    rs = avg_up / avg_down
+    rs = rs.replace([np.inf, -np.inf], np.nan).fillna(0)
+    df['rsi'] = 100 - (100 / (1 + rs))
+    
+    # 2. MA50 / MACD
+    df['ma50'] = df['net_value'].rolling(window=ma_win, min_periods=1).mean()
+    exp12 = df['net_value'].ewm(span=12, adjust=False).mean()
+    exp26 = df['net_value'].ewm(span=26, adjust=False).mean()
+    df['macd'] = 2 * (exp12 - exp26)
+    df['signal'] = df['macd'].ewm(span=9, adjust=False).mean()
+    
+    # 3. Bollinger Bands (BB_window 统一为 bb_win)
+    df['bb_mid'] = df['net_value'].rolling(window=bb_win, min_periods=1).mean()
+    df['bb_std'] = df['net_value'].rolling(window=bb_win, min_periods=1).std()
+    df['bb_upper'] = df['bb_mid'] + (df['bb_std'] * 2)
+    df['bb_lower'] = df['bb_mid'] - (df['bb_std'] * 2)
+    
+    # 4. Volatility / Daily Return
+    df['daily_return'] = df['net_value'].pct_change()
+    df['volatility'] = df['daily_return'].rolling(window=bb_win).std()
+    df['bb_break_upper'] = df['net_value'] > df['bb_upper']
+    
+    # 5. ADX 占位 (与 ell_decision 相同，使用日收益率标准差近似)
+    if len(df) > adx_win:
+        df['adx'] = df['daily_return'].rolling(window=adx_win).std() * 1000 
+    else:
+        df['adx'] = np.nan
+        
+    return df
 
 # --- 绩效分析函数 ---
 def calculate_performance_metrics(nav_series, initial_capital, risk_free_rate=0.03):
@@ -65,23 +129,308 @@ def calculate_performance_metrics(nav_series, initial_capital, risk_free_rate=0.
         '累计收益率 (%)': round(total_return * 100, 2),
     }
 
+# --- 决策特征预计算 ---
+# 大盘特征列 (对齐到基金日期后加 big_ 前缀)
+MARKET_FEATURE_COLUMNS = ['net_value', 'ma50', 'rsi', 'macd', 'signal']
+# 与逐日切片推导比对的特征列 (--verify)
+VERIFIED_FEATURE_COLUMNS = [
+    'obs_count', 'rolling_peak', 'consecutive_declines', 'recent_peak', 'recent_drawdown', 'recent_rsi_max',
+    'rsi_overbought_days', 'bb_pos', 'bb_break_2d', 'macd_signal', 'macd_zero_dead_cross', 'recent_macd_max',
+    'big_net_value', 'big_ma50', 'big_rsi', 'big_macd', 'big_signal', 'big_macd_dead_cross_today', 'big_trend',
+]
+
+def _consecutive_true(flags):
+    """截至每一行末尾连续为 True 的行数"""
+    return flags.astype(int).groupby((~flags).cumsum()).cumsum()
+
+def build_decision_features(fund_df, big_market_data, big_trend_df, params):
+    """
+    一次性计算每个交易日的决策特征，替代逐日截取 fund_df.iloc[:i+1] 再在切片上重复推导。
+    所有特征只依赖当日及之前的数据；大盘状态经 merge_asof 对齐到基金日期。
+    返回与 fund_df 等长的 DataFrame (保留 fund_df 原有列)，新增：
+        obs_count              截至当日的观测数
+        rolling_peak           回测期内截至当日的净值最高点
+        consecutive_declines   截至当日的连续下跌天数
+        recent_peak            近 profit_lock_days 日最高净值 (观测不足时为 NaN)
+        recent_drawdown        当日净值相对 recent_peak 的回撤
+        recent_rsi_max         近 profit_lock_days 日 RSI 最大值 (观测不足时为 NaN)
+        rsi_overbought_days    RSI 连续高于 rsi_overbought_threshold 的天数
+        bb_pos                 近 2 日均在上轨之上为 '上轨'，均在下轨之下为 '下轨'，否则 '中轨'；首日为 '未知'
+        bb_break_2d            近 2 日均突破布林上轨
+        macd_signal            近 2 日 MACD 均低于信号线为 '死叉'，否则 '金叉'
+        macd_zero_dead_cross   死叉且当日 MACD 与信号线均在零轴下方
+        recent_macd_max        近 macd_divergence_window 日 MACD 最大值 (观测不足时为 NaN，用于顶背离)
+        big_net_value/big_ma50/big_rsi/big_macd/big_signal
+                               当日可见的最近一行完整大盘指标 (与 DataFrame.asof 相同，跳过含 NaN 的行)
+        big_macd_dead_cross_today  大盘当日 MACD 下穿信号线
+        big_trend              大盘趋势 ('强势'/'弱势'/'中性')，当日无大盘数据时为 '中性'
+    字段语义与 _slice_features 的逐日切片推导 (ell_decision 的写法) 相同，python backtest_module.py --verify 校验。
+    """
+    profit_lock_days = params.get('profit_lock_days', 14)
+    macd_window = params.get('macd_divergence_window', 60)
+    rsi_overbought = params.get('rsi_overbought_threshold', 80)
+
+    df = fund_df.reset_index(drop=True).copy()
+    nav = df['net_value']
+    obs = pd.Series(np.arange(1, len(df) + 1), index=df.index)
+    df['obs_count'] = obs
+    df['rolling_peak'] = nav.cummax()
+    df['consecutive_declines'] = _consecutive_true(nav.diff() < 0)
+    # 切片写法按行数截取 tail(n) 且 max() 跳过 NaN，故 min_periods=1 再按观测数屏蔽
+    df['recent_peak'] = nav.rolling(profit_lock_days, min_periods=1).max().where(obs >= profit_lock_days)
+    df['recent_drawdown'] = (df['recent_peak'] - nav) / df['recent_peak']
+    df['recent_rsi_max'] = df['rsi'].rolling(profit_lock_days, min_periods=1).max().where(obs >= profit_lock_days)
+    df['rsi_overbought_days'] = _consecutive_true(df['rsi'] > rsi_overbought)
+
+    above = nav > df['bb_upper']
+    below = nav < df['bb_lower']
+    two_days = obs >= 2
+    df['bb_break_2d'] = two_days & above & above.shift(1, fill_value=False)
+    df['bb_pos'] = np.where(~two_days, '未知', np.where(df['bb_break_2d'], '上轨',
+                            np.where(below & below.shift(1, fill_value=False), '下轨', '中轨')))
+    dead = df['macd'] < df['signal']
+    dead_2d = two_days & dead & dead.shift(1, fill_value=False)
+    df['macd_signal'] = np.where(dead_2d, '死叉', '金叉')
+    df['macd_zero_dead_cross'] = dead_2d & (df['macd'] < 0) & (df['signal'] < 0)
+    df['recent_macd_max'] = df['macd'].rolling(macd_window, min_periods=1).max().where(obs >= macd_window)
+
+    # 大盘：asof 语义 (只取不含 NaN 的行) + 当日死叉；趋势按趋势表自身的 asof 另行对齐
+    market = big_market_data.copy()
+    market['macd_dead_cross_today'] = (market['macd'] < market['signal']) & \
+        (market['macd'].shift(1) >= market['signal'].shift(1))
+    market = market.dropna()[MARKET_FEATURE_COLUMNS + ['macd_dead_cross_today']]
+    trend = big_trend_df.dropna()[['trend']]
+    df['date'] = df['date'].astype('datetime64[ns]')
+    for frame in (market, trend):
+        frame = frame.add_prefix('big_').rename_axis('date').reset_index()
+        frame['date'] = frame['date'].astype('datetime64[ns]')
+        df = pd.merge_asof(df, frame, on='date', direction='backward')
+    df['big_trend'] = df['big_trend'].where(df['big_net_value'].notna()).fillna('中性')
+    return df
+
+def _slice_features(history, big_market_data, big_trend_df, params):
+    """
+    按 ell_decision 的写法在截至当日的切片上推导决策特征 (iloc[-1] / tail(n) / DataFrame.asof)。
+    仅用于校验 build_decision_features，返回与其新增列同名的 dict。
+    """
+    profit_lock_days = params.get('profit_lock_days', 14)
+    macd_window = params.get('macd_divergence_window', 60)
+    rsi_overbought = params.get('rsi_overbought_threshold', 80)
+    latest = history.iloc[-1]
+    nav = history['net_value']
+    features = {'obs_count': len(history), 'rolling_peak': nav.max()}
+
+    declines = 0
+    for change in nav.diff().iloc[::-1]:
+        if not change < 0:
+            break
+        declines += 1
+    features['consecutive_declines'] = declines
+
+    features['recent_peak'] = features['recent_drawdown'] = features['recent_rsi_max'] = np.nan
+    if len(history) >= profit_lock_days:
+        recent_data = history.tail(profit_lock_days)
+        peak_nav = recent_data['net_value'].max()
+        features['recent_peak'] = peak_nav
+        features['recent_drawdown'] = (peak_nav - recent_data['net_value'].iloc[-1]) / peak_nav
+        features['recent_rsi_max'] = recent_data['rsi'].max()
+
+    overbought = 0
+    for value in history['rsi'].iloc[::-1]:
+        if not value > rsi_overbought:
+            break
+        overbought += 1
+    features['rsi_overbought_days'] = overbought
+
+    bb_pos, bb_break, macd_signal, macd_zero_dead_cross = '未知', False, '金叉', False
+    if len(history) >= 2:
+        recent_data = history.tail(2)
+        bb_break = bool((recent_data['net_value'] > recent_data['bb_upper']).all())
+        if bb_break: bb_pos = '上轨'
+        elif (recent_data['net_value'] < recent_data['bb_lower']).all(): bb_pos = '下轨'
+        else: bb_pos = '中轨'
+        if (recent_data['macd'] < recent_data['signal']).all():
+            macd_signal = '死叉'
+            macd_zero_dead_cross = bool(latest['macd'] < 0 and latest['signal'] < 0)
+    features.update(bb_pos=bb_pos, bb_break_2d=bb_break, macd_signal=macd_signal,
+                    macd_zero_dead_cross=macd_zero_dead_cross)
+    features['recent_macd_max'] = history.tail(macd_window)['macd'].max() if len(history) >= macd_window else np.nan
+
+    # 大盘：原逐日循环的 .asof() 查找，即截至当日最后一行不含 NaN 的指标；死叉取该行与其前一行
+    current_date = latest['date']
+    complete = big_market_data.loc[:current_date].dropna()
+    visible = big_market_data.loc[:complete.index[-1]] if len(complete) else big_market_data.iloc[:0]
+    for col in MARKET_FEATURE_COLUMNS:
+        features[f'big_{col}'] = visible[col].iloc[-1] if len(visible) else np.nan
+    recent_macd = visible.iloc[-2:]
+    features['big_macd_dead_cross_today'] = (
+        bool(recent_macd['macd'].iloc[-1] < recent_macd['signal'].iloc[-1]
+             and recent_macd['macd'].iloc[0] >= recent_macd['signal'].iloc[0])
+        if len(recent_macd) == 2 else (False if len(visible) else np.nan))
+    features['big_trend'] = big_trend_df.asof(current_date)['trend'] if len(visible) else '中性'
+    return features
+
+def verify_features(fund_df, big_market_data, big_trend_df, params):
+    """逐日比对 build_decision_features 与切片推导，返回 (行数, 不一致行数)"""
+    features = build_decision_features(fund_df, big_market_data, big_trend_df, params)
+    history = features[fund_df.columns]
+    mismatches = 0
+    for i, row in enumerate(features[VERIFIED_FEATURE_COLUMNS].to_dict('records')):
+        expected = _slice_features(history.iloc[:i + 1], big_market_data, big_trend_df, params)
+        for col in VERIFIED_FEATURE_COLUMNS:
+            actual, want = row[col], expected[col]
+            if not (actual == want or (pd.isna(actual) and pd.isna(want))):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  第 {i} 行 {col}: 预计算 {actual!r}，切片推导 {want!r}")
+                break
+    return len(features), mismatches
+
+# --- 决策函数 (移植自 ell_decision.py，改为读取当日特征行) ---
+def _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, decision, target_nav):
+    return {
+        'code': code,
+        'latest_nav': holding['latest_net_value'],
+        'cost_nav': holding['cost_nav'],
+        'profit_rate': round(profit_rate, 2),
+        'rsi': round(row['rsi'], 2),
+        'macd_signal': macd_signal,
+        'bb_pos': bb_pos,
+        'big_trend': big_trend,
+        'decision': decision,
+        'target_nav': target_nav
+    }
+
+def decide_sell(code, holding, row, params, big_market_latest, big_market_data, big_trend):
+    """
+    卖出决策：规则与优先级同 ell_decision.decide_sell，切片上的 tail(n) 推导换成当日特征行 row 中的字段
+    (见 build_decision_features)。big_market_latest 为当日可见的大盘指标 (无数据时为空 dict)；
+    big_market_data 仅为保持调用约定保留，大盘死叉等状态已在 row 中。
+    """
+    trailing_stop_loss_pct = params.get('trailing_stop_loss_pct', 0.08)
+    profit_lock_days = params.get('profit_lock_days', 14)
+    consecutive_days_threshold = params.get('consecutive_days_threshold', 3)
+    rsi_overbought_threshold = params.get('rsi_overbought_threshold', 80)
+    adx_threshold = params.get('adx_threshold', 30)
+
+    profit_rate = holding['profit_rate']
+    latest_net_value = holding['latest_net_value']
+    cost_nav = holding['cost_nav']
+    current_peak = holding['current_peak']
+    rsi = row['rsi']
+    adx = row['adx']
+
+    # --- 关键：止盈/止损净值目标计算 ---
+    target_nav = {
+        'trailing_stop_nav': round(current_peak * (1 - trailing_stop_loss_pct), 4),
+        'abs_stop_20_nav': round(cost_nav * (1 - 0.20), 4),
+        'abs_stop_15_nav': round(cost_nav * (1 - 0.15), 4),
+        'abs_stop_10_nav': round(cost_nav * (1 - 0.10), 4),
+        'short_drawdown_nav': np.nan
+    }
+
+    # --- 高优先级规则：分级止损 (此时尚未计算指标，与原实现一样报告 '未知') ---
+    if profit_rate < -20:
+        return _sell_result(code, holding, row, profit_rate, '未知', '未知', big_trend, '因绝对止损（亏损>20%）卖出100%', target_nav)
+    elif profit_rate < -15:
+        return _sell_result(code, holding, row, profit_rate, '未知', '未知', big_trend, '因亏损>15%减仓50%', target_nav)
+    elif profit_rate < -10:
+        return _sell_result(code, holding, row, profit_rate, '未知', '未知', big_trend, '暂停定投', target_nav)
+
+    bb_pos = row['bb_pos']
+    macd_signal = row['macd_signal']
+
+    # T1 止盈规则（布林带中轨）
+    if profit_rate > 0 and bb_pos == '中轨':
+        return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend,
+                            '【T1止盈】布林中轨已达，建议卖出 30% - 50% 仓位', target_nav)
+
+    # 移动止盈 (成本保护：移动止盈价高于成本净值时才生效)
+    drawdown = (current_peak - latest_net_value) / current_peak
+    if target_nav['trailing_stop_nav'] > cost_nav and drawdown > trailing_stop_loss_pct:
+        return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, '因移动止盈卖出', target_nav)
+
+    # MACD 顶背离：当日净值为持仓峰值，MACD 低于近窗口最高
+    if not pd.isna(row['recent_macd_max']):
+        if row['net_value'] == current_peak and row['macd'] < row['recent_macd_max']:
+            return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, '因MACD顶背离减仓70%', target_nav)
+
+    # ADX 趋势转弱
+    if not np.isnan(adx) and adx >= adx_threshold and row['macd_zero_dead_cross']:
+        return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, '因ADX趋势转弱减仓50%', target_nav)
+
+    # 最大回撤止损 (近 profit_lock_days 日)
+    if row['obs_count'] >= profit_lock_days:
+        target_nav['short_drawdown_nav'] = round(row['recent_peak'] * (1 - 0.10), 4)
+        if row['recent_drawdown'] > 0.10:
+            return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, '因最大回撤止损20%', target_nav)
+
+    # RSI和布林带锁定利润 (与原实现相同，只记录决策，随后由三要素综合决策覆盖)
+    decision = '持仓'
+    if row['obs_count'] >= profit_lock_days and row['recent_rsi_max'] > 75 and row['bb_break_2d']:
+        decision = '减仓50%锁定利润'
+
+    # 超规则（指标钝化）：RSI 连续超买且大盘 MACD 未死叉时暂停卖出
+    if row['rsi_overbought_days'] >= consecutive_days_threshold:
+        if row['big_macd'] > row['big_signal'] and not row['big_macd_dead_cross_today']:
+            return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, '持续强势，暂停卖出', target_nav)
+
+    # --- 三要素综合决策（最低优先级） ---
+    if profit_rate > 50: sell_profit = '卖50%'
+    elif profit_rate > 40: sell_profit = '卖30%'
+    elif profit_rate > 30: sell_profit = '卖20%'
+    elif profit_rate > 20: sell_profit = '卖10%'
+    elif profit_rate < -10: sell_profit = '暂停定投'
+    else: sell_profit = '持仓'
+
+    indicator_sell = '持仓'
+    if rsi > 85 or bb_pos == '上轨': indicator_sell = '卖30%'
+    elif rsi > 75 or macd_signal == '死叉': indicator_sell = '卖20%'
+
+    market_sell = '卖10%' if big_trend == '弱势' else '持仓'
+
+    if '卖' in sell_profit and '卖' in indicator_sell and '卖' in market_sell: decision = '卖30%'
+    elif '卖' in sell_profit and '卖' in indicator_sell: decision = '卖20%'
+    elif '卖' in sell_profit and '卖' in market_sell: decision = '卖10%'
+    elif '卖' in indicator_sell and '卖' in market_sell: decision = '卖10%'
+    elif '暂停' in sell_profit: decision = '暂停定投'
+    else: decision = '持仓'
+
+    return _sell_result(code, holding, row, profit_rate, macd_signal, bb_pos, big_trend, decision, target_nav)
+
+def decide_buy(code, holding, row, params, big_market_latest, big_market_data, big_trend):
+    """
+    清仓后的买回决策。sell_decision 只定义了卖出规则，这里不引入新的买入策略：始终观望，清仓后不再买回，
+    回测结果只由卖出规则决定。签名与 decide_sell 相同 (第三个参数为当日特征行)，需要买回策略时替换本函数。
+    """
+    return {'code': code, 'decision': '观望'}
+
 # --- 历史回测核心逻辑 ---
-def run_backtest(fund_code, initial_cost_nav, params, fund_df, big_market_data, big_trend_df):
-    
-    # 1. 过滤回测日期范围并进行指标预处理
+def prepare_fund_frame(fund_df, params):
+    """截取回测日期范围并计算指标 (区间内无数据时返回空表)"""
     fund_df = fund_df[(fund_df['date'] >= START_DATE) & (fund_df['date'] <= END_DATE)].copy()
     if fund_df.empty:
-        print(f"警告: 基金 {fund_code} 在回测期内无数据。")
-        return None, None
-
-    # 预计算所有日期的指标
-    fund_df = calculate_indicators(
+        return fund_df
+    return calculate_indicators(
         fund_df, 
         params.get('rsi_window', 14), 
         params.get('ma_window', 50), 
         params.get('bb_window', 20), 
         params.get('adx_window', 14)
     )
+
+def run_backtest(fund_code, initial_cost_nav, params, fund_df, big_market_data, big_trend_df):
+    
+    # 1. 过滤回测日期范围并预计算所有日期的指标
+    fund_df = prepare_fund_frame(fund_df, params)
+    if fund_df.empty:
+        print(f"警告: 基金 {fund_code} 在回测期内无数据。")
+        return None, None
+
+    # 逐日决策所需的特征与大盘状态一次性算好，循环中按行 O(1) 读取
+    # decide_sell/decide_buy 收到的第三个参数为当日特征行 (dict)，字段见 build_decision_features
+    features = build_decision_features(fund_df, big_market_data, big_trend_df, params)
+    feature_rows = features.to_dict('records')
     
     # 2. 初始化持仓、现金和净值曲线
     transaction_log = []
@@ -96,15 +445,14 @@ def run_backtest(fund_code, initial_cost_nav, params, fund_df, big_market_data,
     total_cost = initial_investment 
     
     # 初始峰值 (用于移动止盈)
-    current_peak_nav = fund_df.iloc[0]['net_value']
+    current_peak_nav = feature_rows[0]['net_value']
     
     # 3. 循环模拟每日决策
-    for i in range(len(fund_df)):
-        current_date = fund_df.iloc[i]['date']
-        current_data_slice = fund_df.iloc[:i+1] # 截取当前及之前的数据
+    for i, row in enumerate(feature_rows):
+        current_date = row['date']
         
         # 获取当日净值
-        latest_nav_value = current_data_slice.iloc[-1]['net_value']
+        latest_nav_value = row['net_value']
         
         # 更新峰值 (只有在持仓时才更新，但为了简化，这里使用全局峰值)
         # if shares > 0: # 修正：清仓后不更新峰值，避免清仓后净值暴跌影响下次买入后的止盈
@@ -153,21 +501,12 @@ def run_backtest(fund_code, initial_cost_nav, params, fund_df, big_market_data,
             'total_capital': INITIAL_CAPITAL # 传递初始总资金
         }
         
-        # 获取大盘当日状态 (使用 .asof() 安全地获取数据)
-        try:
-            # .asof() 查找索引中小于或等于给定日期 current_date 的最后一个有效值
-            big_market_latest = big_market_data.asof(current_date)
-            big_trend_latest = big_trend_df.asof(current_date)
-            
-            # 检查是否获取到有效数据
-            if big_market_latest is None or big_market_latest.empty:
-                big_trend = '中性'
-            else:
-                big_trend = big_trend_latest['trend']
-                
-        except Exception:
-            big_market_latest = pd.Series()
-            big_trend = '中性'
+        # 大盘当日状态已由 merge_asof 对齐 (不含未来数据)；当日尚无大盘数据时视为中性
+        if pd.isna(row['big_net_value']):
+            big_market_latest = {}
+        else:
+            big_market_latest = {col: row[f'big_{col}'] for col in MARKET_FEATURE_COLUMNS}
+        big_trend = row['big_trend']
             
         # 4. 做出决策
         decision = None
@@ -175,14 +514,14 @@ def run_backtest(fund_code, initial_cost_nav, params, fund_df, big_market_data,
 
         # A. 如果有持仓，先判断是否卖出
         if shares > 0:
-            decision_result = decide_sell(fund_code, holding, current_data_slice, params, big_market_latest, big_market_data, big_trend)
+            decision_result = decide_sell(fund_code, holding, row, params, big_market_latest, big_market_data, big_trend)
             decision = decision_result['decision']
 
         # B. 如果没有持仓 (清仓状态)，判断是否买入
         elif shares == 0 and cash > 0:
             # 【新增买入决策】
             # 使用 cash > 0 确保有钱买入
-            decision_result = decide_buy(fund_code, holding, current_data_slice, params, big_market_latest, big_market_data, big_trend)
+            decision_result = decide_buy(fund_code, holding, row, params, big_market_latest, big_market_data, big_trend)
             decision = decision_result['decision']
         
         # 5. 执行交易
@@ -281,17 +620,20 @@ def run_backtest(fund_code, initial_cost_nav, params, fund_df, big_market_data,
     
     return trade_df, performance
 
-def main():
-    print(f"--- 长期绩效回测模块启动 ({START_DATE} 至 {END_DATE}) ---")
-    
-    # 1. 加载配置和参数
-    params, holdings_config = load_config()
-    
-    # 2. 预加载大盘数据
-    big_market_data, _, _ = get_big_market_status(params)
+def load_market_data(params):
+    """
+    从指数存储取回测区间 (含 MA/RSI 预热期) 的大盘升序序列并计算指标与趋势状态。
+    返回 (big_market_data, big_trend_df)，均以 date 为索引。
+    """
+    warmup_start = (pd.Timestamp(START_DATE) - pd.DateOffset(years=1)).strftime('%Y-%m-%d')
+    big_market = index_store.load_index_store().series(index_store.MARKET_INDEX, start=warmup_start, end=END_DATE)
+    big_market_data = calculate_indicators(
+        big_market, params.get('rsi_window', 14), params.get('ma_window', 50),
+        params.get('bb_window', 20), params.get('adx_window', 14)
+    )
     
     # 预计算大盘趋势DF
-    # 假设 get_big_market_status 已经计算了 RSI 和 MA50
+    # calculate_indicators 已经计算了 RSI 和 MA50
     big_trend_df = big_market_data[['date', 'net_value', 'ma50', 'rsi']].copy()
     
     # 计算大盘趋势状态
@@ -303,14 +645,51 @@ def main():
         )
     )
     
-    # 设置 date 列为索引，以支持 .asof() 查找 (防止未来信息泄露)
+    # 设置 date 列为索引 (防止未来信息泄露)
     big_market_data.set_index('date', inplace=True)
-    big_trend_df.set_index('date', inplace=True) 
+    big_trend_df.set_index('date', inplace=True)
+    return big_market_data, big_trend_df
+
+def main_verify(sample_size=VERIFY_SAMPLE_SIZE):
+    """
+    校验 build_decision_features 逐日等于切片推导 (_slice_features)。
+    持仓配置中的基金优先，不足 sample_size 只时从 fund_data 按代码均匀抽样补足；任一行不一致或无可校验基金时返回 False。
+    """
+    params, holdings_config = load_config()
+    big_market_data, big_trend_df = load_market_data(params)
+    csv_files = sorted(f for f in os.listdir(FUND_DATA_DIR) if f.endswith('.csv'))
+    step = max(len(csv_files) // sample_size, 1)
+    candidates = [f"{code}.csv" for code in holdings_config] + csv_files[::step]
+    checked, failed = 0, []
+    for name in candidates:
+        fund_file = os.path.join(FUND_DATA_DIR, name)
+        if checked >= sample_size or not os.path.exists(fund_file):
+            continue
+        fund_df = fund_loader.load_fund_frame(fund_file).sort_values('date').reset_index(drop=True)
+        fund_df = prepare_fund_frame(fund_df, params)
+        if fund_df.empty:
+            continue
+        rows, mismatches = verify_features(fund_df, big_market_data, big_trend_df, params)
+        print(f"基金 {name[:-4]}: {rows} 行，不一致 {mismatches} 行")
+        checked += 1
+        if mismatches:
+            failed.append(name[:-4])
+    print(f"校验完成: {checked} 只基金，{len(failed)} 只存在不一致{': ' + ', '.join(failed) if failed else ''}")
+    return checked > 0 and not failed
+
+def main():
+    print(f"--- 长期绩效回测模块启动 ({START_DATE} 至 {END_DATE}) ---")
+    
+    # 1. 加载配置和参数
+    params, holdings_config = load_config()
+    
+    # 2. 预加载大盘数据与趋势 (回测时经 merge_asof 对齐到基金日期)
+    big_market_data, big_trend_df = load_market_data(params)
     
     # 3. 运行回测
     all_trade_logs = []
     all_performance = []
-    fund_data_dir = 'fund_data/'
+    fund_data_dir = FUND_DATA_DIR
 
     # 【重要修正】：如果 holdings_config 中配置了基金，那么回测就从第一天开始满仓这些基金。
     # 如果要实现空仓开始，需要修改 holdings_config 为 {}，然后从 cash = INITIAL_CAPITAL 开始
@@ -318,8 +697,8 @@ def main():
     for code, cost_nav in holdings_config.items():
         fund_file = os.path.join(fund_data_dir, f"{code}.csv")
         if os.path.exists(fund_file):
-            # 确保 date 列在读取时被解析为日期
-            fund_df = pd.read_csv(fund_file, parse_dates=['date']).sort_values('date').reset_index(drop=True)
+            # 经共享读取模块读取：date 解析为日期，并合并 fund_data/journal/ 中尚未压实的新行
+            fund_df = fund_loader.load_fund_frame(fund_file).sort_values('date').reset_index(drop=True)
             print(f"开始回测基金: {code} (初始成本净值: {cost_nav})")
             
             try:
@@ -367,4 +746,6 @@ if __name__ == '__main__':
     pd.set_option('display.float_format', lambda x: '%.4f' % x)
     
     # ⚠️ 请确保您的基金数据文件 (fund_data/*.csv) 包含从 2018-01-01 开始的数据
+    if '--verify' in sys.argv[1:]:
+        sys.exit(0 if main_verify() else 1)
     main()
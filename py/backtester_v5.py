@@ -5,8 +5,15 @@ import numpy as np
 import logging
 import math
 import pytz
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+# 共享模块 (fund_loader 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backtest_kernel
+import fund_loader
+
 # --- 配置参数 (模拟 V4.4 策略设定) ---
 FUND_DATA_DIR = 'fund_data'
 BACKTEST_START_DATE = '2020-01-01'  # 回测起始日期
@@ -14,6 +21,7 @@ BACKTEST_END_DATE = '2024-12-31'    # 回测结束日期
 INITIAL_CAPITAL = 100000.0          # 初始总资金 (包含基础仓位和预备金)
 BUY_AMOUNT_PER_TRADE = 10000.0      # 每次买入金额 (模拟网格补仓金额)
 REPORT_FILE_NAME = 'fund_backtest_v5_report.md' # V5.0 报告名称
+VERIFY_SAMPLE_SIZE = 20             # --verify 抽样校验的基金数 (--verify-all 校验全部基金)
 
 # --- V4.4 策略核心纪律配置 ---
 RSI_BUY_THRESHOLD = 30.0    # RSI(6) <= 30 时买入 (质量过滤)
@@ -22,6 +30,15 @@ TREND_RATIO_MIN = 0.95      # MA50/MA250 必须大于等于 0.95 (风控过滤)
 STOP_LOSS_PERCENT = 0.08    # 止损阈值 (8%低于平均成本)
 STOP_PROFIT_PERCENT = 0.15  # 止盈阈值 (15%高于平均成本)
 
+# 回测内核参数集 (backtest_kernel)
+GRID_PARAMS = {
+    'initial_capital': INITIAL_CAPITAL,
+    'buy_amount': BUY_AMOUNT_PER_TRADE,
+    'stop_loss': STOP_LOSS_PERCENT,
+    'take_profit': STOP_PROFIT_PERCENT,
+    'grid_step': GRID_STEP_PERCENT,
+}
+
 # --- 指标计算辅助函数 ---
 
 def calculate_technical_indicators(df):
@@ -67,6 +84,58 @@ def calculate_technical_indicators(df):
         'MA50/MA250趋势': trend_direction,
     }
 
+def calculate_indicator_series(df):
+    """
+    一次性计算每一天的时点指标，第 i 行与 calculate_technical_indicators(df.iloc[:i+1]) 的结果相同。
+    rolling/ewm/cumulative 运算本身只使用当天及之前的数据，因此整段计算不会引入未来数据，
+    复杂度为 O(n)，取代逐日对前缀重复计算的 O(n²)。
+    """
+    values = df['value'].reset_index(drop=True)
+    n = len(values)
+    delta = values.diff()
+
+    # 1. RSI (6)：滚动均值逐点计算，第 i 个值只依赖前 i+1 个净值
+    gain_6 = (delta.where(delta > 0, 0)).rolling(window=6, min_periods=1).mean()
+    loss_6 = (-delta.where(delta < 0, 0)).rolling(window=6, min_periods=1).mean()
+    rs_6 = gain_6 / loss_6.replace(0, np.nan)
+    rsi_6 = (100 - (100 / (1 + rs_6))).to_numpy()
+
+    # 2. MA50/MA250 比值及近 20 日比值的拟合斜率
+    ratio = (values.rolling(window=50, min_periods=1).mean() / values.rolling(window=250, min_periods=1).mean()).to_numpy()
+    slope = np.full(n, np.nan)
+    if n >= 20:
+        x = np.arange(20, dtype=np.float64)
+        x -= x.mean()
+        windows = np.lib.stride_tricks.sliding_window_view(ratio, 20)
+        slope[19:] = (windows * x).sum(axis=1) / (x * x).sum()
+
+    rows = np.arange(n) + 1  # 第 i 行对应的前缀长度
+    rsi_out = np.array([round(v, 2) if not math.isnan(v) else np.nan for v in rsi_6])
+    ratio_out = np.array([round(v, 2) if not math.isnan(v) else np.nan for v in ratio])
+    trend = np.where(slope > 0.001, '向上', np.where(slope < -0.001, '向下', '平稳')).astype(object)
+
+    has_ratio = (rows >= 250) & ~np.isnan(ratio) & (ratio != 0)
+    ratio_out[~has_ratio] = np.nan
+    trend[~has_ratio] = '数据不足'
+    # 前缀不足 60 条时原函数不计算任何指标
+    rsi_out[rows < 60] = np.nan
+    return pd.DataFrame({'RSI(6)': rsi_out, 'MA50/MA250': ratio_out, 'MA50/MA250趋势': trend})
+
+def verify_indicator_series(df, fund_code=''):
+    """逐行比较 calculate_indicator_series 与前缀重算的结果，返回不一致的行号列表"""
+    series = calculate_indicator_series(df)
+    mismatches = []
+    for i in range(len(df)):
+        expected = calculate_technical_indicators(df.iloc[:i+1])
+        actual = series.iloc[i]
+        for key, value in expected.items():
+            if not (value == actual[key] or (pd.isna(value) and pd.isna(actual[key]))):
+                mismatches.append(i)
+                break
+    if mismatches:
+        logging.warning(f"基金 {fund_code} 时点指标与前缀重算不一致的行: {mismatches[:10]} (共 {len(mismatches)} 行)")
+    return mismatches
+
 def calculate_max_drawdown(series):
     """ 计算最大回撤 """
     if series.empty: return 0.0
@@ -110,117 +179,58 @@ def calculate_recovery_days(equity_series):
     # 结果为两个 datetime.date 之间的差值 (days)
     return (recovery_date - trough_date).days
 
+def prepare_backtest_frame(df_fund, fund_code='', start=BACKTEST_START_DATE, end=BACKTEST_END_DATE):
+    """筛选回测周期 [start, end] (为 None 时不限) 并拼接时点指标 (RSI(6)、MA50/MA250 及趋势)；数据不足时返回 None"""
+    df = df_fund
+    if start is not None:
+        df = df[df['date'] >= start]
+    if end is not None:
+        df = df[df['date'] <= end]
+    if df.empty or len(df) < 250:
+        logging.warning(f"基金 {fund_code} 数据不足 250 条，跳过 V5.0 回测。")
+        return None
+
+    # V5.0 关键：每一天只使用当天及之前的数据 (时点指标一次性计算，见 calculate_indicator_series)
+    df_tech = calculate_indicator_series(df)
+    df = pd.concat([df.reset_index(drop=True), df_tech], axis=1)
+    
+    df = df.dropna(subset=['RSI(6)']).reset_index(drop=True)
+    return None if df.empty else df
+
+def grid_add_signal(rsi_6, ma_ratio, trend_down, rsi_threshold=RSI_BUY_THRESHOLD, trend_ratio_min=TREND_RATIO_MIN):
+    """
+    网格补仓的信号过滤：趋势安全垫 (Level 3) & RSI(6) 极值 (Level 2)。
+    价格到位 (Level 1，相对平均成本下跌 GRID_STEP_PERCENT) 由回测内核判断。
+    """
+    return ~trend_down & (ma_ratio >= trend_ratio_min) & (rsi_6 <= rsi_threshold)
+
 # --- V5.0 核心回测逻辑 ---
 
 def run_backtest_v5(df_fund, fund_code):
     """
     对单只基金运行 V4.4 网格补仓策略，并计算 V5.0 指标。
     """
-    df = df_fund.copy()
-    
     # 1. 筛选回测周期并计算指标
-    df = df[(df['date'] >= BACKTEST_START_DATE) & (df['date'] <= BACKTEST_END_DATE)].copy()
-    if df.empty or len(df) < 250:
-        logging.warning(f"基金 {fund_code} 数据不足 250 条，跳过 V5.0 回测。")
-        return None
+    df = prepare_backtest_frame(df_fund, fund_code)
+    if df is None: return None
 
-    # V5.0 关键：对每一天的数据运行指标计算，避免未来函数
-    df_tech = pd.DataFrame([calculate_technical_indicators(df.iloc[:i+1]) for i in range(len(df))])
-    df = pd.concat([df.reset_index(drop=True), df_tech], axis=1)
-    
-    df = df.dropna(subset=['RSI(6)']).reset_index(drop=True)
-    if df.empty: return None
+    # 2. 预先向量化买入条件，状态机交给回测内核
+    #    初始建仓: 空仓且现金充足即买入 (模拟任务驱动)
+    grid_signal = grid_add_signal(df['RSI(6)'].to_numpy(dtype=np.float64), df['MA50/MA250'].to_numpy(dtype=np.float64),
+                                  df['MA50/MA250趋势'].to_numpy() == '向下')
+    values = df['value'].to_numpy(dtype=np.float64)
+    result = backtest_kernel.run(values, entry=True, add=grid_signal, params=GRID_PARAMS)
+    trades = result['trades']
 
-    # 2. 初始化回测变量
     initial_capital = INITIAL_CAPITAL
-    cash = initial_capital
-    shares = 0.0        
-    avg_cost_per_share = 0.0 
-    
-    # V5.0 指标跟踪
-    take_profit_count = 0 
-    stop_loss_count = 0
-    
-    trade_log = []
-    equity_values = []
-    
-    # 3. 逐日回测
-    for index, row in df.iterrows():
-        current_date = row['date']
-        current_value = row['value']
-        current_rsi_6 = row['RSI(6)']
-        ma_ratio = row['MA50/MA250']
-        trend_dir = row['MA50/MA250趋势']
-        
-        market_value = shares * current_value
-        total_equity = cash + market_value
-        equity_values.append(total_equity)
-
-        # --- 卖出判断 (止盈/止损) ---
-        if shares > 0:
-            current_holding_cost = shares * avg_cost_per_share
-            current_profit_ratio = (market_value - current_holding_cost) / current_holding_cost
-            
-            # 止损信号:
-            if current_profit_ratio <= -STOP_LOSS_PERCENT:
-                sale_amount = market_value
-                cash += sale_amount
-                shares = 0.0
-                avg_cost_per_share = 0.0
-                stop_loss_count += 1 # V5.0 记录止损次数
-                trade_log.append({'Date': current_date, 'Action': 'SELL (Stop Loss)'})
-                continue 
-
-            # 止盈信号:
-            if current_profit_ratio >= STOP_PROFIT_PERCENT:
-                sale_amount = market_value
-                cash += sale_amount
-                shares = 0.0
-                avg_cost_per_share = 0.0
-                take_profit_count += 1 # V5.0 记录止盈次数
-                trade_log.append({'Date': current_date, 'Action': 'SELL (Take Profit)'})
-                continue 
-        
-        # --- V4.4 买入判断 (网格 & 信号 & 趋势) ---
-        
-        # 1. 初始建仓（模拟任务驱动，仅执行一次，占总资金的约 10%）
-        if shares == 0 and cash >= BUY_AMOUNT_PER_TRADE:
-            buy_shares = BUY_AMOUNT_PER_TRADE / current_value
-            shares += buy_shares
-            avg_cost_per_share = current_value
-            cash -= BUY_AMOUNT_PER_TRADE
-            trade_log.append({'Date': current_date, 'Action': 'BUY (Initial)'})
-            continue 
-            
-        # 2. 网格补仓（信号驱动）
-        if shares > 0 and cash >= BUY_AMOUNT_PER_TRADE:
-            
-            # 2.1. 趋势安全垫过滤 (Level 3)
-            if trend_dir == '向下' or ma_ratio < TREND_RATIO_MIN or math.isnan(ma_ratio):
-                continue
-
-            # 2.2. 价格到位 (网格触发 - Level 1)
-            current_drop_from_avg = (avg_cost_per_share - current_value) / avg_cost_per_share
-            if current_drop_from_avg < GRID_STEP_PERCENT:
-                continue 
-
-            # 2.3. 质量过滤 (RSI(6) 极值 - Level 2)
-            if current_rsi_6 <= RSI_BUY_THRESHOLD:
-                
-                # 触发买入
-                buy_shares = BUY_AMOUNT_PER_TRADE / current_value
-                total_buy_cost = shares * avg_cost_per_share + BUY_AMOUNT_PER_TRADE
-                shares += buy_shares
-                avg_cost_per_share = total_buy_cost / shares
-                cash -= BUY_AMOUNT_PER_TRADE
-                
-                trade_log.append({'Date': current_date, 'Action': 'BUY (Grid)'})
+    take_profit_count = backtest_kernel.count_actions(trades, backtest_kernel.ACTION_TAKE_PROFIT)
+    stop_loss_count = backtest_kernel.count_actions(trades, backtest_kernel.ACTION_STOP_LOSS)
 
     # --- 最终结算与性能指标计算 ---
     
-    final_equity = cash + shares * df['value'].iloc[-1] if not df.empty else initial_capital
-    if equity_values:
-        equity_values[-1] = final_equity
+    final_equity = result['cash'] + result['units'] * values[-1]
+    equity_values = result['equity']
+    equity_values[-1] = final_equity
     
     df_equity = pd.Series(equity_values, index=df['date'])
     df_equity = df_equity.replace(0, np.nan).dropna()
@@ -250,7 +260,7 @@ def run_backtest_v5(df_fund, fund_code):
         '夏普比率': round(sharpe_ratio, 2),
         '策略胜率': round(win_rate, 4),
         '最大回撤修复期 (天)': max_dd_recovery_days,
-        '买入次数': len([t for t in trade_log if 'BUY' in t['Action']]),
+        '买入次数': backtest_kernel.count_actions(trades, backtest_kernel.ACTION_ENTRY, backtest_kernel.ACTION_ADD),
         '止盈次数': take_profit_count,
         '止损次数': stop_loss_count,
     }
@@ -260,9 +270,8 @@ def run_backtest_v5(df_fund, fund_code):
 def load_fund_data(filepath, fund_code):
     """ 加载和清洗数据 """
     try:
-        df = pd.read_csv(filepath)
-    except UnicodeDecodeError:
-        df = pd.read_csv(filepath, encoding='gbk')
+        # 编码探测、列名统一与增量日志合并由共享读取模块完成
+        df = fund_loader.load_fund_frame(filepath, ['date', 'net_value'])
     except Exception as e:
         logging.error(f"加载基金 {filepath} 失败: {e}")
         return None
@@ -351,6 +360,49 @@ def main_backtester():
     else:
         logging.info("没有基金数据满足 V5.0 回测要求 (数据需 > 250 条)。")
 
+def _verify_fund(filepath):
+    """校验单只基金，返回 (基金代码, 回测区间行数, 不一致行数)；数据不足无法回测时行数为 None"""
+    fund_code = os.path.splitext(os.path.basename(filepath))[0]
+    df = load_fund_data(filepath, fund_code)
+    if df is None:
+        return fund_code, None, None
+    df = df[(df['date'] >= BACKTEST_START_DATE) & (df['date'] <= BACKTEST_END_DATE)]
+    return fund_code, len(df), len(verify_indicator_series(df, fund_code))
+
+def main_verify(sample_size=VERIFY_SAMPLE_SIZE):
+    """
+    校验时点指标逐行等于前缀重算的结果。
+    sample_size 只基金按代码均匀抽样 (跳过数据不足的基金直到凑满)；为 None 时多进程校验全部基金。
+    前缀重算是 O(n²) 的 (每只基金约 3 秒)，全量校验约需 1133 只 × 3 秒 / 进程数。
+    任一行不一致或没有可校验的基金时返回 False。
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    csv_files = sorted(glob.glob(os.path.join(FUND_DATA_DIR, '*.csv')))
+    outcomes = []
+    if sample_size is None:
+        with ProcessPoolExecutor() as executor:
+            outcomes = [o for o in executor.map(_verify_fund, csv_files, chunksize=4) if o[1] is not None]
+    else:
+        # 先取等间隔的文件，数据不足被跳过时依次用相邻文件补足
+        step = max(len(csv_files) // sample_size, 1)
+        for i in sorted(range(len(csv_files)), key=lambda i: (i % step, i)):
+            outcome = _verify_fund(csv_files[i])
+            if outcome[1] is None:
+                continue
+            outcomes.append(outcome)
+            logging.info(f"基金 {outcome[0]}: {outcome[1]} 行，不一致 {outcome[2]} 行")
+            if len(outcomes) >= sample_size:
+                break
+
+    failed = [code for code, _, mismatches in outcomes if mismatches]
+    logging.info(f"校验完成: {len(outcomes)} 只基金，共 {sum(o[1] for o in outcomes)} 行，"
+                 f"{len(failed)} 只基金存在不一致{': ' + ', '.join(failed[:20]) if failed else ''}")
+    return bool(outcomes) and not failed
+
 if __name__ == '__main__':
+    if '--verify-all' in sys.argv[1:]:
+        sys.exit(0 if main_verify(sample_size=None) else 1)
+    if '--verify' in sys.argv[1:]:
+        sys.exit(0 if main_verify() else 1)
     main_backtester()
     print("V5.0 回测脚本执行完毕。")
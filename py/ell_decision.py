@@ -2,7 +2,13 @@ import pandas as pd
 import numpy as np
 import os
 import yaml
+import sys
 from datetime import datetime, timedelta
+
+# 共享模块 (fund_loader、index_store 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
+import index_store
 # import pandas_ta as ta # ⚠️ 注意：实际运行环境需要安装 pandas_ta，并取消本行注释
 
 # --- 配置部分 ---
@@ -31,14 +37,13 @@ macd_divergence_window = params.get('macd_divergence_window', 60)
 adx_window = params.get('adx_window', 14) # ADX/ADXR 窗口
 
 # 数据路径
-big_market_path = 'index_data/000300.csv'
 fund_data_dir = 'fund_data/'
 
-# 加载大盘数据
+# 加载大盘数据 (指数存储中的序列已按日期升序)
 try:
-    if os.path.exists(big_market_path):
-        big_market = pd.read_csv(big_market_path, parse_dates=['date'])
-        big_market = big_market.sort_values('date').reset_index(drop=True)
+    index_data = index_store.load_index_store()
+    if index_store.MARKET_INDEX in index_data:
+        big_market = index_data.series(index_store.MARKET_INDEX)
     else:
         # 模拟数据 (大盘: 熊市模拟 - 先小涨后震荡下跌)
         dates = pd.date_range(end=datetime.now(), periods=100, freq='D')
@@ -142,7 +147,8 @@ for code, cost_nav in holdings_config.items():
     
     fund_file = os.path.join(fund_data_dir, f"{code}.csv")
     if os.path.exists(fund_file):
-        fund_df = pd.read_csv(fund_file, parse_dates=['date'])
+        # 合并 fund_data/journal/ 中尚未压实的新行，行序与压实后的主文件一致
+        fund_df = fund_loader.load_fund_frame(fund_file)
     else:
         # 模拟数据 (基金: 震荡下跌模拟)
         dates = pd.date_range(end=datetime.now(), periods=100, freq='D')
@@ -2,12 +2,16 @@ import pandas as pd
 import requests
 from datetime import datetime
 import os
-import time
 from io import StringIO
 from typing import Optional, List
 import logging
 from pathlib import Path
 import re
+import sys
+
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -37,7 +41,7 @@ class FundHoldingsFetcher:
         url = f"{self.base_url}/FundArchivesDatas.aspx?type=jjcc&code={fund_code}&topline=10&year={year}"
         
         try:
-            response = self.session.get(url, timeout=15)
+            response = http_cache.get(url, session=self.session, timeout=15)
             response.raise_for_status()
             
             # 使用 StringIO 包装字符串，避免FutureWarning
@@ -146,9 +150,7 @@ class FundHoldingsFetcher:
                     results['success'] += 1
                 else:
                     results['failed'] += 1
-                
-                # 延时避免被封
-                time.sleep(2)
+
         
         logger.info(f"🎉 批量抓取完成！成功: {results['success']}, 失败: {results['failed']}")
         return results
@@ -1,10 +1,15 @@
 import os
 import re
+import sys
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor
 
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
+
 # --- 配置常量 ---
 BASE_URL = "http://fundf10.eastmoney.com/jjfl_{}.html"
 OUTPUT_DIR = "" # 保持为空，输出到根目录
@@ -126,7 +131,7 @@ def fetch_fund_data(fund_code):
     }
     
     try:
-        response = requests.get(url, headers=headers, timeout=15)
+        response = http_cache.get(url, headers=headers, timeout=15)
         response.encoding = 'utf-8'
         response.raise_for_status() 
 
@@ -12,6 +12,10 @@ import queue
 import os
 import math
 
+# 共享模块 (fund_loader 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
+
 # --- 常量定义 ---
 # 假设年化交易日为252天
 ANNUALIZATION_FACTOR = 252
@@ -71,7 +75,7 @@ def get_jingzhi(strfundcode, strdate):
 def load_local_data(strfundcode, strsdate, stredate):
     """
     从fund_data目录加载基金历史净值数据，适应 CSV 格式：
-    读取：第1列(日期) 和 第3列(累计净值)
+    读取：日期列 和 累计净值列 (按表头识别)
     """
     # 优先尝试 .txt，再尝试 .csv
     data_file = os.path.join('fund_data', f'{strfundcode}.txt')
@@ -80,33 +84,23 @@ def load_local_data(strfundcode, strsdate, stredate):
         if not os.path.exists(data_file):
             return None
 
-    net_values_map = {} # {date: net_value}
-
     try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            for line in lines[1:]: # 跳过第一行表头
-                parts = line.strip().split(',')
-                # 检查至少有3列：日期,单位净值,累计净值
-                if len(parts) >= 3:
-                    date_str = parts[0].strip()
-                    try:
-                        # 从索引 2 读取累计净值
-                        net_value = float(parts[2].strip()) 
-                        net_values_map[date_str] = net_value
-                    except ValueError:
-                        continue
+        # 共享读取模块按表头定位累计净值列，返回升序、按日期去重的数组
+        arrays = fund_loader.load_fund_arrays(data_file, ['cumulative_net_value'])
     except Exception as e:
         return None
-    
-    # 筛选出在指定日期范围内的数据，并按日期排序
-    sorted_dates = sorted([d for d in net_values_map.keys() if strsdate <= d <= stredate])
-    
+
+    # 筛选出在指定日期范围内的有效数据 (数组已按日期升序)
+    dates = arrays['date'].astype(str)
+    values = arrays['cumulative_net_value']
+    in_range = (dates >= strsdate) & (dates <= stredate) & (values == values)
+    sorted_dates = dates[in_range].tolist()
+
     if not sorted_dates:
         return None
 
     # 返回所有在范围内的日期和净值序列
-    return sorted_dates, [net_values_map[d] for d in sorted_dates]
+    return sorted_dates, values[in_range].tolist()
 
 # --- 新增函数：计算简单移动平均 (SMA) ---
 def calculate_moving_average(net_values, period):
@@ -6,6 +6,12 @@ import glob
 import re
 from concurrent.futures import ProcessPoolExecutor, as_completed 
 import io 
+import sys
+
+# 共享模块 (backtest_kernel 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backtest_kernel
+import fund_loader
 
 # -------------------------------------------------------------------
 # 基金适用的技术指标 (V2.9 改进：信号频率控制, 择时定投模拟)
@@ -119,6 +125,28 @@ def generate_all_signals(df):
     
     return df
 
+_EXIT_REASONS = {
+    backtest_kernel.ACTION_STOP_LOSS: 'STOP_LOSS',
+    backtest_kernel.ACTION_TAKE_PROFIT: 'TAKE_PROFIT',
+    backtest_kernel.ACTION_SIGNAL_EXIT: 'STRATEGY_SELL',
+}
+
+def _trades_frame(dates, trades):
+    """将回测内核的交易记录转换为逐笔交易表 (建仓/加仓与清仓事件)"""
+    is_sell = trades['action'] < 0
+    return pd.DataFrame({
+        'date': dates[trades['day']],
+        'type': np.where(is_sell, 'SELL', 'BUY'),
+        'size_change': np.where(is_sell, -trades['units'], trades['units']),
+        'net_value': trades['price'],
+        'reason': [_EXIT_REASONS.get(a, 'STRATEGY_BUY') for a in trades['action']],
+        'is_complete_trade': is_sell,
+        'entry_date': dates[trades['entry_day']],
+        'exit_date': pd.Series(dates[trades['day']]).where(is_sell),
+        'entry_net_value': trades['entry_price'],
+        'pnl_since_entry': np.where(is_sell, (trades['price'] / trades['entry_price'] - 1) * 100, 0.0),
+    })
+
 def backtest_strategy(df, transaction_cost=0.001, stop_loss=-5.0, take_profit=10.0, position_increment=0.5):
     """
     (V2.8 修正) 基于评分信号的分批择时回测。
@@ -128,83 +156,26 @@ def backtest_strategy(df, transaction_cost=0.001, stop_loss=-5.0, take_profit=10
     
     df['daily_return'] = pd.to_numeric(df['daily_return'], errors='coerce')
     
-    positions = [] 
-    trades = [] 
-    
-    position_size = 0.0 
-    entry_value = 0.0 
-    entry_date = None 
-
-    for i in range(len(df)):
-        date = df.loc[i, 'date']
-        net_value = df.loc[i, 'net_value']
-        signal_score = df.loc[i, 'signal_score']
-        action_signal = df.loc[i, 'action_signal'] # V2.9: 使用 action_signal
-
-        action = None
-        exit_reason = None
-        
-        # --- 1. 持仓检查：止损/止盈/清仓 ---
-        if position_size > 0:
-            return_since_entry = (net_value / entry_value - 1) * 100
-            
-            if return_since_entry <= stop_loss:
-                exit_reason = 'STOP_LOSS'
-                action = '卖出 (止损)'
-            elif return_since_entry >= take_profit:
-                exit_reason = 'TAKE_PROFIT'
-                action = '卖出 (止盈)'
-            elif action_signal == '卖出': # V2.9: 触发卖出信号
-                exit_reason = 'STRATEGY_SELL'
-                action = '卖出 (信号)'
-            
-            if exit_reason:
-                exit_value = net_value
-                
-                # 记录清仓交易事件
-                trades.append({
-                    'date': date, 'type': 'SELL', 'size_change': -position_size, 
-                    'net_value': exit_value, 'reason': exit_reason,
-                    'is_complete_trade': True,
-                    'entry_date': entry_date, 'exit_date': date, 
-                    'entry_net_value': entry_value, 'pnl_since_entry': return_since_entry
-                })
-                
-                # 重置仓位状态
-                position_size = 0.0
-                entry_value = 0.0
-                entry_date = None
-        
-        # --- 2. 无/不满仓检查：建仓/加仓 ---
-        if position_size < 1.0:
-            if action_signal == '买入': # V2.9: 触发买入信号 (score >= 6)
-                increment = min(position_increment, 1.0 - position_size) 
-                
-                if position_size == 0.0:
-                    entry_value = net_value 
-                    entry_date = date
-                
-                position_size += increment
-                action = f'买入 (+{increment*100:.0f}%)'
-                
-                # 记录加仓交易事件
-                trades.append({
-                    'date': date, 'type': 'BUY', 'size_change': increment, 
-                    'net_value': net_value, 'reason': 'STRATEGY_BUY',
-                    'is_complete_trade': False,
-                    'entry_date': entry_date, 'exit_date': None, 
-                    'entry_net_value': entry_value, 'pnl_since_entry': 0.0
-                })
-        
-        positions.append(position_size)
-
-    df['position'] = positions
+    # 仓位状态机交给回测内核：止损/止盈相对首次建仓净值，买入信号每次加 position_increment，清仓当日仍可再买入
+    action_signal = df['action_signal'].to_numpy() # V2.9: 使用 action_signal
+    buy_signal = action_signal == '买入'
+    result = backtest_kernel.run(
+        df['net_value'].to_numpy(dtype=np.float64), entry=buy_signal, add=buy_signal, exit=action_signal == '卖出',
+        params={
+            'buy_amount': position_increment,
+            'stop_loss': -stop_loss / 100,
+            'take_profit': take_profit / 100,
+            'cost_basis': backtest_kernel.COST_ENTRY,
+            'sizing': backtest_kernel.SIZING_WEIGHT,
+            'rebuy_on_exit_day': True,
+        })
+    df['position'] = result['position']
+    trades_df = _trades_frame(df['date'].to_numpy(), result['trades'])
     
     # 计算回测收益率
     df['strategy_return'] = df['daily_return'] * df['position'].shift(1) 
     df['strategy_return'].fillna(0, inplace=True) 
 
-    trades_df = pd.DataFrame(trades)
     complete_trades_df = trades_df[trades_df['is_complete_trade']].copy()
     
     if not complete_trades_df.empty:
@@ -338,7 +309,8 @@ def analyze_single_fund(file_path, risk_free_rate_daily_percent, transaction_cos
     【V2.9 修正】：增加定投模拟。
     """
     try:
-        df = pd.read_csv(file_path)
+        # 经共享读取模块读取，合并 fund_data/journal/ 中尚未压实的新行
+        df = fund_loader.load_fund_frame(file_path)
         base_name = os.path.basename(file_path)
         fund_code = os.path.splitext(base_name)[0]
         fund_name = fund_code 
@@ -13,6 +13,10 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 import numpy as np
 
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
+
 # --- 1. 读取 C 类基金代码列表 ---
 try:
     with open('C类.txt', 'r', encoding='utf-8') as f:
@@ -58,7 +62,7 @@ def fetch_fund_holdings(code, season, head):
     MAX_RETRIES = 3
     for attempt in range(MAX_RETRIES):
         try:
-            response = requests.get(url, headers=head, timeout=10)
+            response = http_cache.get(url, headers=head, timeout=10)
             text = response.text
             
             # --- 1. 基金简称提取 (最终稳定版: XPath定位) ---
@@ -119,8 +123,7 @@ def fetch_fund_holdings(code, season, head):
             
         except requests.exceptions.Timeout:
             if attempt < MAX_RETRIES - 1:
-                time.sleep(2) # 超时重试
-                continue
+                continue # 超时重试 (限速器已为该主机减速)
             else:
                 return code, fund_name, []
         except Exception:
@@ -6,6 +6,11 @@ from datetime import datetime
 import pytz
 import logging
 import math
+import sys
+
+# 共享模块 (fund_loader 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
 
 # --- 配置参数 (完整保留) ---
 FUND_DATA_DIR = 'fund_data'
@@ -52,8 +57,8 @@ def validate_fund_data(df, fund_code):
 def load_and_prepare_data(file_path):
     """加载数据，确保格式正确，并计算回报率"""
     try:
-        df = pd.read_csv(file_path)
-        # 统一列名
+        # 编码探测、列名统一与增量日志合并由共享读取模块完成
+        df = fund_loader.load_fund_frame(file_path, ['date', 'net_value'])
         df.columns = [col.lower() for col in df.columns]
         
         # 确保日期是升序排列，这是计算时间序列指标的基础
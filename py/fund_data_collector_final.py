@@ -5,21 +5,24 @@
 # Date:      2021/04/30 19:50
 # Description: 爬取天天基金网指定基金代码的详细信息和持仓数据
 import json
+import os
 import random
 import re
 import sys
-import time
 from collections import OrderedDict
 
 import pandas as pd
 import numpy as np
-import requests
 from bs4 import BeautifulSoup
 from requests.exceptions import RequestException # 引入requests异常
 
 # 显示所有列
 from craw_tools.get_ua import get_ua
 
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
+
 pd.set_option('display.max_columns', None)
 # 显示所有行
 pd.set_option('display.max_rows', None)
@@ -79,7 +82,7 @@ def get_rank_data(url, page_index, max_page, fund_type):
         new_url = url + '?ft=' + fund_type + '&sc=1n&st=desc&pi=' + str(page_index) + '&pn=100&fl=0&isab=1'
         print('正在爬取第 {0} 页数据：{1}'.format(page_index, new_url))
         # 爬取当前页码的数据
-        response = requests.get(url=new_url, headers={'User-Agent': get_ua()}, timeout=10)
+        response = http_cache.get(new_url, headers={'User-Agent': get_ua()}, timeout=10)
         if len(response.text) > 100:
             # 匹配数据并解析
             res_data = re.findall("\[{1}\S+\]{1}", response.text)[0]
@@ -90,9 +93,6 @@ def get_rank_data(url, page_index, max_page, fund_type):
             try_cnt += 1
         page_index += 1
 
-        # 随机休眠3-5 秒
-        time.sleep(random.randint(3, 5))
-
     df_rank_data = pd.DataFrame(rank_data)
     return df_rank_data
 
@@ -194,7 +194,7 @@ def try_craw_info(fund_code, try_cnt):
         fund_pure_code = fund_code[1:] # 去掉 'd'
         position_title_url = f"http://fundf10.eastmoney.com/ccmx_{fund_pure_code}.html"
         print(f'第 {try_cnt} 次尝试，正在爬取基金 {fund_pure_code} 的详细数据中...')
-        response_title = requests.get(url=position_title_url, headers={'User-Agent': get_ua()}, timeout=10)
+        response_title = http_cache.get(position_title_url, headers={'User-Agent': get_ua()}, timeout=10)
         response_title.raise_for_status() # 检查HTTP错误
         rank_detail_info = resolve_rank_detail_info(fund_pure_code, response_title)
         
@@ -205,19 +205,17 @@ def try_craw_info(fund_code, try_cnt):
         # 持仓数据爬取
         position_data_url = f"http://fundf10.eastmoney.com/FundArchivesDatas.aspx?type=jjcc&code={fund_pure_code}&topline=10&year=&month=&rt={random.uniform(0, 1)}"
         print(f'第 {try_cnt} 次尝试，正在爬取基金 {fund_pure_code} 的持仓情况中...')
-        response_data = requests.get(url=position_data_url, headers={'User-Agent': get_ua()}, timeout=10)
+        response_data = http_cache.get(position_data_url, headers={'User-Agent': get_ua()}, timeout=10)
         response_data.raise_for_status() # 检查HTTP错误
         fund_positions_data = resolve_position_info(fund_pure_code, response_data.text)
         
         # 持仓数据可以为空（没有持仓），因此不检查是否为空
-        
-        time.sleep(random.randint(2, 4))
         return rank_detail_info, fund_positions_data
         
     except (RequestException, ValueError, IndexError, Exception) as e:
         # 捕获网络错误、解析错误及其他未预料的错误
-        print(f"❌ 基金 {fund_code[1:]} 数据爬取失败: {type(e).__name__} - {e}，将在 {2*try_cnt} 到 {4*try_cnt} 秒后重试。")
-        time.sleep(random.randint(2*try_cnt, 4*try_cnt))
+        # 重试间隔由 rate_limiter 控制：限流或超时后该主机自动减速
+        print(f"❌ 基金 {fund_code[1:]} 数据爬取失败: {type(e).__name__} - {e}，将重试。")
         # 递归调用重试
         return try_craw_info(fund_code, try_cnt + 1)
 
@@ -254,7 +252,7 @@ def get_position_data(data, rank):
             '''爬取页面，获得该基金的详细数据'''
             position_title_url = f"http://fundf10.eastmoney.com/ccmx_{fund_pure_code}.html"
             print('正在爬取第 {0}/{1} 个基金 {2} 的详细数据中...'.format(row_index+1, len(fund_codes_to_craw), fund_pure_code))
-            response_title = requests.get(url=position_title_url, headers={'User-Agent': get_ua()}, timeout=10)
+            response_title = http_cache.get(position_title_url, headers={'User-Agent': get_ua()}, timeout=10)
             response_title.raise_for_status()
             # 解析基金的详细数据
             rank_detail_info = resolve_rank_detail_info(fund_pure_code, response_title)
@@ -270,7 +268,7 @@ def get_position_data(data, rank):
             position_data_url = f"http://fundf10.eastmoney.com/FundArchivesDatas.aspx?type=jjcc&code={fund_pure_code}&topline=10&year=&month=&rt={random.uniform(0, 1)}"
             print('正在爬取第 {0}/{1} 个基金 {2} 的持仓情况中...'.format(row_index + 1, len(fund_codes_to_craw), fund_pure_code))
             # 解析基金的持仓情况
-            response_data = requests.get(url=position_data_url, headers={'User-Agent': get_ua()}, timeout=10)
+            response_data = http_cache.get(position_data_url, headers={'User-Agent': get_ua()}, timeout=10)
             response_data.raise_for_status()
             fund_positions_data = resolve_position_info(fund_pure_code, response_data.text)
 
@@ -280,9 +278,6 @@ def get_position_data(data, rank):
         except (RequestException, ValueError, IndexError, Exception) as e:
             error_funds_list.append(fund_code)
             print("{0} 数据爬取失败: {1}，稍后会进行重试，请注意！".format(fund_pure_code, type(e).__name__))
-            
-        # 随机休眠2-4 秒
-        time.sleep(random.randint(2, 4))
 
     """爬取失败的进行重试"""
     if error_funds_list:
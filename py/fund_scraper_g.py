@@ -6,6 +6,11 @@ import pandas as pd
 import os
 import time
 import concurrent.futures
+import sys
+
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
 
 # 定义请求头，模拟浏览器访问，提高成功率
 HEADERS = {
@@ -37,7 +42,7 @@ def scrape_fund_info(fund_code):
     print(f"-> 正在抓取基金代码: {fund_code}")
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = http_cache.get(url, headers=HEADERS, timeout=15)
         
         if response.status_code != 200:
             print(f"   警告: 基金 {fund_code} 状态码 {response.status_code}. 跳过.")
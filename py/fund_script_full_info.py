@@ -2,9 +2,13 @@ import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 import os
-import time
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import sys
+
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
 
 # --- 依赖的库: requests, pandas, beautifulsoup4 ---
 OUTPUT_FILE = 'fund_details.csv'
@@ -43,7 +47,7 @@ def fetch_fund_info(fund_code):
 
     try:
         # 增加超时时间到 20 秒，提高请求稳定性
-        response = requests.get(url, headers=headers, timeout=20)
+        response = http_cache.get(url, headers=headers, timeout=20)
         response.raise_for_status() # 检查 HTTP 状态码
         
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -105,12 +109,10 @@ def fetch_fund_info(fund_code):
             details['基金托管人'] = info_map.get('基金托管人', details['基金托管人'])
             
             
-        time.sleep(0.2) # 保持短延迟，降低爬虫频率
         return details
         
     except requests.exceptions.RequestException as e:
         print(f"基金代码 {fund_code} 请求失败: {e}")
-        time.sleep(1) 
         # 发生网络错误时，返回错误信息
         return {
             '基金代码': fund_code,
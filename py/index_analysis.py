@@ -11,6 +11,11 @@ import sys  # 引入sys用于控制标准错误流输出实时日志
 from requests.exceptions import ConnectionError, Timeout, HTTPError, ChunkedEncodingError, TooManyRedirects
 # 导入底层 http 客户端异常，解决 RemoteDisconnected 错误
 import http.client
+import os
+
+# 共享模块 (index_store 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import index_store
 
 # --- 配置 ---
 # 补充后的指数名称到 AkShare 代码的映射
@@ -61,9 +66,40 @@ REQUEST_TIMEOUT = 40  # 延长超时时间
 # --- 配置结束 ---
 
 def fetch_index_data(index_code, start_date):
+    """
+    获取指数自 start_date 起的收盘价。优先使用指数存储中的缓存 (序列名 ak_<代码>)，
+    只向 AkShare 请求缓存最新日期之后缺失的部分。
+    """
+    store = index_store.load_index_store()
+    name = f"ak_{index_code}"
+    meta = store.meta.get(name, {})
+    last_date = store.last_date(name)
+    start_ts = pd.Timestamp(start_date)
+
+    if last_date is None or pd.Timestamp(meta.get('first_date')) > start_ts or pd.Timestamp(last_date) < start_ts:
+        # 缓存缺失或未覆盖起始日期：完整抓取
+        new_df = _fetch_index_data_remote(index_code, start_date)
+    elif last_date < pd.Timestamp.today().date():
+        # 只补抓缓存之后的日期，节假日可能确实没有新数据
+        fetch_start = (pd.Timestamp(last_date) + pd.Timedelta(days=1)).strftime('%Y%m%d')
+        new_df = _fetch_index_data_remote(index_code, fetch_start, allow_empty=True)
+    else:
+        new_df = pd.DataFrame()
+
+    if not new_df.empty:
+        store.update(name, new_df.reset_index().rename(columns={'close': 'net_value'}), source='akshare')
+        store.save()
+
+    cached = store.series(name, start=start_ts)
+    if cached.empty:
+        return pd.DataFrame()
+    return cached.rename(columns={'net_value': 'close'}).set_index('date')
+
+def _fetch_index_data_remote(index_code, start_date, allow_empty=False):
     """
     使用 AkShare 获取指数的日K线收盘价数据，并加入增强的重试机制。
     所有的警告和错误日志将输出到 sys.stderr，实现实时监控。
+    allow_empty=True 时 (增量补抓) 接口返回空数据直接视为无新数据，不再重试。
     """
     for attempt in range(MAX_RETRIES):
         try:
@@ -87,6 +123,8 @@ def fetch_index_data(index_code, start_date):
             if not df.empty:
                 df.rename(columns={'日期': 'date', '收盘': 'close'}, inplace=True)
                 return df[['date', 'close']].set_index('date')
+            elif allow_empty:
+                return pd.DataFrame()
             else:
                 # AkShare 接口返回空数据，通常意味着代码错误或数据源暂不支持
                 raise ValueError("获取数据为空或 AkShare 接口不支持此代码")
@@ -4,12 +4,18 @@ import re
 import os
 import logging
 from datetime import datetime, timedelta, time
-import random
-from io import StringIO
 import requests
 import tenacity
 import concurrent.futures
 import time as time_module
+import sys
+
+# 共享模块 (nav_store 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_manifest
+import index_store
+import indicator_state
+import nav_store
 
 # 配置日志
 logging.basicConfig(
@@ -26,6 +32,12 @@ logger = logging.getLogger(__name__)
 DATA_DIR = 'fund_data'
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
+# 基金清单：本地文件被重写后同步更新
+MANIFEST = fund_manifest.FundManifest(csv_dir=DATA_DIR)
+# 列式存储写入器：重写 CSV 后同步暂存完整历史，运行结束时统一写回分片
+NAV_WRITER = nav_store.NavStoreWriter(csv_dir=DATA_DIR)
+# 持久化的增量指标状态：已有状态的基金只推进窗口中的新增行
+INDICATOR_STATES = indicator_state.IndicatorStateStore()
 
 class MarketMonitor:
     def __init__(self, report_file='analysis_report.md', output_file='market_monitor_report.md'):
@@ -78,7 +90,9 @@ class MarketMonitor:
         file_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
         if os.path.exists(file_path):
             try:
-                df = pd.read_csv(file_path, parse_dates=['date'])
+                # 通过 nav_store 读取，合并尚未压实的增量日志
+                df = nav_store.read_csv_frame(file_path)
+                df['date'] = pd.to_datetime(df['date'])
                 if not df.empty and 'date' in df.columns and 'net_value' in df.columns:
                     logger.info("本地已存在基金 %s 数据，共 %d 行，最新日期为: %s", fund_code, len(df), df['date'].max().date())
                     return df
@@ -90,11 +104,19 @@ class MarketMonitor:
         file_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         df.to_csv(file_path, index=False)
+        # 整体重写后增量日志已并入主文件，需删除并同步清单与列式存储
+        journal = nav_store.journal_path(fund_code, DATA_DIR)
+        if os.path.exists(journal):
+            os.remove(journal)
+        MANIFEST.refresh(fund_code)
+        NAV_WRITER.put(fund_code, df)
+        MANIFEST.save()
         logger.info("基金 %s 数据已成功保存到本地文件: %s", fund_code, file_path)
 
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(5),
-        wait=tenacity.wait_fixed(10),
+        # 重试间隔由 rate_limiter 控制：限流或超时后该主机自动减速，无需再固定等待
+        wait=tenacity.wait_none(),
         retry=tenacity.retry_if_exception_type((requests.exceptions.RequestException, ValueError)),
         before_sleep=lambda retry_state: logger.info(f"重试基金 {retry_state.args[0]}，第 {retry_state.attempt_number} 次")
     )
@@ -102,93 +124,15 @@ class MarketMonitor:
         local_df = self._read_local_data(fund_code)
         latest_local_date = local_df['date'].max().date() if not local_df.empty else None
         
-        # 对比网站最新日期
-        url_check = f"http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={fund_code}&page=1&per=1"
-        logger.info("基金 %s 正在对比本地日期 (%s) 和网站最新日期...", fund_code, latest_local_date if latest_local_date else '无')
-        site_latest_date = None
-
+        # 增量模式只请求本地最新日期之后的区间：返回空表即说明数据已是最新，无需再单独探测网站最新日期
+        logger.info("基金 %s 本地最新日期: %s，开始网络获取...", fund_code, latest_local_date if latest_local_date else '无')
         try:
-            response = requests.get(url_check, headers=self.headers, timeout=15)
-            response.raise_for_status()
-            content_match = re.search(r'content:"(.*?)"', response.text, re.S)
-            if content_match:
-                raw_content_html = content_match.group(1).replace('\\"', '"')
-                tables = pd.read_html(StringIO(raw_content_html))
-                if tables and not tables[0].empty and len(tables[0].columns) >= 1:
-                    site_latest_date_str = tables[0].iloc[0, 0]
-                    site_latest_date = pd.to_datetime(site_latest_date_str, errors='coerce').date()
-                    logger.info("基金 %s 网站最新日期: %s", fund_code, site_latest_date)
+            new_combined_df = index_store.fetch_lsjz_history(fund_code, latest_local_date, headers=self.headers)
         except Exception as e:
-            logger.warning("获取网站最新日期失败: %s", e)
-
-        if latest_local_date and site_latest_date and site_latest_date <= latest_local_date:
-            logger.info("基金 %s 数据已是最新，跳过网络获取。", fund_code)
-            # --- MODIFICATION 1: Increased data limit for calculation ---
-            return local_df.tail(500)[['date', 'net_value']]
-
-        logger.info("基金 %s 开始网络爬取...", fund_code)
-        all_new_data = []
-        page_index = 1
-        
-        while True:
-            url = f"http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={fund_code}&page={page_index}&per=20"
-            logger.info("访问URL: %s", url)
-            
-            try:
-                response = requests.get(url, headers=self.headers, timeout=30)
-                response.raise_for_status()
-                content_match = re.search(r'content:"(.*?)"', response.text, re.S)
-                pages_match = re.search(r'pages:(\d+)', response.text)
-                
-                if not content_match or not pages_match:
-                    logger.error("基金 %s API返回内容格式不正确", fund_code)
-                    break
-
-                raw_content_html = content_match.group(1).replace('\\"', '"')
-                total_pages = int(pages_match.group(1))
-
-                if not raw_content_html.strip():
-                    logger.warning("基金 %s 在第 %d 页返回内容为空", fund_code, page_index)
-                    break
-                    
-                tables = pd.read_html(StringIO(raw_content_html))
-                if not tables:
-                    logger.warning("基金 %s 在第 %d 页未找到数据表格", fund_code, page_index)
-                    break
-                
-                df = tables[0]
-                df.columns = ['date', 'net_value', 'cumulative_net_value', 'daily_growth_rate', 'purchase_status', 'redemption_status', 'dividend']
-                df = df[['date', 'net_value']].copy()
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                df['net_value'] = pd.to_numeric(df['net_value'], errors='coerce')
-                df = df.dropna(subset=['date', 'net_value'])
-                
-                if latest_local_date:
-                    new_df = df[df['date'].dt.date > latest_local_date]
-                    if not new_df.empty:
-                        all_new_data.append(new_df)
-                    if new_df.empty and (df['date'].dt.date.max() <= latest_local_date):
-                        logger.info("基金 %s 已抓取到本地最新数据，增量爬取结束", fund_code)
-                        break
-                else:
-                    all_new_data.append(df)
-                    if len(df) < 20:
-                        break
-
-                logger.info("基金 %s 总页数: %d, 当前页: %d, 当前页行数: %d", fund_code, total_pages, page_index, len(df))
-                if page_index >= total_pages:
-                    logger.info("基金 %s 已获取所有历史数据，共 %d 页", fund_code, total_pages)
-                    break
-                
-                page_index += 1
-                time_module.sleep(random.uniform(1, 2))
-                
-            except Exception as e:
-                logger.error("基金 %s API数据解析失败: %s", fund_code, str(e))
-                raise
+            logger.error("基金 %s API数据解析失败: %s", fund_code, str(e))
+            raise
 
-        if all_new_data:
-            new_combined_df = pd.concat(all_new_data, ignore_index=True)
+        if not new_combined_df.empty:
             df_final = pd.concat([local_df, new_combined_df]).drop_duplicates(subset=['date'], keep='last').sort_values(by='date', ascending=True)
             self._save_to_local_file(fund_code, df_final)
             # --- MODIFICATION 2: Increased data limit for calculation ---
@@ -211,31 +155,38 @@ class MarketMonitor:
                     'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
                 }
             df = df.sort_values(by='date', ascending=True)
-            exp12 = df['net_value'].ewm(span=12, adjust=False).mean()
-            exp26 = df['net_value'].ewm(span=26, adjust=False).mean()
-            df['macd'] = exp12 - exp26
-            df['signal'] = df['macd'].ewm(span=9, adjust=False).mean()
-            window = 20
-            df['bb_mid'] = df['net_value'].rolling(window=window, min_periods=1).mean()
-            df['bb_std'] = df['net_value'].rolling(window=window, min_periods=1).std()
-            df['bb_upper'] = df['bb_mid'] + (df['bb_std'] * 2)
-            df['bb_lower'] = df['bb_mid'] - (df['bb_std'] * 2)
-            delta = df['net_value'].diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(window=14, min_periods=1).mean()
-            avg_loss = loss.rolling(window=14, min_periods=1).mean()
-            rs = avg_gain / avg_loss.replace(0, np.nan)
-            rsi = 100 - (100 / (1 + rs))
-
-            df['MA50'] = df['net_value'].rolling(window=50, min_periods=1).mean()
-            ma_ratio = (df['net_value'].iloc[-1] / df['MA50'].iloc[-1]) if not df['MA50'].iloc[-1] == 0 else np.nan
-
-            latest_net_value = df['net_value'].iloc[-1]
-            latest_rsi = rsi.iloc[-1]
-            macd_diff = df['macd'].iloc[-1] - df['signal'].iloc[-1]
-            bb_upper = df['bb_upper'].iloc[-1]
-            bb_lower = df['bb_lower'].iloc[-1]
+            latest = INDICATOR_STATES.latest_row(fund_code, df)
+            if latest is not None and latest['length'] >= 26:
+                latest_net_value, latest_rsi, ma_ratio = latest['net_value'], latest['rsi'], latest['ma_ratio']
+                macd_diff = latest['macd'] - latest['signal']
+                bb_upper, bb_lower = latest['bb_upper'], latest['bb_lower']
+            else:
+                # 尚无状态或状态与窗口不衔接时，按窗口重新计算
+                exp12 = df['net_value'].ewm(span=12, adjust=False).mean()
+                exp26 = df['net_value'].ewm(span=26, adjust=False).mean()
+                df['macd'] = exp12 - exp26
+                df['signal'] = df['macd'].ewm(span=9, adjust=False).mean()
+                window = 20
+                df['bb_mid'] = df['net_value'].rolling(window=window, min_periods=1).mean()
+                df['bb_std'] = df['net_value'].rolling(window=window, min_periods=1).std()
+                df['bb_upper'] = df['bb_mid'] + (df['bb_std'] * 2)
+                df['bb_lower'] = df['bb_mid'] - (df['bb_std'] * 2)
+                delta = df['net_value'].diff()
+                gain = delta.where(delta > 0, 0)
+                loss = -delta.where(delta < 0, 0)
+                avg_gain = gain.rolling(window=14, min_periods=1).mean()
+                avg_loss = loss.rolling(window=14, min_periods=1).mean()
+                rs = avg_gain / avg_loss.replace(0, np.nan)
+                rsi = 100 - (100 / (1 + rs))
+
+                df['MA50'] = df['net_value'].rolling(window=50, min_periods=1).mean()
+                ma_ratio = (df['net_value'].iloc[-1] / df['MA50'].iloc[-1]) if not df['MA50'].iloc[-1] == 0 else np.nan
+
+                latest_net_value = df['net_value'].iloc[-1]
+                latest_rsi = rsi.iloc[-1]
+                macd_diff = df['macd'].iloc[-1] - df['signal'].iloc[-1]
+                bb_upper = df['bb_upper'].iloc[-1]
+                bb_lower = df['bb_lower'].iloc[-1]
             
             advice = "观察"
             action_signal = "N/A"
@@ -333,6 +284,8 @@ class MarketMonitor:
                             'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
                         })
 
+            NAV_WRITER.flush()
+            INDICATOR_STATES.save()
             self._generate_report(results)
             
         except Exception as e:
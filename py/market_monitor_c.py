@@ -4,12 +4,18 @@ import re
 import os
 import logging
 from datetime import datetime, timedelta, time
-import random
-from io import StringIO
 import requests
 import tenacity
 import concurrent.futures
-import time as time_module
+import sys
+
+# 共享模块 (nav_store 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
+import fund_manifest
+import index_store
+import indicator_state
+import nav_store
 
 # 配置日志
 logging.basicConfig(
@@ -26,6 +32,12 @@ logger = logging.getLogger(__name__)
 DATA_DIR = 'fund_data'
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
+# 基金清单：预加载阶段据此判断本地数据是否最新，无需逐个解析 CSV
+MANIFEST = fund_manifest.FundManifest(csv_dir=DATA_DIR)
+# 列式存储写入器：重写 CSV 后同步暂存完整历史，运行结束时统一写回分片
+NAV_WRITER = nav_store.NavStoreWriter(csv_dir=DATA_DIR)
+# 持久化的增量指标状态：已有状态的基金只推进窗口中的新增行，EWM 不再每次从窗口起点重算
+INDICATOR_STATES = indicator_state.IndicatorStateStore()
 
 class MarketMonitor:
     # 修复: 默认报告文件改为 'result_C类.txt'
@@ -45,11 +57,11 @@ class MarketMonitor:
 
     def _load_index_data(self):
         """加载大盘数据"""
-        index_file = os.path.join('index_data', '000300.csv')
-        if os.path.exists(index_file):
+        store = index_store.load_index_store()
+        if index_store.MARKET_INDEX in store:
             try:
-                self.index_data = pd.read_csv(index_file, parse_dates=['date'])
-                self.index_data = self.index_data.sort_values(by='date', ascending=True).reset_index(drop=True)
+                # 指数存储中的序列已按日期升序
+                self.index_data = store.series(index_store.MARKET_INDEX)
                 logger.info("大盘数据加载成功，共 %d 行，最新日期: %s", len(self.index_data), self.index_data['date'].max().date())
                 # 计算大盘指标
                 self.index_indicators = self._calculate_indicators(self.index_data)
@@ -61,7 +73,7 @@ class MarketMonitor:
                 logger.error("加载大盘数据失败: %s", e)
                 self.index_data = pd.DataFrame()
         else:
-            logger.warning("大盘数据文件不存在: %s", index_file)
+            logger.warning("指数存储中没有大盘数据: %s", index_store.MARKET_INDEX)
             self.index_data = pd.DataFrame()
 
     def _get_index_market_trend(self):
@@ -147,7 +159,9 @@ class MarketMonitor:
         file_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
         if os.path.exists(file_path):
             try:
-                df = pd.read_csv(file_path, parse_dates=['date'])
+                # 通过 nav_store 读取，合并尚未压实的增量日志
+                df = nav_store.read_csv_frame(file_path)
+                df['date'] = pd.to_datetime(df['date'])
                 if not df.empty and 'date' in df.columns and 'net_value' in df.columns:
                     df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
                     logger.info("本地已存在基金 %s 数据，共 %d 行，最新日期为: %s", fund_code, len(df), df['date'].max().date())
@@ -161,101 +175,41 @@ class MarketMonitor:
         file_path = os.path.join(DATA_DIR, f"{fund_code}.csv")
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         df.to_csv(file_path, index=False)
+        # 整体重写后增量日志已并入主文件，需删除并同步清单与列式存储
+        journal = nav_store.journal_path(fund_code, DATA_DIR)
+        if os.path.exists(journal):
+            os.remove(journal)
+        MANIFEST.refresh(fund_code)
+        NAV_WRITER.put(fund_code, df)
         logger.info("基金 %s 数据已成功保存到本地文件: %s", fund_code, file_path)
 
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(5),
-        wait=tenacity.wait_fixed(10),
+        # 重试间隔由 rate_limiter 控制：限流或超时后该主机自动减速，无需再固定等待
+        wait=tenacity.wait_none(),
         retry=tenacity.retry_if_exception_type((requests.exceptions.RequestException, ValueError)),
         before_sleep=lambda retry_state: logger.info(f"重试基金 {retry_state.args[0]}，第 {retry_state.attempt_number} 次")
     )
     def _fetch_fund_data(self, fund_code, latest_local_date=None):
         """
         从网络获取基金数据，实现真正的增量更新。
-        如果 latest_local_date 不为空，则只获取其之后的数据。
+        如果 latest_local_date 不为空，则按日期区间只请求其之后的数据 (通常一次请求)；
+        否则逐页回填全部历史。
         """
-        all_new_data = []
-        page_index = 1
-        has_new_data = False
-        
-        while True:
-            url = f"http://fundf10.eastmoney.com/F10DataApi.aspx?type=lsjz&code={fund_code}&page={page_index}&per=20"
-            logger.info("正在获取基金 %s 的第 %d 页数据...", fund_code, page_index)
-            
-            try:
-                response = requests.get(url, headers=self.headers, timeout=30)
-                response.raise_for_status()
-                
-                content_match = re.search(r'content:"(.*?)"', response.text, re.S)
-                pages_match = re.search(r'pages:(\d+)', response.text)
-                
-                if not content_match or not pages_match:
-                    logger.error("基金 %s API返回内容格式不正确，可能已无数据或接口变更", fund_code)
-                    break
-
-                raw_content_html = content_match.group(1).replace('\\"', '"')
-                total_pages = int(pages_match.group(1))
-                
-                tables = pd.read_html(StringIO(raw_content_html))
-                
-                if not tables:
-                    logger.warning("基金 %s 在第 %d 页未找到数据表格，爬取结束", fund_code, page_index)
-                    break
-                
-                df_page = tables[0]
-                df_page.columns = ['date', 'net_value', 'cumulative_net_value', 'daily_growth_rate', 'purchase_status', 'redemption_status', 'dividend']
-                df_page = df_page[['date', 'net_value']].copy()
-                df_page['date'] = pd.to_datetime(df_page['date'], errors='coerce')
-                df_page['net_value'] = pd.to_numeric(df_page['net_value'], errors='coerce')
-                df_page = df_page.dropna(subset=['date', 'net_value'])
-                
-                # 如果是增量更新模式，检查是否已获取到本地最新数据之前的数据
-                if latest_local_date:
-                    new_df_page = df_page[df_page['date'].dt.date > latest_local_date]
-                    if new_df_page.empty:
-                        # 如果当前页没有新数据，且之前已经发现过新数据，则停止爬取
-                        if has_new_data:
-                            logger.info("基金 %s 已获取所有新数据，爬取结束。", fund_code)
-                            break
-                        # 如果当前页没有新数据，且是第一页，则说明没有新数据
-                        elif page_index == 1:
-                            logger.info("基金 %s 无新数据，爬取结束。", fund_code)
-                            break
-                    else:
-                        has_new_data = True
-                        all_new_data.append(new_df_page)
-                        logger.info("第 %d 页: 发现 %d 行新数据", page_index, len(new_df_page))
-                else:
-                    # 如果是首次下载，则获取所有数据
-                    all_new_data.append(df_page)
-
-                logger.info("基金 %s 总页数: %d, 当前页: %d, 当前页行数: %d", fund_code, total_pages, page_index, len(df_page))
-                
-                # 如果是增量更新模式，且当前页数据比最新数据日期早，则结束循环
-                if latest_local_date and (df_page['date'].dt.date <= latest_local_date).any():
-                    logger.info("基金 %s 已追溯到本地数据，增量爬取结束。", fund_code)
-                    break
-
-                if page_index >= total_pages:
-                    logger.info("基金 %s 已获取所有历史数据，共 %d 页，爬取结束", fund_code, total_pages)
-                    break
-                
-                page_index += 1
-                time_module.sleep(random.uniform(1, 2))  # 延长sleep到1-2秒，减少限速风险
-                
-            except requests.exceptions.RequestException as e:
-                logger.error("基金 %s API请求失败: %s", fund_code, str(e))
-                raise
-            except Exception as e:
-                logger.error("基金 %s API数据解析失败: %s", fund_code, str(e))
-                raise
+        try:
+            new_df = index_store.fetch_lsjz_history(fund_code, latest_local_date, headers=self.headers)
+        except requests.exceptions.RequestException as e:
+            logger.error("基金 %s API请求失败: %s", fund_code, str(e))
+            raise
+        except Exception as e:
+            logger.error("基金 %s API数据解析失败: %s", fund_code, str(e))
+            raise
 
-        # 合并新数据并返回
-        if all_new_data:
-            new_combined_df = pd.concat(all_new_data, ignore_index=True)
-            return new_combined_df[['date', 'net_value']]
-        else:
+        if new_df.empty:
+            logger.info("基金 %s 无新数据。", fund_code)
             return pd.DataFrame()
+        logger.info("基金 %s 获取到 %d 行新数据", fund_code, len(new_df))
+        return new_df[['date', 'net_value']]
 
     def _calculate_indicators(self, df):
         """计算技术指标并生成结果字典"""
@@ -296,15 +250,17 @@ class MarketMonitor:
     def _get_latest_signals(self, fund_code, df):
         """根据最新数据计算信号，结合大盘趋势调整"""
         try:
-            processed_df = self._calculate_indicators(df)
-            if processed_df is None:
-                logger.warning("基金 %s 数据不足，跳过计算", fund_code)
-                return {
-                    'fund_code': fund_code, 'latest_net_value': "数据获取失败", 'rsi': np.nan, 'ma_ratio': np.nan,
-                    'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
-                }
-            
-            latest_data = processed_df.iloc[-1]
+            latest_data = INDICATOR_STATES.latest_row(fund_code, df)
+            if latest_data is None or latest_data['length'] < 26:
+                # 尚无状态或状态与窗口不衔接时，按窗口重新计算
+                processed_df = self._calculate_indicators(df)
+                if processed_df is None:
+                    logger.warning("基金 %s 数据不足，跳过计算", fund_code)
+                    return {
+                        'fund_code': fund_code, 'latest_net_value': "数据获取失败", 'rsi': np.nan, 'ma_ratio': np.nan,
+                        'macd_diff': np.nan, 'bb_upper': np.nan, 'bb_lower': np.nan, 'advice': "观察", 'action_signal': 'N/A'
+                    }
+                latest_data = processed_df.iloc[-1]
             latest_net_value = latest_data['net_value']
             latest_rsi = latest_data['rsi']
             latest_ma50_ratio = latest_data['ma_ratio']
@@ -416,18 +372,18 @@ class MarketMonitor:
         expected_latest_date = self._get_expected_latest_date()
         min_data_points = 26  # 确保有足够数据计算技术指标
 
+        fresh_codes = []
         for fund_code in self.fund_codes:
-            local_df = self._read_local_data(fund_code)
+            # 先查清单中的最新日期和行数，只有数据已最新时才读取本地文件
+            latest_local_date = MANIFEST.latest_date(fund_code)
+            data_points = MANIFEST.row_count(fund_code)
             
-            if not local_df.empty:
-                latest_local_date = local_df['date'].max().date()
-                data_points = len(local_df)
-                
+            if latest_local_date is not None:
                 # 检查数据是否最新且完整
                 if latest_local_date >= expected_latest_date and data_points >= min_data_points:
                     logger.info("基金 %s 的本地数据已是最新 (%s, 期望: %s) 且数据量足够 (%d 行)，直接加载。",
                                  fund_code, latest_local_date, expected_latest_date, data_points)
-                    self.fund_data[fund_code] = self._get_latest_signals(fund_code, local_df.tail(100))
+                    fresh_codes.append(fund_code)
                     continue
                 else:
                     if latest_local_date < expected_latest_date:
@@ -441,6 +397,14 @@ class MarketMonitor:
             
             fund_codes_to_fetch.append(fund_code)
 
+        # 已是最新的基金只读取文件开头最近 100 行 (CSV 为降序)，无需解析完整历史
+        windows = fund_loader.load_heads(fresh_codes, n_rows=100, csv_dir=DATA_DIR)
+        for fund_code in fresh_codes:
+            if fund_code in windows:
+                self.fund_data[fund_code] = self._get_latest_signals(fund_code, pd.DataFrame(windows[fund_code]))
+            else:
+                fund_codes_to_fetch.append(fund_code)
+
         # 步骤3: 多线程网络下载和处理
         if fund_codes_to_fetch:
             logger.info("开始使用多线程获取 %d 个基金的新数据...", len(fund_codes_to_fetch))
@@ -461,6 +425,9 @@ class MarketMonitor:
                         }
         else:
             logger.info("所有基金数据均来自本地缓存，无需网络下载。")
+        MANIFEST.save()
+        NAV_WRITER.flush()
+        INDICATOR_STATES.save()
         
         if len(self.fund_data) > 0:
             logger.info("所有基金数据处理完成。")
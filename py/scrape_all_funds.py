@@ -5,10 +5,13 @@ from bs4 import BeautifulSoup
 import csv
 import datetime
 import pytz
-import random
-import time
 from concurrent.futures import ThreadPoolExecutor
 import re
+import sys
+
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
 
 # subprocess 已移除，因为不再进行 Git 操作
 # ==================== 配置 ====================
@@ -32,15 +35,12 @@ HEADERS = {
 
 def scrape_and_parse_fund(fund_code):
     """抓取单只基金的概况 + 费率 + 基金经理信息，返回 dict"""
-    # 随机延时防封
-    time.sleep(random.uniform(0.15, 0.6))
-
     result = {'基金代码': fund_code, '状态': '成功'}
 
     # ---------- 1. 基本概况 (jbgk) ----------
     jbgk_url = f"https://fundf10.eastmoney.com/jbgk_{fund_code}.html"
     try:
-        r = requests.get(jbgk_url, headers=HEADERS, timeout=12)
+        r = http_cache.get(jbgk_url, headers=HEADERS, timeout=12)
         if r.status_code != 200:
             result['状态_概况'] = f"抓取失败: 概况页 {r.status_code}"
         else:
@@ -65,7 +65,7 @@ def scrape_and_parse_fund(fund_code):
     # ---------- 2. 费率 (jjfl) ----------
     fee_url = f"https://fundf10.eastmoney.com/jjfl_{fund_code}.html"
     try:
-        r = requests.get(fee_url, headers=HEADERS, timeout=12)
+        r = http_cache.get(fee_url, headers=HEADERS, timeout=12)
         if r.status_code != 200:
             result['状态_费率'] = f"抓取失败: 费率页 {r.status_code}"
         else:
@@ -112,7 +112,7 @@ def scrape_and_parse_fund(fund_code):
     # ---------- 3. 基金经理信息 (jjjl) ----------
     manager_url = f"https://fundf10.eastmoney.com/jjjl_{fund_code}.html"
     try:
-        r = requests.get(manager_url, headers=HEADERS, timeout=12)
+        r = http_cache.get(manager_url, headers=HEADERS, timeout=12)
         if r.status_code != 200:
             result['状态_经理'] = f"抓取失败: 经理页 {r.status_code}"
         else:
@@ -1,4 +1,3 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import re
@@ -6,6 +5,11 @@ import os
 import glob
 from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import sys
+
+# 共享模块 (http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_cache
 
 # --- 配置 ---
 HEADERS = {
@@ -173,7 +177,7 @@ def scrape_fund_data(fund_code, history_df, history_basic_info):
     print(f"\n-> 准备处理基金代码: {fund_code_str}")
     
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        response = http_cache.get(url, headers=HEADERS, timeout=15)
         response.encoding = 'utf-8' 
         if response.status_code != 200:
             print(f"   ❌ 请求失败，状态码: {response.status_code} - {fund_code_str}")
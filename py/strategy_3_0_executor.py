@@ -2,8 +2,13 @@ import pandas as pd
 import numpy as np
 import yaml
 import os
+import sys
 from datetime import datetime
 
+# 共享模块 (fund_loader 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fund_loader
+
 # --- 辅助函数：加载数据 ---
 def load_config(config_path='holdings_config.yaml'):
     """加载配置文件并返回持仓数据。"""
@@ -20,8 +25,8 @@ def load_fund_data(code, data_dir='fund_data/'):
     """加载基金净值数据。"""
     fund_file = os.path.join(data_dir, f"{code}.csv")
     if os.path.exists(fund_file):
-        # 假设 fund_data 目录存在且文件包含 'date' 和 'net_value' 列
-        fund_df = pd.read_csv(fund_file, parse_dates=['date'])
+        # 假设 fund_data 目录存在且文件包含 'date' 和 'net_value' 列；增量日志中的新行一并读取
+        fund_df = fund_loader.load_fund_frame(fund_file)
         fund_df = fund_df.sort_values('date').reset_index(drop=True)
         return fund_df
     else:
@@ -0,0 +1,388 @@
+"""
+V5 策略参数扫描 (Parameter Sweep)
+
+对 backtester_v5 的网格补仓策略批量评估参数组合，取代手工修改常量后重跑：
+
+    rsi_buy              网格补仓的 RSI(6) 阈值 (RSI_BUY_THRESHOLD)
+    grid_step            相对平均成本的补仓步长 (GRID_STEP_PERCENT)
+    stop_loss            止损比例 (STOP_LOSS_PERCENT)
+    take_profit          止盈比例 (STOP_PROFIT_PERCENT)
+    trend_ratio_min      MA50/MA250 安全垫 (TREND_RATIO_MIN)
+    rsi14_entry          建仓要求 RSI(14) 不高于该值 (analyzer_V5 的 EXTREME_RSI_THRESHOLD_P1，100 为不限制)
+    min_month_drawdown   建仓要求近 1 月最大回撤不低于该值 (analyzer_V5 的 MIN_MONTH_DRAWDOWN，0 为不限制)
+
+全部参数取 backtester_v5 当前常量 (建仓门槛不限制) 时，逐基金结果与 run_backtest_v5 相同。
+
+执行流程：主进程一次性计算所有基金的时点指标，把列数组写入一块共享内存；
+进程池的各 worker 只挂载这块内存，每个任务只传一个参数字典，不再逐任务序列化 DataFrame。
+每完成一组参数即向结果表 (CSV) 追加一行并刷新；参数组合以 (参数 + 数据集) 的哈希去重，
+重复运行时跳过结果表中已有的哈希，中断后可直接续跑。
+
+命令行：
+    python py/sweep_v5.py                                  # 网格搜索 DEFAULT_SPACE
+    python py/sweep_v5.py --random 200 --seed 1            # 在同一空间随机抽样 200 组
+    python py/sweep_v5.py --space my_space.json --workers 8
+    python py/sweep_v5.py --verify                         # 抽样比对默认参数与 run_backtest_v5
+"""
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# 共享模块 (backtest_kernel 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backtest_kernel
+import backtester_v5
+
+# ================= 配置区 =================
+FUND_DATA_DIR = backtester_v5.FUND_DATA_DIR
+RESULTS_FILE = 'sweep_v5_results.csv'
+MAX_WORKERS = os.cpu_count() or 1
+TOP_N = 20                      # 结束时打印的最优参数组数
+RANK_BY = 'mean_return'         # 排序指标
+
+DEFAULT_PARAMS = {
+    'rsi_buy': backtester_v5.RSI_BUY_THRESHOLD,
+    'grid_step': backtester_v5.GRID_STEP_PERCENT,
+    'stop_loss': backtester_v5.STOP_LOSS_PERCENT,
+    'take_profit': backtester_v5.STOP_PROFIT_PERCENT,
+    'trend_ratio_min': backtester_v5.TREND_RATIO_MIN,
+    'rsi14_entry': 100.0,
+    'min_month_drawdown': 0.0,
+}
+
+DEFAULT_SPACE = {
+    'rsi_buy': [20.0, 25.0, 30.0, 35.0],
+    'grid_step': [0.03, 0.04, 0.05, 0.06],
+    'stop_loss': [0.06, 0.08, 0.10],
+    'take_profit': [0.10, 0.15, 0.20],
+    'trend_ratio_min': [0.90, 0.95, 1.00],
+    'rsi14_entry': [100.0, 35.0, 29.0],
+    'min_month_drawdown': [0.0, 0.06],
+}
+
+# 共享内存中的特征列 (float64，各基金首尾相接)
+FEATURES = ('value', 'rsi_6', 'rsi_14', 'ma_ratio', 'trend_down', 'month_mdd')
+RSI_ENTRY_SPAN = 14             # 与 analyzer_V5 的 RSI(14) 相同：span-EWM (adjust=False)
+MDD_MONTHS = 1
+# ==========================================
+
+RESULT_COLUMNS = ['param_hash', 'dataset', *DEFAULT_PARAMS, 'funds', 'mean_return', 'median_return',
+                  'mean_max_drawdown', 'win_rate', 'buys', 'take_profits', 'stop_losses', 'seconds']
+
+
+def param_hash(params, dataset):
+    """参数组合 (数值统一为 float 并保留 10 位小数) 与数据集签名的哈希"""
+    canonical = {k: round(float(params[k]), 10) for k in sorted(params)}
+    payload = json.dumps({'params': canonical, 'dataset': dataset}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def grid_space(space):
+    """网格搜索：space 中各参数取值的笛卡尔积，未列出的参数取 DEFAULT_PARAMS"""
+    names = list(space)
+    for combo in itertools.product(*(space[n] for n in names)):
+        yield {**DEFAULT_PARAMS, **dict(zip(names, combo))}
+
+
+def random_space(space, n_samples, seed=None):
+    """随机搜索：每个参数独立地从 space 的取值中抽样 (列表) 或在 [lo, hi] 内均匀抽样 (含 'range' 的字典)"""
+    rng = random.Random(seed)
+    for _ in range(n_samples):
+        params = dict(DEFAULT_PARAMS)
+        for name, choices in space.items():
+            if isinstance(choices, dict):
+                lo, hi = choices['range']
+                params[name] = round(rng.uniform(lo, hi), 4)
+            else:
+                params[name] = rng.choice(choices)
+        yield params
+
+
+# --- 特征准备 (主进程) ---
+
+def _rsi_ewm(values, span):
+    delta = pd.Series(values).diff()
+    gain = delta.where(delta > 0, 0).ewm(span=span, adjust=False).mean()
+    loss = (-delta.where(delta < 0, 0)).ewm(span=span, adjust=False).mean()
+    rs = gain / loss.replace(0, 1e-10)
+    return (100 - 100 / (1 + rs)).to_numpy()
+
+
+def _month_max_drawdown(dates, values):
+    """每个交易日的近一个月 (日期 >= 当日 - 1 个月) 最大回撤，窗口不足 2 个净值时为 0"""
+    index = pd.DatetimeIndex(dates)
+    starts = np.searchsorted(index.values, (index - pd.DateOffset(months=MDD_MONTHS)).values)
+    width = int((np.arange(len(values)) - starts).max()) + 1
+    padded = np.concatenate([np.full(width - 1, np.nan), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, width)
+    # 窗口内第 k 列对应行号 i - width + 1 + k，早于窗口起点的置为 NaN
+    rows = np.arange(len(values))[:, None] - width + 1 + np.arange(width)
+    windows = np.where(rows >= starts[:, None], windows, np.nan)
+    running_max = np.fmax.accumulate(windows, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mdd = np.nanmax(np.where(np.isnan(windows), -np.inf, (running_max - windows) / running_max), axis=1)
+    counts = np.arange(len(values)) - starts + 1
+    return np.where(counts >= 2, mdd, 0.0)
+
+
+def fund_features(df_fund, fund_code='', start=backtester_v5.BACKTEST_START_DATE, end=backtester_v5.BACKTEST_END_DATE):
+    """
+    单只基金在 [start, end] (为 None 时不限) 内的时点特征，返回 (日期数组, 形状 (len(FEATURES), 行数) 的数组)；
+    数据不足时返回 None。
+    """
+    df = backtester_v5.prepare_backtest_frame(df_fund, fund_code, start, end)
+    if df is None:
+        return None
+    # RSI(14) 与近 1 月回撤按区间内的完整序列计算，再与 prepare_backtest_frame 去掉的前导行对齐
+    window = df_fund
+    if start is not None:
+        window = window[window['date'] >= start]
+    if end is not None:
+        window = window[window['date'] <= end]
+    full_values = window['value'].to_numpy(dtype=np.float64)
+    lead = len(full_values) - len(df)
+    return df['date'].to_numpy(dtype='datetime64[D]'), np.vstack([
+        df['value'].to_numpy(dtype=np.float64),
+        df['RSI(6)'].to_numpy(dtype=np.float64),
+        _rsi_ewm(full_values, RSI_ENTRY_SPAN)[lead:],
+        df['MA50/MA250'].to_numpy(dtype=np.float64),
+        (df['MA50/MA250趋势'].to_numpy() == '向下').astype(np.float64),
+        _month_max_drawdown(window['date'].to_numpy(), full_values)[lead:],
+    ])
+
+
+def prepare_feature_table(csv_files, start=backtester_v5.BACKTEST_START_DATE, end=backtester_v5.BACKTEST_END_DATE):
+    """
+    逐基金计算回测所需的时点特征，返回 (codes, offsets, matrix, dates)：
+    matrix 形状 (len(FEATURES), 总行数)，第 j 只基金占 offsets[j]:offsets[j+1] 列，dates 为对应日期。
+    """
+    codes, columns, dates = [], [], []
+    for filepath in csv_files:
+        fund_code = os.path.splitext(os.path.basename(filepath))[0]
+        df_fund = backtester_v5.load_fund_data(filepath, fund_code)
+        if df_fund is None:
+            continue
+        features = fund_features(df_fund, fund_code, start, end)
+        if features is None:
+            continue
+        codes.append(fund_code)
+        dates.append(features[0])
+        columns.append(features[1])
+    offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([c.shape[1] for c in columns])
+    matrix = np.hstack(columns) if columns else np.empty((len(FEATURES), 0))
+    dates = np.concatenate(dates) if dates else np.array([], dtype='datetime64[D]')
+    return codes, offsets, matrix, dates
+
+
+def prepare_features(csv_files):
+    """回测周期内的特征表，返回 (codes, offsets, matrix)，见 prepare_feature_table"""
+    codes, offsets, matrix, _ = prepare_feature_table(csv_files)
+    return codes, offsets, matrix
+
+
+def dataset_signature(codes, offsets, matrix):
+    """数据集签名：基金代码、行数与净值内容的摘要，数据变化后旧结果不再被去重命中"""
+    digest = hashlib.sha1()
+    digest.update(','.join(codes).encode('utf-8'))
+    digest.update(offsets.tobytes())
+    digest.update(np.ascontiguousarray(matrix[0]).tobytes())
+    return f"{backtester_v5.BACKTEST_START_DATE}_{backtester_v5.BACKTEST_END_DATE}_{digest.hexdigest()[:12]}"
+
+
+# --- 评估 (worker) ---
+
+_SHARED = {}
+
+
+def _attach(shm_name, shape, offsets):
+    """进程池 initializer：挂载共享内存并建立只读视图"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    matrix.flags.writeable = False
+    _SHARED.update(shm=shm, offsets=offsets, features=dict(zip(FEATURES, matrix)))
+
+
+def evaluate_fund(features, start, stop, params):
+    """对单只基金 [start, stop) 区间运行一组参数，返回 (总收益率, 最大回撤, 买入次数, 止盈次数, 止损次数)"""
+    values = features['value'][start:stop]
+    add = backtester_v5.grid_add_signal(features['rsi_6'][start:stop], features['ma_ratio'][start:stop],
+                                        features['trend_down'][start:stop] > 0,
+                                        params['rsi_buy'], params['trend_ratio_min'])
+    entry = ((features['month_mdd'][start:stop] >= params['min_month_drawdown']) &
+             (features['rsi_14'][start:stop] <= params['rsi14_entry']))
+    result = backtest_kernel.run(values, entry, add, params={
+        **backtester_v5.GRID_PARAMS,
+        'stop_loss': params['stop_loss'],
+        'take_profit': params['take_profit'],
+        'grid_step': params['grid_step'],
+    })
+    initial_capital = backtester_v5.INITIAL_CAPITAL
+    equity = result['equity']
+    equity[-1] = result['cash'] + result['units'] * values[-1]
+    running_max = np.maximum.accumulate(equity)
+    trades = result['trades']
+    return (
+        (equity[-1] - initial_capital) / initial_capital,
+        float(((running_max - equity) / running_max).max()),
+        backtest_kernel.count_actions(trades, backtest_kernel.ACTION_ENTRY, backtest_kernel.ACTION_ADD),
+        backtest_kernel.count_actions(trades, backtest_kernel.ACTION_TAKE_PROFIT),
+        backtest_kernel.count_actions(trades, backtest_kernel.ACTION_STOP_LOSS),
+    )
+
+
+def evaluate(params, bounds=None):
+    """
+    worker 任务：在共享内存中的基金上评估一组参数，返回汇总指标。
+    bounds 为 (starts, stops) 时只评估这些列区间 (如滚动窗口内的各基金)，缺省为全部基金的完整区间。
+    """
+    start_time = time.perf_counter()
+    offsets, features = _SHARED['offsets'], _SHARED['features']
+    starts, stops = bounds if bounds is not None else (offsets[:-1], offsets[1:])
+    rows = np.array([evaluate_fund(features, a, b, params) for a, b in zip(starts, stops)])
+    if len(rows) == 0:
+        rows = np.empty((0, 5))
+    take_profits, stop_losses = int(rows[:, 3].sum()), int(rows[:, 4].sum())
+    return {
+        'funds': len(rows),
+        'mean_return': float(rows[:, 0].mean()) if len(rows) else np.nan,
+        'median_return': float(np.median(rows[:, 0])) if len(rows) else np.nan,
+        'mean_max_drawdown': float(rows[:, 1].mean()) if len(rows) else np.nan,
+        'win_rate': take_profits / (take_profits + stop_losses) if take_profits + stop_losses else np.nan,
+        'buys': int(rows[:, 2].sum()),
+        'take_profits': take_profits,
+        'stop_losses': stop_losses,
+        'seconds': round(time.perf_counter() - start_time, 3),
+    }
+
+
+# --- 结果表 ---
+
+def load_done_hashes(results_file):
+    if not os.path.exists(results_file):
+        return set()
+    try:
+        return set(pd.read_csv(results_file, usecols=['param_hash'], dtype=str)['param_hash'])
+    except (ValueError, pd.errors.EmptyDataError):
+        return set()
+
+
+def _append_result(results_file, row, columns=RESULT_COLUMNS):
+    new_file = not os.path.exists(results_file) or os.path.getsize(results_file) == 0
+    with open(results_file, 'a', encoding='utf-8') as f:
+        pd.DataFrame([row], columns=columns).to_csv(f, header=new_file, index=False)
+        f.flush()
+
+
+@contextmanager
+def feature_pool(matrix, offsets, workers=MAX_WORKERS):
+    """把特征矩阵写入共享内存并启动挂载它的进程池；退出时关闭进程池并释放共享内存"""
+    shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        shared = np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)
+        shared[:] = matrix
+        del shared
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shm.name, matrix.shape, offsets)) as executor:
+            yield executor
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def run_sweep(param_sets, results_file=RESULTS_FILE, workers=MAX_WORKERS, csv_dir=FUND_DATA_DIR):
+    """
+    评估 param_sets 中尚未出现在结果表里的参数组合，结果逐行追加到 results_file。
+    返回本次新完成的组合数。
+    """
+    start_time = time.time()
+    codes, offsets, matrix = prepare_features(sorted(glob.glob(os.path.join(csv_dir, '*.csv'))))
+    dataset = dataset_signature(codes, offsets, matrix)
+    logging.info(f"特征准备完成: {len(codes)} 只基金，{matrix.shape[1]} 行，耗时 {time.time() - start_time:.1f} 秒")
+
+    done = load_done_hashes(results_file)
+    pending = {}
+    for params in param_sets:
+        key = param_hash(params, dataset)
+        if key not in done and key not in pending:
+            pending[key] = params
+    logging.info(f"待评估 {len(pending)} 组参数 (结果表中已有 {len(done)} 组，已跳过重复组合)")
+    if not pending:
+        return 0
+
+    finished = 0
+    with feature_pool(matrix, offsets, workers) as executor:
+        futures = {executor.submit(evaluate, params): key for key, params in pending.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                metrics = future.result()
+            except Exception as e:
+                logging.error(f"参数组 {key} 评估失败: {e}")
+                continue
+            _append_result(results_file, {'param_hash': key, 'dataset': dataset, **pending[key], **metrics})
+            finished += 1
+            if finished % 10 == 0 or finished == len(pending):
+                logging.info(f"已完成 {finished}/{len(pending)} 组")
+    logging.info(f"扫描完成，新增 {finished} 组，总耗时 {time.time() - start_time:.1f} 秒")
+    return finished
+
+
+def main_verify(sample_size=5, csv_dir=FUND_DATA_DIR):
+    """抽样校验：默认参数下逐基金结果与 backtester_v5.run_backtest_v5 一致"""
+    csv_files = sorted(glob.glob(os.path.join(csv_dir, '*.csv')))
+    step = max(len(csv_files) // sample_size, 1)
+    sample = csv_files[::step][:sample_size]
+    codes, offsets, matrix = prepare_features(sample)
+    features = dict(zip(FEATURES, matrix))
+    failed = 0
+    for j, code in enumerate(codes):
+        df_fund = backtester_v5.load_fund_data(os.path.join(csv_dir, f"{code}.csv"), code)
+        expected = backtester_v5.run_backtest_v5(df_fund, code)
+        total_return, max_drawdown, buys, take_profits, stop_losses = evaluate_fund(
+            features, offsets[j], offsets[j + 1], DEFAULT_PARAMS)
+        ok = (round(total_return, 4) == expected['总收益率'] and round(max_drawdown, 4) == expected['最大回撤']
+              and (buys, take_profits, stop_losses) == (expected['买入次数'], expected['止盈次数'], expected['止损次数']))
+        failed += not ok
+        logging.info(f"基金 {code}: {'一致' if ok else '不一致'} (总收益率 {total_return:.4f} / {expected['总收益率']})")
+    return failed == 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description='V5 网格策略参数扫描')
+    parser.add_argument('--space', help='参数空间 JSON 文件 ({参数名: [取值...]} 或 {参数名: {"range": [lo, hi]}})')
+    parser.add_argument('--random', type=int, default=0, help='随机搜索的组数 (缺省为网格搜索)')
+    parser.add_argument('--seed', type=int, default=None, help='随机搜索的种子')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='进程数')
+    parser.add_argument('--results', default=RESULTS_FILE, help='结果表 CSV (追加写入，可续跑)')
+    parser.add_argument('--verify', action='store_true', help='抽样比对默认参数与 run_backtest_v5')
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if main_verify() else 1)
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            space = json.load(f)
+    param_sets = random_space(space, args.random, args.seed) if args.random else grid_space(space)
+    run_sweep(param_sets, args.results, args.workers)
+
+    results = pd.read_csv(args.results, dtype={'param_hash': str}) if os.path.exists(args.results) else pd.DataFrame()
+    if not results.empty:
+        results = results[results['dataset'] == results['dataset'].iloc[-1]]  # 只比较当前数据集上的结果
+        print(results.sort_values(RANK_BY, ascending=False).head(TOP_N).to_string(index=False))
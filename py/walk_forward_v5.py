@@ -0,0 +1,340 @@
+"""
+V5 策略滚动前推优化 (Walk-Forward Optimization)
+
+analyzer_V5 与 backtester_v5 的阈值 (RSI 门槛、网格步长、止盈止损等) 都是在一个固定回测区间上拟合的。
+本脚本把历史切成滚动的 训练/测试 窗口：
+
+    训练      在每个训练窗口上用 sweep_v5 的参数空间做搜索 (进程池并行)，按 RANK_BY 选出最优参数
+    测试      把最优参数 (以及 DEFAULT_PARAMS 作为基准) 放到紧随其后的测试窗口上做样本外评估
+    报告      各窗口的样本内/样本外表现，以及每个参数在各窗口的最优取值是否稳定
+
+时点特征 (RSI(6)/RSI(14)、MA50/MA250 及趋势、近 1 月回撤) 只依赖当日及之前的数据，
+因此对每只基金的完整历史只计算一次，各窗口 (训练与测试、相互重叠的窗口) 都只是其中的列区间，
+不再按窗口重算；特征表按数据文件的状态缓存到 FEATURE_CACHE，数据未变化时直接读取。
+指标以完整历史为起点计算，与 backtester_v5 以回测区间为起点的结果会有预热差异。
+
+评估结果逐行追加到 RESULTS_FILE，以 (参数 + 数据集 + 窗口) 的哈希去重，中断后可续跑。
+
+命令行：
+    python py/walk_forward_v5.py                                   # 3 年训练 / 1 年测试，逐年滚动
+    python py/walk_forward_v5.py --train-years 2 --random 100 --seed 1
+    python py/walk_forward_v5.py --space my_space.json --grid --workers 8
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 共享模块 (backtest_kernel 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import nav_store
+import sweep_v5
+
+# ================= 配置区 =================
+FUND_DATA_DIR = sweep_v5.FUND_DATA_DIR
+START_DATE = '2016-01-01'
+END_DATE = datetime.now().strftime('%Y-%m-%d')
+TRAIN_YEARS = 3
+TEST_YEARS = 1                  # 同时也是窗口滚动的步长
+MIN_WINDOW_ROWS = 120           # 基金在窗口内至少有这么多行特征才参与评估
+RANDOM_SAMPLES = 50             # 每个训练窗口随机搜索的组数 (--grid 时改为网格搜索)
+RANK_BY = sweep_v5.RANK_BY
+MAX_WORKERS = sweep_v5.MAX_WORKERS
+
+FEATURE_CACHE = os.path.join('.fund_cache', 'walk_forward_v5_features.npz')
+FEATURE_VERSION = 1             # 特征定义变化时递增，使缓存失效
+RESULTS_FILE = 'walk_forward_v5_results.csv'
+REPORT_FILE = 'walk_forward_v5_report.md'
+# ==========================================
+
+PARAM_NAMES = list(sweep_v5.DEFAULT_PARAMS)
+METRIC_NAMES = ['funds', 'mean_return', 'median_return', 'mean_max_drawdown', 'win_rate',
+                'buys', 'take_profits', 'stop_losses', 'seconds']
+RESULT_COLUMNS = ['phase', 'window', 'start', 'end', 'param_hash', 'dataset', *PARAM_NAMES, *METRIC_NAMES]
+
+
+# --- 特征表 (完整历史，计算一次并缓存) ---
+
+def dataset_key(csv_dir=FUND_DATA_DIR):
+    """数据目录与增量日志目录 (journal/) 中全部文件的名称、大小与修改时间的摘要"""
+    digest = hashlib.sha1(f"v{FEATURE_VERSION}".encode('utf-8'))
+    for directory in (csv_dir, os.path.join(csv_dir, nav_store.JOURNAL_SUBDIR)):
+        if not os.path.isdir(directory):
+            continue
+        digest.update(f"[{os.path.relpath(directory, csv_dir)}]".encode('utf-8'))
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_file():
+                    st = entry.stat()
+                    digest.update(f"{entry.name}:{st.st_size}:{st.st_mtime_ns};".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def load_features(csv_dir=FUND_DATA_DIR, cache_path=FEATURE_CACHE):
+    """返回 (codes, offsets, matrix, dates, dataset)；数据未变化时从缓存读取"""
+    dataset = dataset_key(csv_dir)
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if str(cached['dataset']) == dataset:
+                    logging.info(f"特征表缓存命中: {cache_path}")
+                    return list(cached['codes']), cached['offsets'], cached['matrix'], cached['dates'], dataset
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"特征表缓存不可用，重新计算: {e}")
+
+    start_time = time.time()
+    codes, offsets, matrix, dates = sweep_v5.prepare_feature_table(
+        sorted(glob.glob(os.path.join(csv_dir, '*.csv'))), start=None, end=None)
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    tmp_path = f"{cache_path}.tmp.npz"
+    np.savez(tmp_path, codes=np.array(codes, dtype=str), offsets=offsets, matrix=matrix, dates=dates,
+             dataset=np.array(dataset))
+    os.replace(tmp_path, cache_path)
+    logging.info(f"特征表计算完成: {len(codes)} 只基金，{matrix.shape[1]} 行，耗时 {time.time() - start_time:.1f} 秒")
+    return codes, offsets, matrix, dates, dataset
+
+
+# --- 窗口 ---
+
+def make_windows(start=START_DATE, end=END_DATE, train_years=TRAIN_YEARS, test_years=TEST_YEARS):
+    """滚动窗口列表：[{'window', 'train': (起, 止), 'test': (起, 止)}]，区间含两端，最后一个测试窗口截断到 end"""
+    windows = []
+    train_start, end = pd.Timestamp(start), pd.Timestamp(end)
+    while True:
+        test_start = train_start + pd.DateOffset(years=train_years)
+        if test_start > end:
+            break
+        test_end = min(test_start + pd.DateOffset(years=test_years) - pd.Timedelta(days=1), end)
+        windows.append({
+            'window': len(windows) + 1,
+            'train': (train_start.strftime('%Y-%m-%d'), (test_start - pd.Timedelta(days=1)).strftime('%Y-%m-%d')),
+            'test': (test_start.strftime('%Y-%m-%d'), test_end.strftime('%Y-%m-%d')),
+        })
+        train_start += pd.DateOffset(years=test_years)
+    return windows
+
+
+class WindowSlicer:
+    """把日期区间换算为各基金在特征表中的列区间；同一区间只计算一次"""
+
+    def __init__(self, offsets, dates, min_rows=MIN_WINDOW_ROWS):
+        self.offsets, self.dates, self.min_rows = offsets, dates, min_rows
+        self._cache = {}
+
+    def bounds(self, start, end):
+        """返回 (starts, stops)，只包含区间内至少有 min_rows 行的基金"""
+        key = (start, end)
+        if key not in self._cache:
+            lo, hi = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+            starts, stops = [], []
+            for a, b in zip(self.offsets[:-1], self.offsets[1:]):
+                segment = self.dates[a:b]
+                starts.append(a + np.searchsorted(segment, lo, side='left'))
+                stops.append(a + np.searchsorted(segment, hi, side='right'))
+            starts, stops = np.array(starts, dtype=np.int64), np.array(stops, dtype=np.int64)
+            keep = stops - starts >= self.min_rows
+            self._cache[key] = (starts[keep], stops[keep])
+        return self._cache[key]
+
+
+# --- 运行 ---
+
+def _task_hash(params, dataset, phase, period):
+    return sweep_v5.param_hash(params, f"{dataset}|{phase}|{period[0]}|{period[1]}")
+
+
+def _load_results(results_file, dataset):
+    if not os.path.exists(results_file) or os.path.getsize(results_file) == 0:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    results = pd.read_csv(results_file, dtype={'param_hash': str, 'dataset': str})
+    return results[results['dataset'] == dataset]
+
+
+def _run_tasks(executor, tasks, slicer, results_file, dataset, label):
+    """tasks: [(phase, window, period, params)]，跳过结果表中已有的哈希，返回新完成的任务数"""
+    done = set(_load_results(results_file, dataset)['param_hash'])
+    pending = {}
+    for phase, window, period, params in tasks:
+        key = _task_hash(params, dataset, phase, period)
+        if key not in done and key not in pending:
+            pending[key] = (phase, window, period, params)
+    if not pending:
+        return 0
+    futures = {executor.submit(sweep_v5.evaluate, params, slicer.bounds(*period)): key
+               for key, (phase, window, period, params) in pending.items()}
+    finished = 0
+    for future in as_completed(futures):
+        key = futures[future]
+        phase, window, period, params = pending[key]
+        try:
+            metrics = future.result()
+        except Exception as e:
+            logging.error(f"窗口 {window} {phase} 参数组 {key} 评估失败: {e}")
+            continue
+        sweep_v5._append_result(results_file, {
+            'phase': phase, 'window': window, 'start': period[0], 'end': period[1],
+            'param_hash': key, 'dataset': dataset, **params, **metrics,
+        }, RESULT_COLUMNS)
+        finished += 1
+        if finished % 20 == 0 or finished == len(pending):
+            logging.info(f"{label}: 已完成 {finished}/{len(pending)}")
+    return finished
+
+
+def best_params(train_rows):
+    """训练结果中 RANK_BY 最高的一组参数"""
+    best = train_rows.sort_values([RANK_BY, 'param_hash'], ascending=[False, True]).iloc[0]
+    return {name: float(best[name]) for name in PARAM_NAMES}
+
+
+def run_walk_forward(param_sets, windows, results_file=RESULTS_FILE, workers=MAX_WORKERS, csv_dir=FUND_DATA_DIR):
+    """
+    在每个训练窗口上评估 param_sets，取最优参数在测试窗口上评估 (并以 DEFAULT_PARAMS 为基准)。
+    返回 (各窗口汇总 DataFrame, 全部结果 DataFrame)。
+    """
+    start_time = time.time()
+    codes, offsets, matrix, dates, dataset = load_features(csv_dir)
+    slicer = WindowSlicer(offsets, dates)
+    param_sets = list(param_sets)
+
+    with sweep_v5.feature_pool(matrix, offsets, workers) as executor:
+        # 1) 所有窗口的训练任务一次提交，进程池在窗口间也能并行
+        train_tasks = [('train', w['window'], w['train'], params) for w in windows for params in param_sets]
+        logging.info(f"{len(windows)} 个窗口 × {len(param_sets)} 组参数 (数据集 {dataset})")
+        _run_tasks(executor, train_tasks, slicer, results_file, dataset, '训练')
+
+        # 2) 样本外评估：各窗口训练期最优参数 + 默认参数基准
+        results = _load_results(results_file, dataset)
+        test_tasks, chosen = [], {}
+        for w in windows:
+            train_rows = results[(results['phase'] == 'train') & (results['start'] == w['train'][0])
+                                 & (results['end'] == w['train'][1])]
+            train_rows = train_rows[train_rows['param_hash'].isin(
+                {_task_hash(p, dataset, 'train', w['train']) for p in param_sets})]
+            if train_rows.empty:
+                continue
+            chosen[w['window']] = best_params(train_rows)
+            test_tasks.append(('test', w['window'], w['test'], chosen[w['window']]))
+            test_tasks.append(('baseline', w['window'], w['test'], dict(sweep_v5.DEFAULT_PARAMS)))
+        _run_tasks(executor, test_tasks, slicer, results_file, dataset, '样本外评估')
+
+    results = _load_results(results_file, dataset)
+    summary = []
+    for w in windows:
+        if w['window'] not in chosen:
+            continue
+        params = chosen[w['window']]
+        row = {'window': w['window'], 'train_start': w['train'][0], 'train_end': w['train'][1],
+               'test_start': w['test'][0], 'test_end': w['test'][1], **params}
+        for phase, period, p in (('train', w['train'], params), ('test', w['test'], params),
+                                 ('baseline', w['test'], sweep_v5.DEFAULT_PARAMS)):
+            hit = results[results['param_hash'] == _task_hash(p, dataset, phase, period)]
+            row[f'{phase}_{RANK_BY}'] = hit[RANK_BY].iloc[0] if not hit.empty else np.nan
+            row[f'{phase}_funds'] = hit['funds'].iloc[0] if not hit.empty else 0
+        summary.append(row)
+    logging.info(f"滚动前推完成，总耗时 {time.time() - start_time:.1f} 秒")
+    return pd.DataFrame(summary), results
+
+
+# --- 稳定性报告 ---
+
+def parameter_stability(summary, results):
+    """
+    每个参数在各窗口最优取值的稳定性：众数及其占比、均值、变异系数、相邻窗口的切换次数，
+    以及各训练窗口内该参数取众数时的 RANK_BY 相对窗口最优值的平均差距 (越小说明对该参数越不敏感)。
+    """
+    train = results[results['phase'] == 'train']
+    rows = []
+    for name in PARAM_NAMES:
+        chosen = summary[name].astype(float)
+        if chosen.empty:
+            continue
+        mode = chosen.mode().iloc[0]
+        mean = chosen.mean()
+        gaps = []
+        for w in summary['window']:
+            rows_w = train[train['window'] == w]
+            at_mode = rows_w[np.isclose(rows_w[name].astype(float), mode)]
+            if not rows_w.empty and not at_mode.empty:
+                gaps.append(rows_w[RANK_BY].max() - at_mode[RANK_BY].max())
+        rows.append({
+            '参数': name,
+            '各窗口最优值': ', '.join(f"{v:g}" for v in chosen),
+            '众数': mode,
+            '众数占比': round((np.isclose(chosen, mode)).mean(), 2),
+            '均值': round(mean, 4),
+            '变异系数': round(chosen.std(ddof=0) / abs(mean), 3) if mean else np.nan,
+            '切换次数': int((chosen.diff().fillna(0) != 0).sum()),
+            f'众数处 {RANK_BY} 差距': round(float(np.mean(gaps)), 4) if gaps else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+def generate_report(summary, stability):
+    """Markdown 报告：窗口汇总 (样本内/样本外/基准) 与参数稳定性"""
+    parts = ["# V5 策略滚动前推优化报告\n\n",
+             f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}，排序指标: `{RANK_BY}`\n\n"]
+    if summary.empty:
+        parts.append("**没有可评估的窗口**\n")
+        return "".join(parts)
+    train, test, base = (summary[f'{p}_{RANK_BY}'] for p in ('train', 'test', 'baseline'))
+    parts.append("## 样本外表现\n\n")
+    parts.append(f"- 窗口数: {len(summary)}\n")
+    parts.append(f"- 样本内平均 {RANK_BY}: {train.mean():.4f}\n")
+    parts.append(f"- 样本外平均 {RANK_BY}: {test.mean():.4f} (默认参数基准 {base.mean():.4f})\n")
+    parts.append(f"- 样本外/样本内比值: {test.mean() / train.mean():.2f}\n" if train.mean() else "")
+    parts.append(f"- 样本外优于基准的窗口: {int((test > base).sum())}/{int(test.notna().sum())} (测试期有数据的窗口)\n\n")
+    parts.append("## 各窗口\n\n")
+    parts.append(_markdown_table(summary))
+    parts.append("\n## 参数稳定性\n\n")
+    parts.append(_markdown_table(stability))
+    return "".join(parts)
+
+
+def _markdown_table(df):
+    def cell(v):
+        return f"{v:.4f}" if isinstance(v, float) else str(v)
+    lines = ["| " + " | ".join(map(str, df.columns)) + " |", "|" + " :---: |" * len(df.columns)]
+    lines += ["| " + " | ".join(cell(v) for v in row) + " |" for row in df.itertuples(index=False)]
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    parser = argparse.ArgumentParser(description='V5 网格策略滚动前推优化')
+    parser.add_argument('--start', default=START_DATE, help='首个训练窗口的起始日期')
+    parser.add_argument('--end', default=END_DATE, help='最后一个测试窗口的截止日期')
+    parser.add_argument('--train-years', type=int, default=TRAIN_YEARS)
+    parser.add_argument('--test-years', type=int, default=TEST_YEARS)
+    parser.add_argument('--space', help='参数空间 JSON 文件 (格式同 sweep_v5)')
+    parser.add_argument('--grid', action='store_true', help='网格搜索整个参数空间 (缺省为随机搜索)')
+    parser.add_argument('--random', type=int, default=RANDOM_SAMPLES, help='随机搜索的组数')
+    parser.add_argument('--seed', type=int, default=0, help='随机搜索的种子 (各窗口使用同一批参数)')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='进程数')
+    parser.add_argument('--results', default=RESULTS_FILE, help='结果表 CSV (追加写入，可续跑)')
+    parser.add_argument('--report', default=REPORT_FILE, help='Markdown 报告路径')
+    args = parser.parse_args()
+
+    space = sweep_v5.DEFAULT_SPACE
+    if args.space:
+        with open(args.space, 'r', encoding='utf-8') as f:
+            space = json.load(f)
+    param_sets = sweep_v5.grid_space(space) if args.grid else sweep_v5.random_space(space, args.random, args.seed)
+    windows = make_windows(args.start, args.end, args.train_years, args.test_years)
+    summary, results = run_walk_forward(param_sets, windows, args.results, args.workers)
+    stability = parameter_stability(summary, results)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        f.write(generate_report(summary, stability))
+    if not summary.empty:
+        print(summary.to_string(index=False))
+        print(stability.to_string(index=False))
+    logging.info(f"报告已生成: {args.report}")
@@ -0,0 +1,145 @@
+"""
+爬虫共享的自适应限速器 (Adaptive Rate Limiter)
+
+各爬虫原先各自控制请求频率：fund_spider 用 Semaphore + 固定延迟且遇 514 直接失败，
+指数下载随机休眠 1–2 秒，MarketMonitor 失败后固定等待 10 秒，费率/持仓脚本各有一套休眠。
+这些参数都是按最坏情况手工调出来的。本模块为每个主机维护一个令牌桶，速率按 AIMD 自动调整：
+
+    成功响应                          速率 += RATE_INCREASE (加性增)，不超过该主机的最高速率
+    514/429/503、超时、连接错误       速率 *= RATE_DECREASE (乘性减)，不低于 MIN_RATE；
+                                      同一冷却期内多个在途请求的失败只减速一次
+
+因此吞吐会收敛到服务器能容忍的最高速率附近。同一进程内的线程与协程共用同一个限速器：
+
+    limiter = rate_limiter.limiter_for(url)
+    limiter.acquire()              # 同步调用方 (requests / 线程池)
+    await limiter.acquire_async()  # 异步调用方 (aiohttp)
+    limiter.record(status)         # 收到响应后回报状态码；超时/连接错误调用 record_error()
+
+requests 调用方可直接使用 rate_limiter.get(url, ...)，它完成以上全部步骤。
+"""
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+# 各主机的 (初始速率, 最高速率)，单位：请求/秒
+HOST_BUDGETS = {
+    'fundf10.eastmoney.com': (4.0, 20.0),
+    'fund.eastmoney.com': (2.0, 10.0),
+    'api.fund.eastmoney.com': (2.0, 10.0),
+}
+DEFAULT_BUDGET = (2.0, 10.0)
+MIN_RATE = 0.2                   # 连续限流时的最低速率
+BURST = 2.0                      # 令牌桶容量：空闲后允许的突发请求数
+RATE_INCREASE = 0.05             # 每次成功响应增加的速率
+RATE_DECREASE = 0.5              # 每次限流后速率乘以的系数
+DECREASE_COOLDOWN = 2.0          # 两次减速之间的最短间隔 (秒)
+THROTTLE_STATUS = {429, 503, 514}
+# ==========================================
+
+
+class AdaptiveLimiter:
+    """单个主机的令牌桶限速器，线程安全，同步与异步调用方可共用"""
+
+    def __init__(self, host, rate, max_rate, min_rate=MIN_RATE, burst=BURST):
+        self.host = host
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.requests = 0
+        self.throttled = 0
+        self._tokens = burst
+        self._stamp = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def _try_take(self):
+        """取一个令牌：成功返回 0，否则返回令牌攒够前需要等待的秒数 (等待后重新竞争，期间的调速立即生效)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.requests += 1
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record(self, status):
+        """按响应状态码调整速率：限流状态码减速，其余成功响应加速"""
+        if status in THROTTLE_STATUS:
+            self.record_error()
+        elif status < 400:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def record_error(self):
+        """限流、超时或连接错误：乘性减速，并清空桶内积攒的突发额度"""
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease < DECREASE_COOLDOWN:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+            self._tokens = 0.0
+        logger.info("主机 %s 触发限流，速率降至 %.2f 请求/秒", self.host, self.rate)
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def limiter_for(url):
+    """返回 url 所属主机的共享限速器 (首次使用时按 HOST_BUDGETS 创建)"""
+    host = urlsplit(url).hostname or ''
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(host)
+        if limiter is None:
+            rate, max_rate = HOST_BUDGETS.get(host, DEFAULT_BUDGET)
+            limiter = _LIMITERS[host] = AdaptiveLimiter(host, rate, max_rate)
+        return limiter
+
+
+def get(url, session=None, **kwargs):
+    """限速后的 requests.get：等待令牌、发出请求，并把结果回报给该主机的限速器"""
+    limiter = limiter_for(url)
+    limiter.acquire()
+    try:
+        response = (session or requests).get(url, **kwargs)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+        limiter.record_error()
+        raise
+    limiter.record(response.status_code)
+    return response
+
+
+def log_summary():
+    """输出各主机的请求数、限流次数与收敛后的速率"""
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    for limiter in limiters:
+        logger.info("主机 %s: 请求 %d 次，限流 %d 次，当前速率 %.2f 请求/秒",
+                    limiter.host, limiter.requests, limiter.throttled, limiter.rate)
@@ -0,0 +1,151 @@
+"""
+每日信号快照库 (Signal Store)
+
+各分析脚本每次运行的逐只基金指标与信号按日期分区保存，只追加、不改写：
+
+    signal_store/<策略>/<YYYY-MM>/<YYYY-MM-DD>/run_<YYYYmmdd_HHMMSS>.csv
+
+一个日期目录即一个分区，同一天多次运行各写一个文件，读取时默认只取当天最后一次运行
+(相当于“当日覆盖”)；没有结果的运行也写入一个只有表头的文件，使其覆盖当天较早的结果。查询按文件路径中的日期筛选分区，无需打开范围外的文件；
+Markdown 报告由分区内容渲染，历史报告可随时重新生成。
+
+命令行：
+    python signal_store.py v5 --fund 000001 --days 90 --contains 网格级
+        # 统计近 90 天基金 000001 的“行动提示”中出现“网格级”的天数
+"""
+import argparse
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# ================= 配置区 =================
+logger = logging.getLogger(__name__)
+
+SIGNAL_DIR = 'signal_store'
+DATE_COLUMN = 'signal_date'      # 分区日期 (写入时追加的列)
+RUN_COLUMN = 'run_at'            # 运行时间 (写入时追加的列)
+CODE_COLUMN = '基金代码'
+# ==========================================
+
+_DAY_DIR = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def _date_str(date):
+    return pd.Timestamp(date).strftime('%Y-%m-%d')
+
+
+def partition_dir(strategy, date, root=SIGNAL_DIR):
+    day = _date_str(date)
+    return os.path.join(root, strategy, day[:7], day)
+
+
+def append(strategy, date, rows, run_at=None, root=SIGNAL_DIR):
+    """
+    将一次运行的结果 (字典列表或 DataFrame) 追加为该日期分区中的新文件，返回文件路径。
+    没有结果时写入只有表头的空运行标记，读取当天最后一次运行时得到空表，而不是较早运行的结果。
+    """
+    df = pd.DataFrame(rows)
+    run_at = run_at or datetime.now()
+    if df.empty:
+        df = pd.DataFrame(columns=[DATE_COLUMN, RUN_COLUMN])
+    else:
+        df.insert(0, RUN_COLUMN, pd.Timestamp(run_at).strftime('%Y-%m-%d %H:%M:%S'))
+        df.insert(0, DATE_COLUMN, _date_str(date))
+
+    directory = partition_dir(strategy, date, root)
+    os.makedirs(directory, exist_ok=True)
+    stem = f"run_{pd.Timestamp(run_at).strftime('%Y%m%d_%H%M%S')}"
+    path, n = os.path.join(directory, f"{stem}.csv"), 1
+    while os.path.exists(path):
+        path, n = os.path.join(directory, f"{stem}_{n}.csv"), n + 1
+
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False, encoding='utf-8')
+    os.replace(tmp_path, path)
+    logger.info("信号快照已写入 %s (%d 行)", path, len(df))
+    return path
+
+
+def list_dates(strategy, start=None, end=None, root=SIGNAL_DIR):
+    """返回 [start, end] 范围内已有分区的日期字符串 (升序)"""
+    base = os.path.join(root, strategy)
+    if not os.path.isdir(base):
+        return []
+    lo = _date_str(start) if start is not None else None
+    hi = _date_str(end) if end is not None else None
+    dates = []
+    for month in sorted(os.listdir(base)):
+        # 先按月份目录剪枝
+        if (lo and month < lo[:7]) or (hi and month > hi[:7]):
+            continue
+        for day in sorted(os.listdir(os.path.join(base, month))):
+            if _DAY_DIR.match(day) and (not lo or day >= lo) and (not hi or day <= hi):
+                dates.append(day)
+    return dates
+
+
+def _run_files(strategy, date, root):
+    directory = partition_dir(strategy, date, root)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f for f in os.listdir(directory) if f.startswith('run_') and f.endswith('.csv'))
+
+
+def read_run(path):
+    """读取 append() 写入的单次运行文件 (空运行标记返回空表)"""
+    return pd.read_csv(path, dtype={CODE_COLUMN: str}, encoding='utf-8')
+
+
+def read_partition(strategy, date, all_runs=False, root=SIGNAL_DIR):
+    """读取单日分区；默认只返回当天最后一次运行的结果"""
+    files = _run_files(strategy, date, root)
+    if not all_runs:
+        files = files[-1:]
+    directory = partition_dir(strategy, date, root)
+    frames = [read_run(os.path.join(directory, f)) for f in files]
+    frames = [df for df in frames if not df.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def query(strategy, start=None, end=None, fund_codes=None, all_runs=False, root=SIGNAL_DIR):
+    """按日期范围 (含两端) 和基金代码查询信号，返回按日期升序的 DataFrame"""
+    codes = set(fund_codes) if fund_codes is not None else None
+    frames = []
+    for day in list_dates(strategy, start, end, root):
+        df = read_partition(strategy, day, all_runs, root)
+        if codes is not None and not df.empty:
+            df = df[df[CODE_COLUMN].isin(codes)]
+        if not df.empty:
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def count_signals(strategy, contains, column='行动提示', fund_codes=None, start=None, end=None, root=SIGNAL_DIR):
+    """统计各基金在日期范围内 column 包含 contains 的天数，返回 {基金代码: 天数} 的 Series"""
+    df = query(strategy, start, end, fund_codes, root=root)
+    if df.empty or column not in df.columns:
+        return pd.Series(0, index=list(fund_codes or []), dtype='int64', name='days')
+    hits = df[df[column].astype(str).str.contains(contains, regex=False)]
+    counts = hits.groupby(CODE_COLUMN)[DATE_COLUMN].nunique().rename('days')
+    return counts.reindex(list(fund_codes), fill_value=0) if fund_codes is not None else counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='查询每日信号快照')
+    parser.add_argument('strategy', help='策略名 (如 v5)')
+    parser.add_argument('--fund', action='append', help='基金代码，可重复')
+    parser.add_argument('--days', type=int, default=90, help='查询最近天数')
+    parser.add_argument('--contains', help='统计信号列包含该文本的天数')
+    parser.add_argument('--column', default='行动提示', help='信号列名')
+    args = parser.parse_args()
+
+    end = datetime.now().date()
+    start = end - timedelta(days=args.days)
+    if args.contains:
+        print(count_signals(args.strategy, args.contains, args.column, args.fund, start, end).to_string())
+    else:
+        print(query(args.strategy, start, end, args.fund).to_string())
@@ -1,5 +1,7 @@
 # bot.py
 import json
+import os
+import sys
 import threading
 import time
 from datetime import datetime, timedelta, timezone
@@ -8,6 +10,10 @@ import pandas as pd
 import numpy as np
 import telebot
 
+# 共享模块 (indicator_state 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import indicator_state
+
 bot_token = open("bot.token", "r", encoding="utf-8").read().strip()
 print("Bot Token:", bot_token)
 bot = telebot.TeleBot(bot_token)
@@ -124,52 +130,8 @@ def rsi_wilder(close: pd.Series, period: int = 12) -> pd.Series:
     if len(close) < period + 1:
         return pd.Series(index=close.index, dtype=float)
 
-    delta = close.diff()
-
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-
-    # 初始均值
-    avg_gain = gain.rolling(window=period, min_periods=period).mean()
-    avg_loss = loss.rolling(window=period, min_periods=period).mean()
-
-    # Wilder递推
-    # 从第 period+1 个点开始用递推，之前用rolling均值
-    rs = pd.Series(index=close.index, dtype=float)
-    rsi = pd.Series(index=close.index, dtype=float)
-
-    # 找到第一个可用位置
-    first = avg_gain.first_valid_index()
-    if first is None:
-        return rsi  # 全NaN
-
-    rs.loc[first] = (avg_gain.loc[first] / avg_loss.loc[first]) if avg_loss.loc[first] != 0 else np.inf
-    rsi.loc[first] = 100 - (100 / (1 + rs.loc[first]))
-
-    # 递推
-    for i in range(close.index.get_loc(first) + 1, len(close)):
-        idx = close.index[i]
-        g = gain.iloc[i]
-        l = loss.iloc[i]
-
-        prev_idx = close.index[i - 1]
-        prev_avg_gain = avg_gain.loc[prev_idx] if not pd.isna(avg_gain.loc[prev_idx]) else None
-        prev_avg_loss = avg_loss.loc[prev_idx] if not pd.isna(avg_loss.loc[prev_idx]) else None
-
-        # 如果 rolling 平均还不可用，就跳过（直到有初值）
-        if prev_avg_gain is None or prev_avg_loss is None:
-            continue
-
-        cur_avg_gain = (prev_avg_gain * (period - 1) + g) / period
-        cur_avg_loss = (prev_avg_loss * (period - 1) + l) / period
-
-        avg_gain.loc[idx] = cur_avg_gain
-        avg_loss.loc[idx] = cur_avg_loss
-
-        cur_rs = (cur_avg_gain / cur_avg_loss) if cur_avg_loss != 0 else np.inf
-        rs.loc[idx] = cur_rs
-        rsi.loc[idx] = 100 - (100 / (1 + cur_rs))
-
+    # 初值取前 period 个涨跌幅的均值，之后按 Wilder 递推；与基金指标状态共用同一递推内核
+    rsi = pd.Series(indicator_state.wilder_rsi_series(close.to_numpy(dtype=float), period), index=close.index)
     return rsi
 
 # ===== 新增：拉取数据并计算RSI最新值 =====
@@ -1,12 +1,17 @@
-import requests
+import os
+import sys
 import pandas as pd
 import re
-from io import StringIO
 import threading
 from functools import wraps
 
 import time
 
+# 共享模块 (lsjz_parser、http_cache 等) 位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import http_cache
+import lsjz_parser
+
 def new_thread(func):
     @wraps(func)
     def inner(*args, **kwargs):
@@ -16,10 +21,12 @@ def new_thread(func):
     return inner
 
 default_source_url = "https://fundf10.eastmoney.com/F10DataApi.aspx"
+# 与接口表头一致的列名 (lsjz_parser.LsjzRow 的字段顺序)
+LSJZ_COLUMNS = ['净值日期', '单位净值', '累计净值', '日增长率', '申购状态', '赎回状态', '分红送配']
 
 def update_fund_list():
     import json
-    response = requests.get('https://fund.eastmoney.com/js/fundcode_search.js')
+    response = http_cache.get('https://fund.eastmoney.com/js/fundcode_search.js')
     if response.status_code == 200:
         response.encoding = 'utf-8'
         # 提取数组部分
@@ -53,7 +60,7 @@ class FundData:
     def _request_page_(self, page, num_retry=1):
         params = self.params.copy()
         params['page'] = page
-        response = requests.get(self.source, params=params)
+        response = http_cache.get(self.source, params=params)
         if response.status_code == 200:
             self._data_[(page)] = response
         else:
@@ -79,15 +86,10 @@ class FundData:
         for i in range(len(requests_list)):
             print(f'{i+1}/{total_pages}\r', flush=True, end='')
             requests_list[i].join()
-            match = re.search(r'content:"(.*?)"', self._data_[i+1].text, re.S)
-            if match:
-                content = match.group(1)
-                # 将 content 中的 \r\n 替换为换行符
-                content = content.replace("\\r\\n", "\n")
-                # 使用 pandas 读取表格数据
-                df = pd.read_html(StringIO(content))[0]
-                # 打印数据框
-                df_list.append(df)
+            # 日增长率为小数 (1.20% → 0.012)，单位净值/累计净值为 float
+            page = lsjz_parser.parse_page(self._data_[i+1].text)
+            if page is not None:
+                df_list.append(pd.DataFrame(page.rows, columns=LSJZ_COLUMNS))
             else:
                 print("未找到 content 字段")
             curpage += 1
@@ -1,7 +1,12 @@
 
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from math import floor
+
 import pandas as pd
 import numpy as np
-from math import floor
 
 # =====================
 # Indicators & helpers
@@ -45,18 +50,10 @@ def rolling_zscore(s, win=60):
 # Signal generation
 # =====================
 
-def generate_signals(df,
-                     vol_multiplier=1.8,
-                     donchian_n=15,
-                     atr_n=14,
-                     rsi_n=14,
-                     z_win=60,
-                     atr_low=0.003,  # 0.3%
-                     atr_high=0.025  # 2.5%
-                     ):
+def compute_features(df, atr_n=14, rsi_n=14, z_win=60):
     '''
-    df: DataFrame with columns ['open','high','low','close','volume'], DateTimeIndex at 5min freq
-    Returns df with columns: EMA5, EMA20, RSI, ATR, VWAP, signal (1/0), etc.
+    与 vol_multiplier / donchian_n 无关的指标列 (EMA/RSI/ATR/VWAP/z-score)。
+    参数搜索时只需计算一次，再由 apply_signals 按不同参数生成信号。
     '''
     df = df.copy()
     df['EMA5'] = ema(df['close'], 5*48)  # 5 periods of 5min in a trading day
@@ -66,6 +63,18 @@ def generate_signals(df,
     df['VWAP'] = intraday_vwap(df)
     df['dist_vwap'] = (df['close'] - df['VWAP']).abs()
     df['z_dist'] = rolling_zscore(df['dist_vwap'], z_win)
+    return df
+
+def apply_signals(df,
+                  vol_multiplier=1.8,
+                  donchian_n=15,
+                  atr_low=0.003,  # 0.3%
+                  atr_high=0.025  # 2.5%
+                  ):
+    '''
+    df: compute_features 的输出。返回带 don_high / vol_ma / vol_spike / atr_pct / signal 列的新 DataFrame。
+    '''
+    df = df.copy()
 
     # Donchian 突破
     df['don_high'] = df['high'].rolling(donchian_n).max()
@@ -96,6 +105,23 @@ def generate_signals(df,
     df['signal'] = np.where(entry_raw, 1, 0).astype(int)
     return df
 
+def generate_signals(df,
+                     vol_multiplier=1.8,
+                     donchian_n=15,
+                     atr_n=14,
+                     rsi_n=14,
+                     z_win=60,
+                     atr_low=0.003,  # 0.3%
+                     atr_high=0.025  # 2.5%
+                     ):
+    '''
+    df: DataFrame with columns ['open','high','low','close','volume'], DateTimeIndex at 5min freq
+    Returns df with columns: EMA5, EMA20, RSI, ATR, VWAP, signal (1/0), etc.
+    '''
+    features = compute_features(df, atr_n=atr_n, rsi_n=rsi_n, z_win=z_win)
+    return apply_signals(features, vol_multiplier=vol_multiplier, donchian_n=donchian_n,
+                         atr_low=atr_low, atr_high=atr_high)
+
 # =====================
 # T+1 exits & backtest
 # =====================
@@ -108,108 +134,118 @@ def apply_t1_exits(df, max_hold_days=2,
     - capital: starting capital for equity calculation
     - risk_fraction: fraction of capital risked per trade (e.g., 0.5%)
     Shares = floor( risk_capital / (ATR_entry * sl_atr) ), at least 1.
+    df 的 DateTimeIndex 需按时间升序：持仓交易日数由交易日序号差得到，
+    空仓期间直接跳到下一个信号，只逐根检查持仓中的 K 线；各列写入预分配的 numpy 数组，最后一次性组装。
     '''
     df = df.copy()
-    df['position'] = 0
-    df['entry_price'] = np.nan
-    df['exit_price'] = np.nan
-    df['shares'] = 0
-    df['pnl'] = 0.0
-    df['holding_days'] = 0
-    df['equity'] = np.nan
-
-    in_pos = False
-    entry_idx = None
-    highest = None
-    shares = 0
-    equity = capital
-
-    trade_day = pd.Series(df.index.date, index=df.index)
-
-    for i in range(len(df)):
-        idx = df.index[i]
-        if not in_pos:
-            if df['signal'].iat[i] == 1:
-                in_pos = True
-                entry_idx = i
-                entry_price = df['close'].iat[i]
-                atr_entry = df['ATR'].iat[i]
-                # 计算头寸
-                risk_capital = capital * risk_fraction
-                # 防止 ATR 为 0
-                denom = max(atr_entry * sl_atr, 1e-9)
-                shares = min(int(max(1, floor(risk_capital / denom))), int(floor(capital / (entry_price*(1+COMMISSION)))))
-                df.at[idx, 'position'] = 1
-                df.at[idx, 'entry_price'] = entry_price
-                df.at[idx, 'shares'] = shares
-                highest = df['high'].iat[i]
-                df.at[idx, 'equity'] = equity
-            else:
-                df.at[idx, 'equity'] = equity
-        else:
-            # 持仓期间
-            df.at[idx, 'position'] = 1
-            entry_price = df['entry_price'].iloc[entry_idx]
-            atr_val = df['ATR'].iat[i]
-            highest = max(highest, df['high'].iat[i])
-            df.at[idx, 'entry_price'] = entry_price
-            df.at[idx, 'shares'] = shares
+    n = len(df)
+    close = df['close'].to_numpy(dtype=np.float64).tolist()
+    high = df['high'].to_numpy(dtype=np.float64).tolist()
+    low = df['low'].to_numpy(dtype=np.float64).tolist()
+    atr_col = df['ATR'].to_numpy(dtype=np.float64).tolist()
+    vwap = df['VWAP'].to_numpy(dtype=np.float64).tolist()
+    ema5 = df['EMA5'].to_numpy(dtype=np.float64).tolist()
+    ema20 = df['EMA20'].to_numpy(dtype=np.float64).tolist()
+    rsi_col = df['RSI'].to_numpy(dtype=np.float64).tolist()
+    signal_idx = np.flatnonzero(df['signal'].to_numpy() == 1)
+
+    # 交易日序号：同一交易日的 K 线序号相同，跨日递增
+    day = np.asarray(df.index.date)
+    day_no = np.zeros(n, dtype=np.int64)
+    if n > 1:
+        day_no[1:] = np.cumsum(day[1:] != day[:-1])
+    day_list = day_no.tolist()
+
+    position = np.zeros(n, dtype=np.int64)
+    entry_col = np.full(n, np.nan)
+    exit_col = np.full(n, np.nan)
+    shares_col = np.zeros(n, dtype=np.int64)
+    pnl_col = np.zeros(n)
+    holding = np.zeros(n, dtype=np.int64)
+
+    i = 0
+    while True:
+        # 空仓：跳到下一个信号
+        k = int(np.searchsorted(signal_idx, i))
+        if k >= len(signal_idx):
+            break
+        entry_idx = int(signal_idx[k])
+        entry_price = close[entry_idx]
+        atr_entry = atr_col[entry_idx]
+        # 计算头寸
+        risk_capital = capital * risk_fraction
+        # 防止 ATR 为 0
+        denom = max(atr_entry * sl_atr, 1e-9)
+        shares = min(int(max(1, floor(risk_capital / denom))), int(floor(capital / (entry_price*(1+COMMISSION)))))
+        highest = high[entry_idx]
+        entry_day = day_list[entry_idx]
+
+        # 持仓期间
+        exit_idx = None
+        for j in range(entry_idx + 1, n):
+            atr_val = atr_col[j]
+            highest = max(highest, high[j])
 
             # 次日及以后才允许退出
-            can_exit = (trade_day.iat[i] != trade_day.iat[entry_idx])
+            if day_list[j] == entry_day:
+                continue
 
             exit_now = False
-            exit_price = df['close'].iat[i]
+            # 硬性止损
+            if low[j] <= entry_price - sl_atr * atr_val:
+                exit_now = True
+
+            # 首次锁盈 & 追踪止盈
+            if not exit_now and (high[j] >= entry_price + trail_init * atr_val):
+                protect = entry_price
+                if close[j] <= protect:
+                    exit_now = True
 
-            if can_exit:
-                # 硬性止损
-                if df['low'].iat[i] <= entry_price - sl_atr * atr_val:
+            if not exit_now:
+                # 最高价回撤
+                if close[j] <= (highest - trail_atr * atr_val):
                     exit_now = True
 
-                # 首次锁盈 & 追踪止盈
-                if not exit_now and (df['high'].iat[i] >= entry_price + trail_init * atr_val):
-                    protect = entry_price
-                    if df['close'].iat[i] <= protect:
-                        exit_now = True
-
-                if not exit_now:
-                    # 最高价回撤
-                    if df['close'].iat[i] <= (highest - trail_atr * atr_val):
-                        exit_now = True
-
-                # 条件出场
-                if not exit_now:
-                    cond1 = df['close'].iat[i] < df['VWAP'].iat[i]
-                    cond2 = df['EMA5'].iat[i] < df['EMA20'].iat[i]
-                    cond3 = False
-                    if i > 0 and not np.isnan(df['RSI'].iat[i-1]):
-                        cond3 = (df['RSI'].iat[i-1] > 70) and (df['RSI'].iat[i] < 65)
-                    intraday_dd = highest - df['low'].iat[i]
-                    cond4 = intraday_dd >= dd_atr * atr_val
-                    if cond1 or cond2 or cond3 or cond4:
-                        exit_now = True
-
-                # 时间出场：第 3 个交易日收盘卖出
-                hold_days = (pd.Series(trade_day).iloc[entry_idx:i+1].nunique() - 1)
-                df.at[idx, 'holding_days'] = hold_days
-                if not exit_now and hold_days >= max_hold_days:
+            # 条件出场
+            if not exit_now:
+                cond1 = close[j] < vwap[j]
+                cond2 = ema5[j] < ema20[j]
+                cond3 = False
+                if not np.isnan(rsi_col[j-1]):
+                    cond3 = (rsi_col[j-1] > 70) and (rsi_col[j] < 65)
+                intraday_dd = highest - low[j]
+                cond4 = intraday_dd >= dd_atr * atr_val
+                if cond1 or cond2 or cond3 or cond4:
                     exit_now = True
 
+            # 时间出场：第 3 个交易日收盘卖出
+            if not exit_now and day_list[j] - entry_day >= max_hold_days:
+                exit_now = True
+
             if exit_now:
-                df.at[idx, 'exit_price'] = exit_price
-                trade_pnl = ( exit_price*(1-TAX-COMMISSION) - entry_price*(1+COMMISSION) ) * shares
-                df.at[idx, 'pnl'] = trade_pnl
-                equity += trade_pnl
-                df.at[idx, 'equity'] = equity
-                in_pos = False
-                entry_idx = None
-                highest = None
-                shares = 0
-            else:
-                df.at[idx, 'equity'] = equity
-
-    # 完成后填充未赋值的 equity
-    df['equity'] = df['equity'].ffill().fillna(capital)
+                exit_idx = j
+                break
+
+        last = exit_idx if exit_idx is not None else n - 1
+        position[entry_idx:last+1] = 1
+        entry_col[entry_idx:last+1] = entry_price
+        shares_col[entry_idx:last+1] = shares
+        holding[entry_idx:last+1] = day_no[entry_idx:last+1] - entry_day
+        if exit_idx is None:
+            break
+        exit_price = close[exit_idx]
+        exit_col[exit_idx] = exit_price
+        pnl_col[exit_idx] = ( exit_price*(1-TAX-COMMISSION) - entry_price*(1+COMMISSION) ) * shares
+        i = exit_idx + 1
+
+    df['position'] = position
+    df['entry_price'] = entry_col
+    df['exit_price'] = exit_col
+    df['shares'] = shares_col
+    df['pnl'] = pnl_col
+    df['holding_days'] = holding
+    # 逐笔累加已实现盈亏 (与逐根 equity += trade_pnl 的顺序相同)
+    df['equity'] = np.cumsum(np.concatenate([[capital], pnl_col]))[1:] if n else pnl_col
     df['trade_pnl'] = df['pnl'].where(df['exit_price'].notna(), 0.0)
     return df
 
@@ -262,32 +298,70 @@ def evaluate_performance(df, capital=100000.0):
     return out, trades
 
 # =====================
-# Simple grid search
+# Grid / random search
 # =====================
 
+# 进程池 worker 的共享状态：特征表在 initializer 中传入一次，信号按 (vol_multiplier, donchian_n) 缓存
+_SEARCH = {}
+
+def _init_search(features, capital, risk_fraction):
+    _SEARCH.clear()
+    _SEARCH.update(features=features, capital=capital, risk_fraction=risk_fraction, signals={})
+
+def _signals_for(vm, dn):
+    key = (vm, dn)
+    if key not in _SEARCH['signals']:
+        _SEARCH['signals'][key] = apply_signals(_SEARCH['features'], vol_multiplier=vm, donchian_n=dn)
+    return _SEARCH['signals'][key]
+
+def _evaluate_combo(combo):
+    '''单个参数组合的出场模拟与绩效统计 (在 worker 中运行)'''
+    vm, dn, ti, ta = combo
+    capital = _SEARCH['capital']
+    bdf = apply_t1_exits(_signals_for(vm, dn), trail_init=ti, trail_atr=ta,
+                         capital=capital, risk_fraction=_SEARCH['risk_fraction'])
+    perf, _ = evaluate_performance(bdf, capital=capital)
+    return {
+        'vol_multiplier': vm,
+        'donchian_n': dn,
+        'trail_init': ti,
+        'trail_atr': ta,
+        **perf
+    }
+
 def grid_search(df,
                 vol_m_list=(1.3,1.5,1.8),
                 don_list=(15,20,30),
                 trail_init_list=(1.5,2.0,2.5),
                 trail_atr_list=(1.0,1.5,2.0),
                 capital=100000.0,
-                risk_fraction=0.005):
-    rows = []
-    for vm in vol_m_list:
-        for dn in don_list:
-            for ti in trail_init_list:
-                for ta in trail_atr_list:
-                    gdf = generate_signals(df, vol_multiplier=vm, donchian_n=dn)
-                    bdf = apply_t1_exits(gdf, trail_init=ti, trail_atr=ta,
-                                         capital=capital, risk_fraction=risk_fraction)
-                    perf, _ = evaluate_performance(bdf, capital=capital)
-                    row = {
-                        'vol_multiplier': vm,
-                        'donchian_n': dn,
-                        'trail_init': ti,
-                        'trail_atr': ta,
-                        **perf
-                    }
-                    rows.append(row)
+                risk_fraction=0.005,
+                n_random=None,
+                seed=None,
+                workers=None):
+    '''
+    参数网格搜索。指标列只计算一次，信号按 (vol_multiplier, donchian_n) 生成一次，
+    各组合的 T+1 出场模拟分发到进程池并行执行。
+    - n_random: 只从完整网格中随机抽取 n_random 组 (随机搜索)，None 为全部组合
+    - seed: 随机搜索的种子
+    - workers: 进程数，None 为 CPU 核数，1 为在当前进程中顺序执行
+    返回按 total_return、sharpe 降序排列的结果表 (每组参数一行)。
+    '''
+    combos = list(itertools.product(vol_m_list, don_list, trail_init_list, trail_atr_list))
+    if n_random is not None and n_random < len(combos):
+        picked = set(random.Random(seed).sample(range(len(combos)), n_random))
+        combos = [c for i, c in enumerate(combos) if i in picked]
+    features = compute_features(df)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(combos) <= 1:
+        _init_search(features, capital, risk_fraction)
+        rows = [_evaluate_combo(c) for c in combos]
+    else:
+        # product 的顺序使同一 (vol_multiplier, donchian_n) 的组合相邻，按块分发时 worker 的信号缓存命中率更高
+        chunksize = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_search,
+                                 initargs=(features, capital, risk_fraction)) as executor:
+            rows = list(executor.map(_evaluate_combo, combos, chunksize=chunksize))
     res = pd.DataFrame(rows).sort_values(['total_return','sharpe'], ascending=[False, False])
     return res